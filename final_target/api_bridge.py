@@ -1,58 +1,242 @@
+import asyncio
 import uuid
-from fastapi import FastAPI, Body
-from typing import Dict, Any
+from fastapi import FastAPI, Body, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from typing import Dict, Any, List
 
 # 导入你现有的逻辑
+from batch import BatchPlanner
+from checkpointing import create_checkpointer
+from data_models import HeadlessPolicy
+from external_calls import external_calls
 from graph import build_travel_graph
-from langgraph.checkpoint.memory import MemorySaver
+from headless import policy_input
+from jobs import JobManager
+from llm_metrics import llm_usage_meter
+from metrics import metrics_registry
+from model_router import model_router
+from progress import to_sse
+from run_pool import RunCancelled, RunPool, RunRejected, snapshot_result
+from shared_store import shared_store
+from speculation import speculation_engine
+from tracing import tracer
 from langgraph.types import Command
 
 app = FastAPI(title="商务行程规划 API 桥接器")
 
-# 1. 初始化图和持久化（暂时用内存，重启会丢）
-checkpointer = MemorySaver()
+# 1. 初始化图和持久化（默认本地 SQLite，服务重启后未完成的会话仍可继续）
+# 多 worker 部署（uvicorn --workers N）时所有 worker 共用同一个检查点文件与共享存储（SHARED_STORE_BACKEND=sqlite），
+# 任一 worker 都能恢复任意会话
+checkpointer = create_checkpointer()
 travel_graph = build_travel_graph().compile(checkpointer=checkpointer)
 
 
+# 2. 图运行放到有界线程池中执行：长时间的规划不阻塞事件循环，排队满时返回 429
+run_pool = RunPool(travel_graph)
+
+
 @app.post("/workflow/run")
 async def run_logic(
         thread_id: str = Body(None, description="会话ID，不传则新建"),
         initial_input: Dict[str, Any] = Body(None, description="初始输入数据"),
-        resume_value: Any = Body(None, description="中断恢复时传回的值")
+        resume_value: Any = Body(None, description="中断恢复时传回的值"),
+        policy: HeadlessPolicy = Body(None, description="无人值守策略（新运行时传入），各中断点按策略自动决策")
 ):
     # 如果没有 thread_id，生成一个，这是追踪用户进度的关键
     if not thread_id:
         thread_id = f"task-{uuid.uuid4().hex[:8]}"
 
-    config = {"configurable": {"thread_id": thread_id}}
-
-    # 2. 判断是【新开始】还是【恢复执行】
-    if resume_value is not None:
-        # 用户回复了中断请求（比如选了公司列表）
-        result = travel_graph.invoke(Command(resume=resume_value), config=config)
-    else:
-        # 第一次启动流程
-        result = travel_graph.invoke(initial_input, config=config)
-
-    # 3. 检查当前状态是否被中断了
-    snapshot = travel_graph.get_state(config)
-
-    # 如果 snapshot.next 有值，说明还没跑完，卡在某个 interrupt 了
-    if snapshot.next:
-        # 获取中断的详细信息（就是你代码里 interrupt() 抛出的 payload）
-        interrupt_content = snapshot.tasks[0].interrupts[0].value
+    # 3. 判断是【新开始】还是【恢复执行】（用户回复了中断请求，比如选了公司列表）
+    graph_input = Command(resume=resume_value) if resume_value is not None else policy_input(initial_input, policy)
+    try:
+        snapshot = await run_pool.run(thread_id, graph_input)
+    except RunRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers={"Retry-After": str(e.retry_after)})
+    except RunCancelled:
         return {
             "thread_id": thread_id,
-            "status": "NEED_INTERACTION",
-            "interrupt_data": interrupt_content
+            "status": "CANCELLED"
         }
 
-    # 4. 如果流程顺利走完了
-    return {
-        "thread_id": thread_id,
-        "status": "COMPLETED",
-        "final_result": result.get("itinerary", {}).get("final_report", "规划完成")
-    }
+    # 4. snapshot.next 有值说明卡在某个 interrupt（返回中断内容），否则流程已走完（返回最终报告）
+    return {"thread_id": thread_id, **snapshot_result(snapshot)}
+
+
+@app.post("/workflow/stream")
+async def stream_logic(
+        thread_id: str = Body(None, description="会话ID，不传则新建"),
+        initial_input: Dict[str, Any] = Body(None, description="初始输入数据"),
+        resume_value: Any = Body(None, description="中断恢复时传回的值"),
+        policy: HeadlessPolicy = Body(None, description="无人值守策略（新运行时传入），各中断点按策略自动决策")
+):
+    """
+    与 /workflow/run 相同的运行，以 Server-Sent Events 实时推送进度：
+    node_start / node_end（含耗时）、progress（节点中间结果）、interrupt，最后一条 done 与 /workflow/run 的返回一致
+    客户端断开不会取消运行（可稍后用同一 thread_id 继续）
+    """
+    if not thread_id:
+        thread_id = f"task-{uuid.uuid4().hex[:8]}"
+    graph_input = Command(resume=resume_value) if resume_value is not None else policy_input(initial_input, policy)
+
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue = asyncio.Queue()
+    try:
+        future = run_pool.submit(thread_id, graph_input, listener=lambda e: loop.call_soon_threadsafe(events.put_nowait, e))
+    except RunRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers={"Retry-After": str(e.retry_after)})
+    future.add_done_callback(lambda _: loop.call_soon_threadsafe(events.put_nowait, None))
+
+    async def event_source():
+        yield to_sse({"event": "run_start", "thread_id": thread_id})
+        while (event := await events.get()) is not None:
+            yield to_sse(event)
+        if future.cancelled() or isinstance(future.exception(), RunCancelled):
+            yield to_sse({"event": "done", "thread_id": thread_id, "status": "CANCELLED"})
+        elif future.exception() is not None:
+            yield to_sse({"event": "done", "thread_id": thread_id, "status": "FAILED", "error": str(future.exception())})
+        else:
+            yield to_sse({"event": "done", "thread_id": thread_id, **snapshot_result(future.result())})
+
+    return StreamingResponse(event_source(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.post("/workflow/cancel/{thread_id}")
+async def cancel_run(thread_id: str):
+    """取消会话当前的运行：排队中的直接移除，执行中的在当前超步结束后停止（已完成的步骤保留在检查点中）"""
+    state = run_pool.cancel(thread_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail=f"会话 {thread_id} 没有正在执行或排队的运行")
+    return {"thread_id": thread_id, "status": state.upper()}
+
+
+@app.get("/workflow/pool")
+async def pool_stats():
+    """运行线程池（本 worker）：并发数、执行中 / 排队中的运行数、平均运行耗时、拒绝 / 取消次数，以及共享存储状态"""
+    return {**run_pool.report(), "shared_store": shared_store.report()}
+
+
+# 异步任务：POST 立即返回 job_id，运行在后台执行；客户端轮询 GET /jobs/{job_id} 或等待 webhook 回调
+job_manager = JobManager(run_pool)
+
+
+@app.post("/jobs", status_code=202)
+async def create_job(
+        thread_id: str = Body(None, description="会话ID，不传则新建"),
+        initial_input: Dict[str, Any] = Body(None, description="初始输入数据"),
+        resume_value: Any = Body(None, description="中断恢复时传回的值"),
+        webhook_url: str = Body(None, description="到达 interrupt 或结束时回调的地址"),
+        policy: HeadlessPolicy = Body(None, description="无人值守策略（新运行时传入），各中断点按策略自动决策")
+):
+    """启动或恢复一次运行（与 /workflow/run 参数相同），不等待运行结束"""
+    if not thread_id:
+        thread_id = f"task-{uuid.uuid4().hex[:8]}"
+    graph_input = Command(resume=resume_value) if resume_value is not None else policy_input(initial_input, policy)
+    try:
+        return job_manager.submit(thread_id, graph_input, webhook_url=webhook_url)
+    except RunRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers={"Retry-After": str(e.retry_after)})
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """任务状态：QUEUED / RUNNING / NEED_INTERACTION / COMPLETED / FAILED / CANCELLED，结束后 result 为中断内容或最终报告"""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"未找到任务 {job_id}")
+    return job
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    state = job_manager.cancel(job_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail=f"任务 {job_id} 不存在或已结束")
+    return {"job_id": job_id, "status": state.upper()}
+
+
+# 批量规划：多个行程并发、无人值守运行，共用外部调用缓存；不经过 run_pool，不占用交互式请求的排队名额，
+# 由 BatchPlanner 自己做准入控制（并发数上限、同时执行的批次数上限，超过返回 429）
+batch_planner = BatchPlanner(travel_graph)
+
+
+@app.post("/batch")
+async def run_batch(
+        trips: List[Dict[str, Any]] = Body(..., description="行程需求列表，每项含 raw_input（或 initial_input）、可选 trip_id / policy"),
+        concurrency: int = Body(None, description="并发规划的行程数，不传或超过上限时使用 BATCH_CONCURRENCY")
+):
+    """
+    以 Server-Sent Events 逐个推送 trip_result（按完成顺序），最后一条 batch_done 汇总耗时与省下的外部调用数
+    客户端断开后尚未开始的行程不再执行
+    """
+    if not trips:
+        raise HTTPException(status_code=422, detail="trips 不能为空")
+    try:
+        batch_events = batch_planner.stream(trips, concurrency=concurrency)
+    except RunRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers={"Retry-After": str(e.retry_after)})
+    # 同步生成器由 StreamingResponse 放到线程池中迭代，不阻塞事件循环
+    events = (to_sse(event) for event in batch_events)
+    return StreamingResponse(events, media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.get("/external_calls/stats")
+async def external_call_stats():
+    """外部调用共享缓存：各服务的调用次数、实际请求数、缓存命中 / 并发合并次数，以及限速等待时长"""
+    return external_calls.report()
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Prometheus 文本格式：各节点执行耗时、各外部调用耗时与重试次数、中断等待时长的直方图（本 worker 进程内累计）
+    """
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/tracing/stats")
+async def tracing_stats():
+    """追踪开关与 OTLP 导出统计（已导出 / 丢弃的 span 数、失败批次）"""
+    return tracer.report()
+
+
+@app.get("/llm/cache_stats")
+async def llm_cache_stats():
+    """各 LLM 调用点的 prompt token 与前缀缓存命中统计"""
+    return llm_usage_meter.report()["by_call_site"]
+
+
+@app.get("/llm/usage")
+async def llm_usage():
+    """进程级 LLM 用量：按调用点 / 图节点 / 模型汇总的 token、延迟、首 token 延迟与费用"""
+    return llm_usage_meter.report()
+
+
+@app.get("/llm/usage/{thread_id}")
+async def llm_usage_for_thread(thread_id: str):
+    """单个会话的 LLM 用量（总计 + 按图节点）"""
+    usage = llm_usage_meter.report_thread(thread_id)
+    if usage is None:
+        raise HTTPException(status_code=404, detail=f"未找到会话 {thread_id} 的 LLM 用量记录")
+    return usage
+
+
+@app.get("/llm/router_stats")
+async def llm_router_stats():
+    """各模型滚动 p50/p95 延迟、错误率、健康状态，以及各调用点当前的路由顺序"""
+    return model_router.report()
+
+
+@app.get("/speculation/stats")
+async def speculation_stats():
+    """中断期间推测执行的启动数、命中率、丢弃数"""
+    return speculation_engine.report()
 
 
 if __name__ == "__main__":
@@ -62,6 +246,13 @@ if __name__ == "__main__":
     # 关键修改：云平台（Zeabur, Railway等）会通过环境变量 PORT 分配端口
     # 如果拿不到 PORT，则默认使用 8080 (Zeabur 默认检测端口)
     port = int(os.environ.get("PORT", 8080))
-    
+    # 多 worker 需要所有 worker 共用检查点与共享存储，否则恢复请求落到其它 worker 时找不到会话
+    workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+    if workers > 1 and not (shared_store.shared and hasattr(checkpointer, "flush")):
+        raise SystemExit("多 worker 部署需要 CHECKPOINT_BACKEND=sqlite 且 SHARED_STORE_BACKEND=sqlite")
+
     # host 必须是 0.0.0.0 才能让外部访问
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    if workers > 1:
+        uvicorn.run("api_bridge:app", host="0.0.0.0", port=port, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=port)
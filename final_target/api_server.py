@@ -1,16 +1,28 @@
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import Dict, Any, Optional
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import StreamingResponse
+from langgraph.types import Command
+from pydantic import BaseModel, Field
+from typing import Dict, Any, List, Literal, Optional
 import uuid
 
 # 导入你现有的 LangGraph 编译对象和状态定义
+from checkpointing import create_checkpointer
+from config import API_GZIP_MIN_BYTES
+from data_models import HeadlessPolicy
 from graph import build_travel_graph
-from langgraph.checkpoint.memory import MemorySaver
+from headless import policy_input
+from progress import stream_progress, to_sse
+from response_views import OrjsonResponse, project_state
+from run_pool import snapshot_result
 
 app_fastapi = FastAPI(title="LangGraph Travel API")
+if API_GZIP_MIN_BYTES is not None:
+    # SSE（text/event-stream）不压缩，逐条推送不受影响
+    app_fastapi.add_middleware(GZipMiddleware, minimum_size=API_GZIP_MIN_BYTES)
 
 # 初始化 LangGraph
-checkpointer = MemorySaver()
+checkpointer = create_checkpointer()
 langgraph_app = build_travel_graph().compile(checkpointer=checkpointer)
 
 
@@ -19,6 +31,11 @@ class PlanningRequest(BaseModel):
     thread_id: Optional[str] = None
     input_data: Optional[Dict[str, Any]] = None
     resume_value: Optional[Any] = None
+    policy: Optional[HeadlessPolicy] = None     # 新运行时传入：各中断点按策略自动决策，一次调用运行到结束
+    view: Literal["full", "interrupt", "report", "summary"] = Field(
+        "full", description="data 的内容：full 完整状态；interrupt 不返回状态（只看 interrupt_info）；report 最终报告；summary 行程摘要")
+    fields: Optional[List[str]] = Field(
+        None, description="按点分路径挑选状态字段（如 [\"transport.selected_transport\", \"itinerary.final_report\"]），优先于 view")
 
 
 @app_fastapi.post("/run")
@@ -30,25 +47,50 @@ async def run_workflow(req: PlanningRequest):
     try:
         if req.resume_value is not None:
             # 恢复中断的流程
-            from langgraph.types import Command
             result = langgraph_app.invoke(Command(resume=req.resume_value), config=config)
         else:
             # 启动新流程
-            result = langgraph_app.invoke(req.input_data, config=config)
+            result = langgraph_app.invoke(policy_input(req.input_data, req.policy), config=config)
 
         # 检查是否遇到了中断
         is_interrupt = "__interrupt__" in result
 
-        return {
+        # 直接返回 OrjsonResponse：跳过 jsonable_encoder，状态（含 datetime / pydantic 模型）只经 orjson 序列化一次
+        return OrjsonResponse({
             "thread_id": thread_id,
             "status": "interrupted" if is_interrupt else "completed",
-            "data": result,
+            "data": project_state(result, req.view, req.fields),
             "interrupt_info": result.get("__interrupt__") if is_interrupt else None
-        }
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app_fastapi.post("/stream")
+def stream_workflow(req: PlanningRequest):
+    """
+    以 Server-Sent Events 推送运行进度：node_start / node_end（含耗时）、progress（节点中间结果）、interrupt，
+    最后一条 done 给出运行结果（中断内容或最终报告）
+    """
+    thread_id = req.thread_id or f"api-{uuid.uuid4().hex}"
+    config = {"configurable": {"thread_id": thread_id}}
+    graph_input = Command(resume=req.resume_value) if req.resume_value is not None else policy_input(req.input_data, req.policy)
+
+    def event_source():
+        # 同步生成器：StreamingResponse 会放到线程池中迭代，不阻塞事件循环
+        yield to_sse({"event": "run_start", "thread_id": thread_id})
+        try:
+            for event in stream_progress(langgraph_app, graph_input, config):
+                yield to_sse(event)
+        except Exception as e:
+            yield to_sse({"event": "done", "thread_id": thread_id, "status": "FAILED", "error": str(e)})
+            return
+        yield to_sse({"event": "done", "thread_id": thread_id, **snapshot_result(langgraph_app.get_state(config))})
+
+    return StreamingResponse(event_source(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 if __name__ == "__main__":
     import uvicorn
 
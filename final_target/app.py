@@ -1,5 +1,4 @@
 import streamlit as st
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.types import Command
 import uuid
 import json
@@ -7,7 +6,10 @@ from typing import Dict, Any, Optional, Literal, Union
 
 # 确保导入了所有依赖项，路径正确
 # 假设这些文件都在同一目录下或已正确配置 PYTHONPATH
+from checkpointing import create_checkpointer
+from config import DEFAULT_TRIP_DAYS, MAX_TRIP_DAYS
 from graph import build_travel_graph
+from progress import stream_progress
 # 导入状态类型，用于类型提示和初始化
 from state import TravelPlanState, UserContext, LocationContext, TransportContext, CompanyContext, ItineraryContext, \
     ControlContext
@@ -20,8 +22,8 @@ st.set_page_config(page_title="✈️ 商务行程规划助手", layout="wide")
 @st.cache_resource
 def get_graph():
     """初始化 LangGraph 并返回编译后的应用。"""
-    # 使用 MemorySaver 作为检查点，实现会话记忆
-    checkpointer = MemorySaver()
+    # 检查点存储由 create_checkpointer 统一创建（默认本地 SQLite），实现会话记忆
+    checkpointer = create_checkpointer()
     return build_travel_graph().compile(checkpointer=checkpointer)
 
 
@@ -69,15 +71,24 @@ def run_workflow_step(input_data: Optional[Dict[str, Any]] = None,
     st.session_state.messages.append(("System", log_msg))
 
     try:
-        # LangGraph 驱动逻辑
-        if resume_value is not None:
-            # 流程中断后，使用 Command(resume=...) 传递恢复值
-            input_for_graph = Command(resume=resume_value)
-            result = app.invoke(input_for_graph, config=CONFIG)
-        else:
-            # 流程开始时，传入初始状态
-            # 注意：app.invoke 要求传入一个字典，而不是 TypedDict 实例
-            result = app.invoke(input_data, config=CONFIG)
+        # LangGraph 驱动逻辑：流程中断后，使用 Command(resume=...) 传递恢复值；流程开始时，传入初始状态（普通字典）
+        input_for_graph = Command(resume=resume_value) if resume_value is not None else input_data
+
+        # 与 API 的 SSE 接口使用同一个进度流，实时展示每个节点的开始 / 结束与中间结果
+        with st.status("正在规划...", expanded=True) as status_box:
+            for event in stream_progress(app, input_for_graph, CONFIG):
+                line = describe_progress(event)
+                if line:
+                    status_box.write(line)
+                    st.session_state.messages.append(("Graph", line))
+            status_box.update(label="本步骤完成", state="complete", expanded=False)
+
+        # 与 app.invoke 的返回一致：最终状态 + 中断时的 "__interrupt__"
+        snapshot = app.get_state(CONFIG)
+        result = dict(snapshot.values)
+        interrupts = [item for task in snapshot.tasks for item in task.interrupts]
+        if interrupts:
+            result["__interrupt__"] = interrupts
 
         # 更新状态
         st.session_state.state = result
@@ -95,6 +106,19 @@ def run_workflow_step(input_data: Optional[Dict[str, Any]] = None,
         st.rerun()
 
 
+def describe_progress(event: Dict[str, Any]) -> Optional[str]:
+    """把进度事件转成一行展示文本（节点开始不单独展示）"""
+    if event["event"] == "progress":
+        return f"　· {event.get('message') or event.get('kind')}"
+    if event["event"] == "node_end":
+        if event["error"]:
+            return f"❌ {event['node']} 出错: {event['error']}"
+        if event["interrupted"]:
+            return f"⏸️ {event['node']}：等待您的输入"
+        return f"✅ {event['node']}（{(event['duration_ms'] or 0) / 1000:.1f}s）"
+    return None
+
+
 def handle_start_planning(input_params: dict):
     """处理用户点击 '开始规划' 按钮的逻辑。"""
 
@@ -105,6 +129,7 @@ def handle_start_planning(input_params: dict):
     user_input_str = (
         f"规划 {input_params['origin_city']} 到 {input_params['destination_city']} 的行程。 "
         f"出发日期: {input_params['departure_date']}。 "
+        f"出差天数: {input_params['trip_days']} 天。 "
         f"出发地: {input_params['origin_address']}。 "
         f"酒店地址: {input_params['hotel_address']}。\n"
         f"--- 固定事件/会议列表 ---\n{fixed_events_info}\n"
@@ -117,6 +142,7 @@ def handle_start_planning(input_params: dict):
         "departure_date": input_params['departure_date'],
         "home_address": input_params['origin_address'],
         "hotel_address": input_params['hotel_address'],
+        "trip_days": input_params['trip_days'],
         # 💥 关键修改：将 fixed_events 设置为空列表，等待 'check_constraints' 节点通过 LLM 解析 user_input_str 来填充
         "fixed_events": []
     }
@@ -147,12 +173,11 @@ def handle_start_planning(input_params: dict):
             # 💥 关键修改：这里必须是空列表，否则 check_constraints 无法识别。
             # check_constraints 节点将通过 LLM 解析 raw_input 来获取 fixed_events 列表
             fixed_events=[],
-            day_1=None,
-            day_2=None,
-            day_3=None,
             final_itinerary=[],
             final_report="",
         ),
+        "days": [],
+        "commute_cache": {},
         "control": ControlContext(
             error_message=None,
             refinement_instruction=None,
@@ -352,11 +377,24 @@ def render_interruption_ui(interrupt_data):
             st.warning("⚠️ 未找到推荐企业，请尝试手动输入或跳过。")
             if st.button("返回"): run_workflow_step(resume_value=[])
         else:
+            # 标注每家企业的额外通勤（由行程空闲时间窗与粗估通勤得出），默认勾选推荐组合
+            annotations = {a["name"]: a for a in payload.get("annotations") or []}
+            recommended = [name for name in payload.get("recommended") or [] if name in candidates]
+
+            def describe(name: str) -> str:
+                note = annotations.get(name)
+                if not note or note["extra_minutes"] is None:
+                    return name
+                if note["fits"]:
+                    return f"{name}（推荐，额外通勤约 {note['extra_minutes']:.0f} 分钟）"
+                return f"{name}（时间窗内排不下，绕路约 {note['extra_minutes']:.0f} 分钟）"
+
             # 使用 Streamlit 的多选组件
             selected_list = st.multiselect(
                 "请勾选目标企业：",
                 options=candidates,
-                default=candidates[:2] if len(candidates) > 2 else []  # 默认勾选前两家
+                default=recommended or (candidates[:2] if len(candidates) > 2 else []),  # 无推荐时默认勾选前两家
+                format_func=describe
             )
 
             st.markdown("---")
@@ -407,6 +445,9 @@ def render_input_form():
                                            key="departure_date",
                                            value="2026-01-25")
 
+        trip_days = st.number_input("出差天数 (含出发当天)", min_value=1, max_value=MAX_TRIP_DAYS,
+                                    value=DEFAULT_TRIP_DAYS, step=1, key="trip_days")
+
         origin_address = st.text_input("出发地点 (详细地址，例: 上海市浦东新区川沙新镇黄赵路310号)",
                                        key="origin_address",
                                        value="上海市浦东新区川沙新镇黄赵路310号")
@@ -443,6 +484,7 @@ def render_input_form():
                 "origin_address": st.session_state.origin_address,
                 "destination_city": st.session_state.destination_city,
                 "departure_date": st.session_state.departure_date,
+                "trip_days": int(st.session_state.trip_days),
                 "fixed_events_input": st.session_state.fixed_events_input,  # 新增
                 "hotel_address": st.session_state.hotel_address,
             }
@@ -0,0 +1,205 @@
+#batch.py
+"""
+批量行程规划：团队同城出差时一次提交多份行程需求，并发、无人值守运行
+- 各行程共用外部调用缓存（external_calls）：相同的航班查询、酒店地理编码、通勤路段只请求一次，并发时合并为同一个请求
+- 以无人值守策略（HeadlessPolicy，默认值可在每条需求的 policy 中覆盖）运行，各中断点直接按策略决策，一次调用运行到结束
+- 每个行程完成即返回一条结果，最后返回本批次省下的外部调用数
+
+命令行（在 final_target 目录下）：python batch.py trips.jsonl [-o results.jsonl] [--concurrency 8]
+输入每行一个 JSON：{"trip_id": "zhang", "raw_input": "我要从上海出发去深圳……", "policy": {"research_mode": "3"}}
+（也可直接给出 initial_input 作为图的初始状态）
+"""
+import argparse
+import json
+import math
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, List, Optional
+
+from fastapi.encoders import jsonable_encoder
+
+from config import BATCH_CONCURRENCY, BATCH_MAX_ACTIVE, RUN_RETRY_AFTER_DEFAULT_SECONDS
+from data_models import HeadlessPolicy
+from external_calls import external_calls
+from headless import policy_input
+from run_pool import RunRejected, snapshot_result
+
+
+def trip_input(trip: Dict[str, Any]) -> Dict[str, Any]:
+    """行程需求 → 图的初始状态（附带无人值守策略）"""
+    if trip.get("initial_input"):
+        graph_input = trip["initial_input"]
+    elif trip.get("raw_input"):
+        graph_input = {"user": {"raw_input": trip["raw_input"], "parsed_params": {}}}
+    else:
+        raise ValueError("行程需求缺少 raw_input 或 initial_input")
+    return policy_input(graph_input, HeadlessPolicy.model_validate(trip.get("policy") or {}))
+
+
+class BatchPlanner:
+    """
+    在有界线程池中并发规划多个行程（与 RunPool 互相独立，批量任务不占用交互式请求的排队名额）
+    单个行程失败只影响自身的结果，不中断整个批次
+    准入控制：每个批次的并发数不超过 concurrency；同时执行的批次不超过 max_active，超过时 admit 抛出 RunRejected(429)
+    """
+
+    def __init__(self, graph, concurrency: int = BATCH_CONCURRENCY, max_active: int = BATCH_MAX_ACTIVE):
+        self.graph = graph
+        self.concurrency = concurrency
+        self.max_active = max_active
+        self._lock = threading.Lock()
+        self._active = 0
+        self._avg_seconds: Optional[float] = None
+
+    def admit(self) -> None:
+        """占用一个批次名额；名额已满时抛出 RunRejected(429)，Retry-After 按平均批次耗时估算"""
+        with self._lock:
+            if self._active >= self.max_active:
+                retry_after = max(1, math.ceil(self._avg_seconds or RUN_RETRY_AFTER_DEFAULT_SECONDS))
+                raise RunRejected(429, f"同时执行的批次已达上限（{self.max_active}），请稍后重试", retry_after)
+            self._active += 1
+
+    def _release(self, seconds: float) -> None:
+        with self._lock:
+            self._active -= 1
+            self._avg_seconds = seconds if self._avg_seconds is None else 0.8 * self._avg_seconds + 0.2 * seconds
+
+    def stream(self, trips: List[Dict[str, Any]], concurrency: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """先 admit（名额已满时立即抛出 RunRejected），再返回 run 的事件迭代器；迭代结束、中止或被回收时释放名额"""
+        self.admit()
+        return _AdmittedBatch(self, self.run(trips, concurrency))
+
+    def plan_trip(self, thread_id: str, trip: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        运行单个行程：策略覆盖全部中断点时一次运行到结束；
+        策略把某个中断点留给用户（字段为 None）时停在该处，返回 NEED_INTERACTION，可用同一 thread_id 经 /workflow/run 继续
+        """
+        config = {"configurable": {"thread_id": thread_id}}
+        started = time.perf_counter()
+        try:
+            self.graph.invoke(trip_input(trip), config=config)
+            snapshot = self.graph.get_state(config)
+            result = {**snapshot_result(snapshot), "error": (snapshot.values.get("control") or {}).get("error_message")}
+        except Exception as e:
+            result = {"status": "FAILED", "error": str(e)}
+        # 停在中断点的行程之后可能由其它 worker 经 /workflow/run 继续：立即把缓冲的检查点落盘
+        flush = getattr(self.graph.checkpointer, "flush", None)
+        if flush is not None:
+            flush()
+
+        return {
+            "trip_id": trip.get("trip_id"),
+            "thread_id": thread_id,
+            **result,
+            "seconds": round(time.perf_counter() - started, 2),
+        }
+
+    def run(self, trips: List[Dict[str, Any]], concurrency: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        逐个产出 trip_result 事件（按完成顺序），最后产出 batch_done 汇总（含外部调用节省统计）
+        调用方提前停止迭代时（如客户端断开），尚未开始的行程不再执行
+        """
+        batch_id = f"batch-{uuid.uuid4().hex[:8]}"
+        counters = external_calls.counters()
+        started = time.perf_counter()
+        statuses: Dict[str, int] = {}
+
+        # 请求给出的并发数不能超过配置的上限
+        workers = max(1, min(concurrency or self.concurrency, self.concurrency))
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch")
+        try:
+            futures = {
+                executor.submit(self.plan_trip, f"{batch_id}-{index}", {"trip_id": index, **trip}): index
+                for index, trip in enumerate(trips)
+            }
+            for future in as_completed(futures):
+                result = future.result()
+                statuses[result["status"]] = statuses.get(result["status"], 0) + 1
+                yield {"event": "trip_result", "index": futures[future], **result}
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        yield {
+            "event": "batch_done",
+            "batch_id": batch_id,
+            "trips": len(trips),
+            "statuses": statuses,
+            "seconds": round(time.perf_counter() - started, 2),
+            "external_calls": external_calls.report(since=counters),
+        }
+
+
+def load_trips(path: str) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class _AdmittedBatch:
+    """占用一个批次名额的事件迭代器：无论正常结束、客户端断开还是从未开始迭代，名额都只释放一次"""
+
+    def __init__(self, planner: BatchPlanner, events: Iterator[Dict[str, Any]]):
+        self._planner = planner
+        self._events = events
+        self._started = time.perf_counter()
+        self._released = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> Dict[str, Any]:
+        try:
+            return next(self._events)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        if self._released:
+            return
+        self._released = True
+        self._events.close()
+        self._planner._release(time.perf_counter() - self._started)
+
+    def __del__(self):
+        self.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="批量行程规划")
+    parser.add_argument("input", help="行程需求 JSONL，每行一个行程")
+    parser.add_argument("-o", "--output", help="结果 JSONL（默认只打印）")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="并发规划的行程数")
+    args = parser.parse_args()
+
+    from checkpointing import create_checkpointer
+    from graph import build_travel_graph
+
+    trips = load_trips(args.input)
+    planner = BatchPlanner(build_travel_graph().compile(checkpointer=create_checkpointer()), concurrency=args.concurrency)
+    print(f"📦 共 {len(trips)} 个行程，并发 {args.concurrency}")
+
+    output = open(args.output, "w", encoding="utf-8") if args.output else None
+    try:
+        for event in planner.run(trips):
+            if output is not None:
+                output.write(json.dumps(jsonable_encoder(event), ensure_ascii=False) + "\n")
+                output.flush()
+            if event["event"] == "trip_result":
+                print(f"  {'✅' if event['status'] == 'COMPLETED' else '❌'} {event['trip_id']} "
+                      f"[{event['status']}] {event['seconds']} s {event.get('error') or ''}")
+            else:
+                total = event["external_calls"]["total"]
+                print(f"🏁 批次完成，耗时 {event['seconds']} s，状态 {event['statuses']}")
+                print(f"   外部调用：逐个运行需 {total['requested']} 次，实际 {total['executed']} 次，"
+                      f"节省 {total['saved']} 次（缓存命中 {total['cache_hits']}，并发合并 {total['coalesced']}）")
+                for service, stats in event["external_calls"]["by_service"].items():
+                    print(f"   - {service}: {stats['requested']} → {stats['executed']}")
+    finally:
+        if output is not None:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#batch_dedup.py
+"""
+批量规划去重测量：用模拟图代替真实图，节点按真实流程的调用形状请求外部服务
+（家 / 酒店 / 会场地理编码、航班与高铁查询、通勤路段、同城企业推荐与地理编码），每次请求阻塞 latency 秒并经共享令牌桶限速；
+同一团队的行程共享目的城市、酒店和会场，出发城市与日期各有几种。
+对比：逐个运行（关闭共享缓存，concurrency=1）与批量运行（共享缓存 + 并发）的外部请求数和总耗时
+
+用法（在 final_target 目录下）：python -m benchmarks.batch_dedup [--trips 20] [--latency 0.05]
+"""
+import argparse
+import os
+import time
+from typing import Any, Dict, List, Optional, TypedDict
+
+os.environ.setdefault("CHECKPOINT_BACKEND", "memory")
+
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import END, START, StateGraph
+from langgraph.types import interrupt
+
+from batch import BatchPlanner
+from external_calls import external_calls
+from headless import policy_decision
+
+ORIGINS = ["上海", "北京", "杭州"]
+DATES = ["2026-03-02", "2026-03-03"]
+HOTELS = [{"lat": 22.5401, "lon": 113.9343}, {"lat": 22.5332, "lon": 113.9304}]
+VENUE = {"lat": 22.5431, "lon": 113.9589}
+COMPANIES = ["腾讯", "华为", "大疆", "比亚迪", "平安科技"]
+PROVIDERS = {"amap_geocode": "amap", "amap_route": "amap", "flight_search": "serpapi", "train_search": "juhe"}
+
+
+class TripState(TypedDict):
+    trip: Dict[str, Any]
+    calls: int
+    policy: Optional[Dict[str, Any]]
+
+
+def _external(service: str, key: str, latency: float) -> Any:
+    def request():
+        if service in PROVIDERS:
+            external_calls.throttle(PROVIDERS[service])
+        time.sleep(latency)
+        return {"service": service, "key": key}
+    return external_calls.call(service, key, request)
+
+
+def build_trip_graph(latency: float, checkpointer=None):
+    """geocode → transport → approval（中断点）→ research → refine（中断点），中断点与真实节点一样先查询无人值守策略"""
+    def geocode(state: TripState) -> Dict[str, Any]:
+        trip = state["trip"]
+        _external("amap_geocode", f"{trip['origin']}|家-{trip['member']}", latency)
+        _external("amap_geocode", f"深圳|酒店-{trip['hotel']}", latency)
+        _external("amap_geocode", "深圳|会场", latency)
+        return {"calls": 3}
+
+    def transport(state: TripState) -> Dict[str, Any]:
+        trip = state["trip"]
+        _external("flight_search", f"{trip['origin']}|深圳|{trip['date']}", latency)
+        _external("train_search", f"{trip['origin']}|深圳|{trip['date']}|G", latency)
+        hotel = HOTELS[trip["hotel"]]
+        for a, b in ((hotel, VENUE), (VENUE, hotel)):
+            _external("amap_route", f"{a['lat']},{a['lon']}->{b['lat']},{b['lon']}", latency)
+        return {"calls": state["calls"] + 4}
+
+    def approval(state: TripState) -> Dict[str, Any]:
+        payload = {"type": "approval", "message": "是否采纳推荐方案？"}
+        decided, approved = policy_decision(state, "approval", payload)
+        if not decided:
+            approved = interrupt(payload)
+        assert approved is True
+        return {}
+
+    def research(state: TripState) -> Dict[str, Any]:
+        _external("company_recommendations", "深圳", latency)
+        for name in COMPANIES[:3]:
+            _external("company_geocode", f"深圳|{name}", latency)
+        return {"calls": state["calls"] + 4}
+
+    def refine(state: TripState) -> Dict[str, Any]:
+        payload = {"type": "refine_itinerary", "final_report": "", "violations": [], "message": "是否需要修改行程？"}
+        decided, _ = policy_decision(state, "refine", payload)
+        if not decided:
+            interrupt(payload)
+        return {}
+
+    graph = StateGraph(TripState)
+    for name, node in [("geocode", geocode), ("transport", transport), ("approval", approval),
+                       ("research", research), ("refine", refine)]:
+        graph.add_node(name, node)
+    graph.add_edge(START, "geocode")
+    graph.add_edge("geocode", "transport")
+    graph.add_edge("transport", "approval")
+    graph.add_edge("approval", "research")
+    graph.add_edge("research", "refine")
+    graph.add_edge("refine", END)
+    return graph.compile(checkpointer=checkpointer or MemorySaver())
+
+
+def team_trips(count: int) -> List[Dict[str, Any]]:
+    return [
+        {"trip_id": f"member-{k}", "initial_input": {"calls": 0, "trip": {
+            "member": k, "origin": ORIGINS[k % len(ORIGINS)], "date": DATES[k % len(DATES)], "hotel": k % len(HOTELS)}}}
+        for k in range(count)
+    ]
+
+
+def measure(label: str, planner: BatchPlanner, trips: List[Dict[str, Any]], concurrency: int) -> Dict[str, Any]:
+    summary = list(planner.run(trips, concurrency=concurrency))[-1]
+    total = summary["external_calls"]["total"]
+    print(f"{label:<10} 耗时 {summary['seconds']:6.2f} s  状态 {summary['statuses']}  "
+          f"外部调用 {total['requested']} → 实际 {total['executed']}（命中 {total['cache_hits']}，合并 {total['coalesced']}）")
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="批量规划外部调用去重测量")
+    parser.add_argument("--trips", type=int, default=20, help="行程数")
+    parser.add_argument("--latency", type=float, default=0.05, help="每次外部请求的模拟耗时（秒）")
+    parser.add_argument("--concurrency", type=int, default=8, help="批量运行的并发数")
+    args = parser.parse_args()
+
+    planner = BatchPlanner(build_trip_graph(args.latency))
+    trips = team_trips(args.trips)
+    print(f"{args.trips} 个行程：出发城市 {len(ORIGINS)} 个 × 日期 {len(DATES)} 个，酒店 {len(HOTELS)} 家，同一会场")
+
+    external_calls.enabled = False
+    measure("逐个运行", planner, trips, concurrency=1)
+    external_calls.enabled = True
+    external_calls.clear()
+    summary = measure("批量运行", planner, trips, concurrency=args.concurrency)
+    for service, stats in summary["external_calls"]["by_service"].items():
+        print(f"  - {service:<24} {stats['requested']:>3} → {stats['executed']:>3}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+#checkpoint_bench.py
+"""
+检查点存储基准：在与出差规划图同形的合成图上（交通 → 审批 → 企业 → Day 1 → 分天 → N 个调研日并行 → 汇总），
+测量每个超步的检查点写入（put + put_writes）与读取（get_tuple）耗时，以及每个超步写入的字节数（大字段外置前后对比）
+
+用法（在 final_target 目录下）：python -m benchmarks.checkpoint_bench [--threads 20] [--days 5]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from typing import Annotated, Any, Dict, List, TypedDict
+
+from langgraph.graph import END, START, StateGraph
+from langgraph.types import Send
+
+from blob_store import FileBlobStore
+from checkpointing import CompactSerializer, SQLiteCheckpointSaver, create_checkpointer
+from data_models import CompanyInfo
+from state import DayPlan, merge_commute_cache, merge_day_plans
+
+
+class BenchState(TypedDict):
+    user: Dict[str, Any]
+    transport: Dict[str, Any]
+    companies: Dict[str, Any]
+    itinerary: Dict[str, Any]
+    control: Dict[str, Any]
+    days: Annotated[List[DayPlan], merge_day_plans]
+    commute_cache: Annotated[Dict, merge_commute_cache]
+
+
+def _options(kind: str, count: int) -> List[Dict[str, Any]]:
+    return [{
+        "type": kind, "id": f"{kind[0]}{1000 + k}",
+        "departure_date": "2026-01-15", "departure_time": f"{6 + k % 16:02d}:{k % 60:02d}",
+        "arrival_date": "2026-01-15", "arrival_time": f"{8 + k % 14:02d}:{(k * 7) % 60:02d}",
+        "departure_hub": "SHA", "arrival_hub": "SZX",
+        "departure_hub_name": "上海虹桥国际机场", "arrival_hub_name": "深圳宝安国际机场",
+        "duration": 150 + k, "price": 800 + 13 * k,
+    } for k in range(count)]
+
+
+def _items(day_index: int, count: int) -> List[Dict[str, Any]]:
+    start = datetime(2026, 1, 14) + timedelta(days=day_index, hours=9)
+    return [{
+        "start_time": start + timedelta(hours=2 * k),
+        "end_time": start + timedelta(hours=2 * k + 1, minutes=30),
+        "description": f"企业调研 #{k}：深圳市南山区科技园某科技有限公司",
+        "location": {"name": f"公司{k}", "address": "深圳市南山区粤海街道", "lat": 22.54 + k / 100, "lon": 113.95},
+        "type": "company_visit",
+    } for k in range(count)]
+
+
+def _day(day_index: int, items: int, companies: List[str]) -> DayPlan:
+    return {"day_index": day_index, "date": date(2026, 1, 14) + timedelta(days=day_index), "items": _items(day_index, items),
+            "assigned_companies": companies, "stops": None, "unscheduled": [], "violations": []}
+
+
+def build_bench_graph(days: int) -> StateGraph:
+    """与出差规划图同形：交通查询 → 审批 → 选择 → 企业地理编码 → Day 1 → 分天 → 各调研日并行 → 汇总"""
+
+    def route_plan(state: BenchState):
+        return {"transport": {"flight_options": _options("Flight", 40), "train_options": _options("Train", 60),
+                              "selected_index": None, "selected_option_raw": None, "approved": None},
+                "control": {"error_message": None}}
+
+    def approve(state: BenchState):
+        return {"transport": {**state["transport"], "approved": True}, "control": {"error_message": None}}
+
+    def select(state: BenchState):
+        transport = state["transport"]
+        return {"transport": {**transport, "selected_index": 3, "selected_option_raw": transport["flight_options"][3]}}
+
+    def geocode(state: BenchState):
+        candidates = [CompanyInfo(name=f"深圳某科技有限公司{k}", address=f"深圳市南山区科技南{k}路{k * 3}号",
+                                  lat=22.5 + k / 200, lon=113.9 + k / 300, is_valid=True) for k in range(15)]
+        cache = {f"{i}": {f"{j}": 12.5 + i + j for j in range(20)} for i in range(20)}
+        return {"companies": {"target_names": [c.name for c in candidates], "candidates": candidates, "unscheduled": []},
+                "commute_cache": cache}
+
+    def day_1(state: BenchState):
+        return {"days": [_day(1, 4, [])], "itinerary": {"fixed_events": _items(1, 2)}}
+
+    def split(state: BenchState):
+        return {"days": [_day(d, 0, [f"公司{k}" for k in range(4)]) for d in range(2, days + 2)],
+                "companies": {**state["companies"], "unscheduled": []}}
+
+    def fan_out(state: BenchState):
+        # 与 fan_out_research_days 相同：每个 Send 都带上固定事务、企业与整份通勤缓存
+        return [Send("plan_day", {"day_index": d["day_index"], "events": [], "companies": state["companies"]["candidates"][:4],
+                                  "fixed_events": state["itinerary"]["fixed_events"], "commute_cache": state["commute_cache"]})
+                for d in state["days"] if d["day_index"] > 1]
+
+    def plan_day(payload: Dict[str, Any]):
+        d = payload["day_index"]
+        return {"days": [_day(d, 4, [])], "commute_cache": {f"{d}": {f"{20 + j}": 20.0 + j for j in range(10)}}}
+
+    def final(state: BenchState):
+        rows = [f"| Day {d['day_index']} | 09:00-10:30 | {item['description']} |"
+                for d in state["days"] for item in d["items"]]
+        return {"itinerary": {**state["itinerary"], "final_report": "\n".join(rows * 3)}}
+
+    graph = StateGraph(BenchState)
+    for name, node in [("route_plan", route_plan), ("approve", approve), ("select", select), ("geocode", geocode),
+                       ("day_1", day_1), ("split", split), ("plan_day", plan_day), ("final", final)]:
+        graph.add_node(name, node)
+    graph.add_edge(START, "route_plan")
+    for a, b in [("route_plan", "approve"), ("approve", "select"), ("select", "geocode"), ("geocode", "day_1"),
+                 ("day_1", "split")]:
+        graph.add_edge(a, b)
+    graph.add_conditional_edges("split", fan_out, ["plan_day"])
+    graph.add_edge("plan_day", "final")
+    graph.add_edge("final", END)
+    return graph
+
+
+def _instrument(saver) -> Dict[str, List[float]]:
+    """按实例替换 put / put_writes / get_tuple，记录每次调用耗时（毫秒）"""
+    timings: Dict[str, List[float]] = {"put": [], "put_writes": [], "get_tuple": []}
+    for name in timings:
+        original = getattr(saver, name)
+
+        def timed(*args, __original=original, __name=name, **kwargs):
+            t0 = time.perf_counter()
+            result = __original(*args, **kwargs)
+            timings[__name].append((time.perf_counter() - t0) * 1000)
+            return result
+
+        setattr(saver, name, timed)
+    return timings
+
+
+def run(label: str, saver, threads: int, days: int) -> None:
+    timings = _instrument(saver)
+    app = build_bench_graph(days).compile(checkpointer=saver)
+
+    t0 = time.perf_counter()
+    for t in range(threads):
+        app.invoke({"user": {"thread": t}, "days": [], "commute_cache": {}}, {"configurable": {"thread_id": f"bench-{t}"}})
+    if hasattr(saver, "flush"):
+        saver.flush()
+    wall = (time.perf_counter() - t0) * 1000
+
+    # 读取：模拟 get_state（每个会话最新检查点 + 通道值 + 待处理写入）
+    for t in range(threads):
+        saver.get_tuple({"configurable": {"thread_id": f"bench-{t}", "checkpoint_ns": ""}})
+
+    steps = len(timings["put"])
+    write_total = sum(timings["put"]) + sum(timings["put_writes"])
+    reads = timings["get_tuple"][-threads:]
+    print(f"{label:<24} 超步 {steps:>4}  写入/超步 {write_total / steps:7.3f} ms"
+          f"  put p95 {statistics.quantiles(timings['put'], n=20)[-1]:7.3f} ms"
+          f"  读取 p50 {statistics.median(reads):7.3f} ms  总耗时 {wall:8.1f} ms")
+
+    if hasattr(saver, "report"):
+        report = saver.report()
+        blob_bytes = (report["blob_store"] or {}).get("new_bytes", 0)
+        print(f"{'':<24} 检查点 {report['bytes'] / steps:8.0f} B/超步  大对象存储新增 {blob_bytes / steps:7.0f} B/超步"
+              f"  合计 {(report['bytes'] + blob_bytes) / steps:8.0f} B/超步")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="检查点写入 / 读取延迟基准")
+    parser.add_argument("--threads", type=int, default=20, help="会话数")
+    parser.add_argument("--days", type=int, default=5, help="每个会话并行规划的调研日数")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="checkpoint-bench-")
+    print(f"会话 {args.threads} 个，每个会话 {args.days} 个调研日并行；数据库目录 {workdir}")
+    run("memory", create_checkpointer("memory"), args.threads, args.days)
+    run("sqlite 逐条提交", SQLiteCheckpointSaver(os.path.join(workdir, "unbatched.db"), batch_size=1),
+        args.threads, args.days)
+    run("sqlite 批量提交", SQLiteCheckpointSaver(os.path.join(workdir, "batched.db")), args.threads, args.days)
+    run("sqlite 批量+保留 5 个", SQLiteCheckpointSaver(os.path.join(workdir, "pruned.db"), keep_per_thread=5),
+        args.threads, args.days)
+    run("sqlite 批量+大字段外置", SQLiteCheckpointSaver(
+        os.path.join(workdir, "blobs.db"), serde=CompactSerializer(blob_store=FileBlobStore(os.path.join(workdir, "blobs")))
+    ), args.threads, args.days)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#headless_roundtrips.py
+"""
+无人值守策略的往返测量：同一个带两个中断点的模拟图（benchmarks.batch_dedup），经 api_bridge 的 /workflow/run 运行
+- 交互式：启动 + 每个中断点一次恢复请求（每次恢复都要从 SQLite 检查点重新加载状态）
+- 无人值守：启动时传入 policy，一次请求运行到结束
+比较请求数、每次运行的总耗时与检查点写入量
+
+用法（在 final_target 目录下）：python -m benchmarks.headless_roundtrips [--runs 20] [--latency 0.005]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from typing import Dict, List
+
+os.environ.setdefault("CHECKPOINT_BACKEND", "memory")
+
+import httpx
+
+import api_bridge
+from benchmarks.batch_dedup import build_trip_graph, team_trips
+from benchmarks.run_pool_load import BASE_URL, start_server
+from checkpointing import create_checkpointer
+from run_pool import RunPool
+
+
+def run_interactive(client: httpx.Client, thread_id: str, initial_input: Dict) -> int:
+    requests = 1
+    body = client.post(f"{BASE_URL}/workflow/run", json={"thread_id": thread_id, "initial_input": initial_input}).json()
+    while body["status"] == "NEED_INTERACTION":
+        resume = True if body["interrupt_data"]["type"] == "approval" else ""
+        body = client.post(f"{BASE_URL}/workflow/run", json={"thread_id": thread_id, "resume_value": resume}).json()
+        requests += 1
+    assert body["status"] == "COMPLETED", body
+    return requests
+
+
+def run_headless(client: httpx.Client, thread_id: str, initial_input: Dict) -> int:
+    body = client.post(f"{BASE_URL}/workflow/run", json={"thread_id": thread_id, "initial_input": initial_input,
+                                                        "policy": {}}).json()
+    assert body["status"] == "COMPLETED", body
+    return 1
+
+
+def measure(label: str, runner, client: httpx.Client, runs: int, saver) -> None:
+    latencies: List[float] = []
+    requests = 0
+    before = saver.report()
+    for k, trip in enumerate(team_trips(runs)):
+        t0 = time.perf_counter()
+        requests += runner(client, f"{label}-{k}", trip["initial_input"])
+        latencies.append((time.perf_counter() - t0) * 1000)
+    after = saver.report()
+    print(f"{label:<8} 每次运行 {requests / runs:.1f} 个请求  耗时 p50 {statistics.median(latencies):6.1f} ms"
+          f"  max {max(latencies):6.1f} ms  检查点 {(after['checkpoints'] - before['checkpoints']) / runs:.1f} 个/次"
+          f"  写入 {(after['bytes'] - before['bytes']) / runs / 1024:.1f} KB/次")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="无人值守策略往返测量")
+    parser.add_argument("--runs", type=int, default=20, help="每种模式的运行次数")
+    parser.add_argument("--latency", type=float, default=0.005, help="每次外部请求的模拟耗时（秒）")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        saver = create_checkpointer("sqlite", path=os.path.join(tmp, "bench.db"))
+        api_bridge.run_pool = RunPool(build_trip_graph(args.latency, checkpointer=saver), workers=2)
+        server = start_server()
+        with httpx.Client(timeout=60.0) as client:
+            # 预热外部调用缓存（两种模式的外部请求相同），之后只比较往返与检查点的开销
+            for k, trip in enumerate(team_trips(args.runs)):
+                run_headless(client, f"warmup-{k}", trip["initial_input"])
+            measure("交互式", run_interactive, client, args.runs, saver)
+            measure("无人值守", run_headless, client, args.runs, saver)
+        server.should_exit = True
+        saver.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#job_api_demo.py
+"""
+异步任务 API 演示 / 自测：启动 api_bridge 与本地 webhook 接收端，用带 interrupt 的模拟图走完
+“提交 → 轮询 → 收到 NEED_INTERACTION 回调 → 恢复 job → 收到 COMPLETED 回调”，
+并测量提交请求的响应时间（与运行时长无关）和回调送达延迟
+
+用法（在 final_target 目录下）：python -m benchmarks.job_api_demo [--step-seconds 0.5]
+"""
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, TypedDict
+
+os.environ.setdefault("CHECKPOINT_BACKEND", "memory")
+
+import httpx
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import END, START, StateGraph
+from langgraph.types import interrupt
+
+import api_bridge
+from benchmarks.run_pool_load import BASE_URL, start_server
+from jobs import JobManager
+from run_pool import RunPool
+
+RECEIVER_PORT = 8766
+
+
+class DemoState(TypedDict):
+    steps: List[str]
+    choice: str
+
+
+def build_interrupting_graph(step_seconds: float):
+    """查询（阻塞 step_seconds）→ interrupt 等待选择 → 规划（阻塞 step_seconds）"""
+    def search(state: DemoState) -> Dict[str, Any]:
+        time.sleep(step_seconds)
+        return {"steps": ["search"]}
+
+    def choose(state: DemoState) -> Dict[str, Any]:
+        return {"choice": interrupt({"message": "请选择交通方案", "options": ["G1", "MU5101"]})}
+
+    def plan(state: DemoState) -> Dict[str, Any]:
+        time.sleep(step_seconds)
+        return {"steps": state["steps"] + ["plan"]}
+
+    graph = StateGraph(DemoState)
+    graph.add_node("search", search)
+    graph.add_node("choose", choose)
+    graph.add_node("plan", plan)
+    graph.add_edge(START, "search")
+    graph.add_edge("search", "choose")
+    graph.add_edge("choose", "plan")
+    graph.add_edge("plan", END)
+    return graph.compile(checkpointer=MemorySaver())
+
+
+def start_receiver() -> "queue.Queue[Dict[str, Any]]":
+    received: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            received.put({"at": time.perf_counter(), "payload": json.loads(body),
+                          "signature": self.headers.get("X-Webhook-Signature")})
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", RECEIVER_PORT), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return received
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="异步任务 API 演示")
+    parser.add_argument("--step-seconds", type=float, default=0.5, help="模拟节点的阻塞时长")
+    args = parser.parse_args()
+
+    api_bridge.run_pool = RunPool(build_interrupting_graph(args.step_seconds), workers=2)
+    api_bridge.job_manager = JobManager(api_bridge.run_pool)
+    server = start_server()
+    received = start_receiver()
+    webhook_url = f"http://127.0.0.1:{RECEIVER_PORT}/hook"
+
+    with httpx.Client(timeout=30.0) as client:
+        t0 = time.perf_counter()
+        job = client.post(f"{BASE_URL}/jobs", json={"initial_input": {"steps": []}, "webhook_url": webhook_url}).json()
+        print(f"提交: {(time.perf_counter() - t0) * 1000:.1f} ms → {job['job_id']} [{job['status']}]")
+
+        polled = client.get(f"{BASE_URL}/jobs/{job['job_id']}").json()
+        print(f"轮询: {polled['status']}")
+
+        hook = received.get(timeout=30)
+        print(f"回调: {hook['payload']['status']} {hook['payload']['result']}（提交后 {hook['at'] - t0:.2f} s）")
+
+        t1 = time.perf_counter()
+        resumed = client.post(f"{BASE_URL}/jobs", json={"thread_id": job["thread_id"], "resume_value": "G1",
+                                                        "webhook_url": webhook_url}).json()
+        print(f"恢复: {(time.perf_counter() - t1) * 1000:.1f} ms → {resumed['job_id']} [{resumed['status']}]")
+
+        hook = received.get(timeout=30)
+        print(f"回调: {hook['payload']['status']} {hook['payload']['result']}（恢复后 {hook['at'] - t1:.2f} s）")
+        time.sleep(0.1)
+        final = client.get(f"{BASE_URL}/jobs/{resumed['job_id']}").json()
+        print(f"最终: {final['status']} webhook={final['webhook']}")
+
+    server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#multiworker_app.py
+"""
+多 worker 压测用的 api_bridge：把 run_pool / job_manager 中的图换成模拟图，检查点仍用 api_bridge 的 SQLite 存储
+（由 benchmarks.multiworker_load 以 uvicorn --workers N 启动，并通过环境变量指定共享的检查点与共享存储文件）
+模拟图：plan（外部请求 + CPU）→ approval（中断点）→ finalize（外部请求 + CPU），每个节点记下执行它的进程号，
+最终报告给出整个会话经过的进程号，用来确认恢复请求落到了其它 worker 上
+"""
+import operator
+import os
+import time
+from typing import Annotated, Any, Dict, List, TypedDict
+
+from langgraph.graph import END, START, StateGraph
+from langgraph.types import interrupt
+
+import api_bridge
+from jobs import JobManager
+from run_pool import RunPool
+
+IO_SECONDS = float(os.getenv("MULTIWORKER_IO_SECONDS", 0.05))
+CPU_MS = float(os.getenv("MULTIWORKER_CPU_MS", 10))
+
+
+class SessionState(TypedDict):
+    request: Dict[str, Any]
+    pids: Annotated[List[int], operator.add]
+    itinerary: Dict[str, Any]
+
+
+def _work() -> None:
+    """一次外部请求（阻塞 IO_SECONDS）加 CPU_MS 毫秒的解析 / 序列化计算"""
+    time.sleep(IO_SECONDS)
+    deadline = time.perf_counter() + CPU_MS / 1000
+    while time.perf_counter() < deadline:
+        pass
+
+
+def build_session_graph(checkpointer):
+    def plan(state: SessionState) -> Dict[str, Any]:
+        _work()
+        return {"pids": [os.getpid()]}
+
+    def approval(state: SessionState) -> Dict[str, Any]:
+        approved = interrupt({"type": "approval", "message": "是否采纳推荐方案？", "pid": os.getpid()})
+        return {"pids": [os.getpid()], "itinerary": {"approved": approved}}
+
+    def finalize(state: SessionState) -> Dict[str, Any]:
+        _work()
+        pids = state["pids"] + [os.getpid()]
+        return {"pids": [os.getpid()], "itinerary": {**state["itinerary"], "final_report": ",".join(map(str, pids))}}
+
+    graph = StateGraph(SessionState)
+    graph.add_node("plan", plan)
+    graph.add_node("approval", approval)
+    graph.add_node("finalize", finalize)
+    graph.add_edge(START, "plan")
+    graph.add_edge("plan", "approval")
+    graph.add_edge("approval", "finalize")
+    graph.add_edge("finalize", END)
+    return graph.compile(checkpointer=checkpointer)
+
+
+api_bridge.run_pool = RunPool(build_session_graph(api_bridge.checkpointer))
+api_bridge.job_manager = JobManager(api_bridge.run_pool)
+app = api_bridge.app
+
+
+@app.middleware("http")
+async def worker_pid_header(request, call_next):
+    response = await call_next(request)
+    response.headers["X-Worker-Pid"] = str(os.getpid())
+    return response
@@ -0,0 +1,178 @@
+#multiworker_load.py
+"""
+多 worker 部署压测：以 uvicorn --workers N（N = 1 / 2 / 4 / 8）启动 benchmarks.multiworker_app，
+所有 worker 共用临时目录中的 SQLite 检查点与共享存储（SHARED_STORE_BACKEND=sqlite）
+每个会话两次请求：启动（停在 approval 中断点）→ 恢复（运行到结束）；每个请求都新建连接，由内核在 worker 间分配，
+恢复请求经常落到另一个 worker 上。统计吞吐、会话耗时、跨 worker 恢复的会话数与失败数，再用异步任务接口验证跨 worker 轮询
+最后用进程内检查点 / 共享存储（改动前的部署方式）跑 2 个 worker 作对照：恢复落到其它 worker 的会话会失败
+
+用法（在 final_target 目录下）：python -m benchmarks.multiworker_load [--sessions 64] [--concurrency 16] [--workers 1 2 4 8]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+PORT = 8766
+BASE_URL = f"http://127.0.0.1:{PORT}"
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_workers(workers: int, tmp: str, shared: bool, io_seconds: float, cpu_ms: float) -> subprocess.Popen:
+    backend = "sqlite" if shared else "memory"
+    env = {
+        **os.environ,
+        "PYTHONPATH": ROOT,
+        "CHECKPOINT_BACKEND": backend,
+        "CHECKPOINT_DB_PATH": os.path.join(tmp, "travel.db"),
+        "SHARED_STORE_BACKEND": backend,
+        "SHARED_STORE_PATH": os.path.join(tmp, "shared.db"),
+        "MULTIWORKER_IO_SECONDS": str(io_seconds),
+        "MULTIWORKER_CPU_MS": str(cpu_ms),
+    }
+    env.setdefault("DEEPSEEK_API_KEY", "unused")
+    env.setdefault("DASHSCOPE_API_KEY", "unused")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.multiworker_app:app", "--port", str(PORT),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=ROOT, env=env
+    )
+    # 等所有 worker 都能响应：连续收到 workers 个不同进程号的 /health
+    pids = set()
+    deadline = time.monotonic() + 120
+    while len(pids) < workers and time.monotonic() < deadline:
+        try:
+            with httpx.Client(timeout=5.0) as client:
+                pids.add(client.get(f"{BASE_URL}/health").headers["X-Worker-Pid"])
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    if len(pids) < workers:
+        time.sleep(2.0)
+    return proc
+
+
+def stop_workers(proc: subprocess.Popen) -> None:
+    proc.terminate()
+    try:
+        proc.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+async def _post(client: httpx.AsyncClient, path: str, body: Dict[str, Any], stats: Dict[str, Any]) -> httpx.Response:
+    """请求被准入控制拒绝（429 / 409）时稍后重试"""
+    while True:
+        response = await client.post(f"{BASE_URL}{path}", json=body)
+        stats["pids"].add(response.headers.get("X-Worker-Pid"))
+        if response.status_code not in (409, 429):
+            return response
+        stats["rejected"] += 1
+        await asyncio.sleep(0.05)
+
+
+async def run_session(client: httpx.AsyncClient, thread_id: str, stats: Dict[str, Any]) -> Optional[float]:
+    t0 = time.perf_counter()
+    start = await _post(client, "/workflow/run", {"thread_id": thread_id, "initial_input": {"request": {}}}, stats)
+    resume = await _post(client, "/workflow/run", {"thread_id": thread_id, "resume_value": True}, stats)
+    elapsed = time.perf_counter() - t0
+    if start.status_code != 200 or resume.status_code != 200 or resume.json().get("status") != "COMPLETED":
+        stats["failed"] += 1
+        return None
+    if len(set(resume.json()["final_result"].split(","))) > 1:
+        stats["cross_worker"] += 1
+    return elapsed
+
+
+async def run_load(sessions: int, concurrency: int, label: str) -> Dict[str, Any]:
+    stats: Dict[str, Any] = {"pids": set(), "rejected": 0, "failed": 0, "cross_worker": 0}
+    semaphore = asyncio.Semaphore(concurrency)
+    # 不复用连接：每个请求都重新建连，由内核分配给任一 worker
+    limits = httpx.Limits(max_keepalive_connections=0)
+
+    async with httpx.AsyncClient(timeout=120.0, limits=limits) as client:
+        async def one(k: int) -> Optional[float]:
+            async with semaphore:
+                return await run_session(client, f"{label}-{k}", stats)
+
+        t0 = time.perf_counter()
+        latencies = await asyncio.gather(*(one(k) for k in range(sessions)))
+        wall = time.perf_counter() - t0
+
+    done = sorted(x for x in latencies if x is not None)
+    return {
+        **stats,
+        "wall": wall,
+        "throughput": len(done) / wall,
+        "p50": statistics.median(done) * 1000 if done else None,
+        "p95": done[int(len(done) * 0.95) - 1] * 1000 if done else None,
+    }
+
+
+async def check_jobs(count: int) -> Dict[str, int]:
+    """经异步任务接口提交会话，轮询请求随机落到各 worker：任务记录在共享存储中，任一 worker 都能查到"""
+    result = {"jobs": count, "not_found": 0, "polls": 0}
+    limits = httpx.Limits(max_keepalive_connections=0)
+    async with httpx.AsyncClient(timeout=60.0, limits=limits) as client:
+        for k in range(count):
+            job = (await client.post(f"{BASE_URL}/jobs", json={"thread_id": f"job-check-{k}",
+                                                              "initial_input": {"request": {}}})).json()
+            while True:
+                response = await client.get(f"{BASE_URL}/jobs/{job['job_id']}")
+                result["polls"] += 1
+                if response.status_code == 404:
+                    result["not_found"] += 1
+                elif response.json()["status"] not in ("QUEUED", "RUNNING"):
+                    break
+                await asyncio.sleep(0.02)
+    return result
+
+
+def _report(label: str, result: Dict[str, Any], sessions: int) -> None:
+    p50 = f"{result['p50']:7.1f}" if result["p50"] is not None else "      -"
+    p95 = f"{result['p95']:7.1f}" if result["p95"] is not None else "      -"
+    print(f"{label:<22} 吞吐 {result['throughput']:6.2f} 会话/s  耗时 p50 {p50} ms  p95 {p95} ms"
+          f"  处理请求的进程 {len(result['pids'])} 个  跨 worker 恢复 {result['cross_worker']:>3}/{sessions}"
+          f"  失败 {result['failed']}  重试 {result['rejected']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="多 worker 部署吞吐测量")
+    parser.add_argument("--sessions", type=int, default=64, help="每种配置运行的会话数")
+    parser.add_argument("--concurrency", type=int, default=16, help="同时进行的会话数")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="uvicorn worker 数")
+    parser.add_argument("--io-seconds", type=float, default=0.05, help="每个节点的外部请求耗时（秒）")
+    parser.add_argument("--cpu-ms", type=float, default=10.0, help="每个节点的 CPU 计算耗时（毫秒）")
+    args = parser.parse_args()
+    print(f"🖥️ CPU 核数 {os.cpu_count()}，每个 worker 的运行线程池 {os.getenv('RUN_POOL_WORKERS', 4)} 线程")
+
+    for workers in args.workers:
+        with tempfile.TemporaryDirectory() as tmp:
+            proc = start_workers(workers, tmp, True, args.io_seconds, args.cpu_ms)
+            try:
+                asyncio.run(run_load(4, 4, "warmup"))
+                result = asyncio.run(run_load(args.sessions, args.concurrency, f"w{workers}"))
+                _report(f"共享存储 {workers} workers", result, args.sessions)
+                if workers > 1:
+                    jobs = asyncio.run(check_jobs(8))
+                    print(f"{'':<22} 异步任务 {jobs['jobs']} 个，轮询 {jobs['polls']} 次，未找到任务 {jobs['not_found']} 次")
+            finally:
+                stop_workers(proc)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        proc = start_workers(2, tmp, False, args.io_seconds, args.cpu_ms)
+        try:
+            result = asyncio.run(run_load(args.sessions, args.concurrency, "local"))
+            _report("进程内状态 2 workers", result, args.sessions)
+        finally:
+            stop_workers(proc)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+#offline_e2e.py
+"""
+离线端到端基准测试：启动全部外部服务的本地模拟（benchmarks.provider_standins），把 config.py 的服务地址指向它们，
+以真实的 build_travel_graph() + SQLite 检查点跑完整会话（参数提取 → 交通查询与决策 → 审批 → 调研模式 → 企业勾选 →
+调研日规划 → 最终报告 → 确认），每个中断点按固定策略恢复：
+- approval → 采纳；select_transport → 第 0 个；research_mode_selection → --research-mode；
+  company_multi_selection → 推荐子集（没有时取前 3 家）；refine_itinerary → 直接确认
+节点与外部调用的耗时取自 tracer 的 span（挂一个只记录不导出的 exporter），统计端到端（不含模拟的用户思考时间）、
+每个节点、每个外部调用的 p50 / p95 / p99，以及各模拟服务的请求 / 错误 / 限流计数
+无需网络，适合在 CI 中运行；--json 保存结果，--baseline 与之前的结果比较，超出容差时以非 0 退出
+
+用法（在 final_target 目录下）：
+python -m benchmarks.offline_e2e [--sessions 20] [--concurrency 4] [--latency-scale 0.1] [--profile profile.json]
+                                 [--research-mode 2] [--no-cache] [--json result.json] [--baseline base.json]
+"""
+import argparse
+import contextlib
+import json
+import logging
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
+
+from benchmarks.provider_standins import StandinCluster, load_profile
+
+# 出发 / 目的城市（都在模拟服务的城市坐标表与 CITY_TO_PRIMARY_IATA 中）
+CITIES = ["上海", "北京", "深圳", "广州", "杭州", "成都", "西安", "重庆", "厦门"]
+_HOTELS = ["万丽酒店", "希尔顿酒店", "洲际酒店", "亚朵酒店", "全季酒店"]
+_ROADS = ["人民路", "建设路", "科技路", "滨海大道", "中山路", "解放路"]
+
+
+def trip_text(k: int, seed: int = 0) -> str:
+    """第 k 个会话的行程描述（格式与模拟 LLM 的参数提取一致）：首日下午客户会议，末日上午项目评审"""
+    rng = random.Random(f"{seed}-{k}")
+    origin, destination = rng.sample(CITIES, 2)
+    days = rng.randint(3, 5)
+    departure = date(2026, 3, 2) + timedelta(days=k % 20)
+    last_day = departure + timedelta(days=days - 1)
+    home = f"{origin}市{rng.choice(_ROADS)}{rng.randint(1, 500)}号"
+    hotel = f"{destination}{rng.choice(_ROADS)}{rng.choice(_HOTELS)}"
+    return (f"我要从{origin}出发去{destination}出差 {days} 天，{departure:%Y-%m-%d} 出发。"
+            f"家在{home}，酒店订在{hotel}。"
+            f"{departure:%Y-%m-%d} 15:00-17:00 在{destination}国际会展中心{rng.randint(1, 9)}号馆参加客户会议。"
+            f"{last_day:%Y-%m-%d} 10:00-11:30 在{destination}{rng.choice(_ROADS)}{rng.randint(1, 300)}号参加项目评审。")
+
+
+def resume_value(payload: Dict[str, Any], research_mode: str) -> Any:
+    kind = payload.get("type")
+    if kind == "approval":
+        return True
+    if kind == "select_transport":
+        return "0"
+    if kind == "research_mode_selection":
+        return research_mode
+    if kind == "company_multi_selection":
+        return payload.get("recommended") or payload.get("options", [])[:3]
+    if kind == "refine_itinerary":
+        return ""
+    raise ValueError(f"未知的中断类型: {kind}")
+
+
+class SpanRecorder:
+    """挂在 tracer.exporter 上，只在内存中记录每个 span 的类型、名称、耗时（毫秒）与结果"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.spans: List[tuple] = []
+
+    def export(self, span) -> None:
+        with self._lock:
+            self.spans.append((span.kind, span.name, span.duration_ns / 1e6, span.outcome))
+
+    def clear(self) -> None:
+        with self._lock:
+            self.spans.clear()
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {"recorded": len(self.spans)}
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    """最近秩法的 p50 / p95 / p99（毫秒）"""
+    ordered = sorted(values)
+    if not ordered:
+        return {"count": 0}
+    pick = lambda q: ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+    return {"count": len(ordered), "p50": round(pick(0.50), 1), "p95": round(pick(0.95), 1),
+            "p99": round(pick(0.99), 1), "max": round(ordered[-1], 1)}
+
+
+def run_session(graph, thread_id: str, text: str, research_mode: str, think_seconds: float) -> Dict[str, Any]:
+    from langgraph.types import Command
+
+    config = {"configurable": {"thread_id": thread_id}}
+    started = time.perf_counter()
+    resumes, thinking = 0, 0.0
+    try:
+        result = graph.invoke({"user": {"raw_input": text, "parsed_params": {}}}, config=config)
+        while result.get("__interrupt__"):
+            payload = result["__interrupt__"][0].value
+            if think_seconds:
+                time.sleep(think_seconds)
+                thinking += think_seconds
+            result = graph.invoke(Command(resume=resume_value(payload, research_mode)), config=config)
+            resumes += 1
+        error = (result.get("control") or {}).get("error_message")
+        if not error and not (result.get("itinerary") or {}).get("final_report"):
+            error = "未生成最终报告"
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return {"thread_id": thread_id, "status": "FAILED" if error else "COMPLETED", "error": error, "resumes": resumes,
+            "ms": (time.perf_counter() - started - thinking) * 1000}
+
+
+def run_sessions(graph, label: str, count: int, concurrency: int, args) -> List[Dict[str, Any]]:
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="e2e") as executor:
+        futures = [executor.submit(run_session, graph, f"{label}-{k}", trip_text(k, args.seed if label != "warmup" else -1),
+                                   args.research_mode, args.think_ms / 1000)
+                   for k in range(count)]
+        return [future.result() for future in futures]
+
+
+def _delta(after: Dict[str, Any], before: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: round(value - before.get(key, 0), 3) if isinstance(value, (int, float)) else value
+            for key, value in after.items() if key != "by_path"}
+
+
+def summarize(sessions: List[Dict[str, Any]], spans: List[tuple], wall: float) -> Dict[str, Any]:
+    statuses: Dict[str, int] = {}
+    for session in sessions:
+        statuses[session["status"]] = statuses.get(session["status"], 0) + 1
+    groups: Dict[str, Dict[str, List[float]]] = {"nodes": {}, "calls": {}}
+    errors: Dict[str, int] = {}
+    for kind, name, ms, outcome in spans:
+        if kind == "wait":
+            continue
+        group, key = ("nodes", name) if kind == "node" else ("calls", f"{kind}:{name}")
+        groups[group].setdefault(key, []).append(ms)
+        if outcome in ("error", "empty"):
+            errors[key] = errors.get(key, 0) + 1
+    return {
+        "sessions": statuses,
+        "wall_seconds": round(wall, 2),
+        "throughput_per_minute": round(len(sessions) / wall * 60, 2) if wall else None,
+        "resumes": sum(s["resumes"] for s in sessions),
+        "failures": [{"thread_id": s["thread_id"], "error": s["error"]} for s in sessions if s["error"]][:10],
+        "e2e": percentiles([s["ms"] for s in sessions if s["status"] == "COMPLETED"]),
+        "nodes": {name: {**percentiles(values), "errors": errors.get(name, 0)} for name, values in sorted(groups["nodes"].items())},
+        "calls": {name: {**percentiles(values), "errors": errors.get(name, 0)} for name, values in sorted(groups["calls"].items())},
+    }
+
+
+def _row(label: str, stats: Dict[str, Any]) -> str:
+    if not stats.get("count"):
+        return f"  {label:<34} {'-':>5}"
+    errors = f"  失败/空 {stats['errors']}" if stats.get("errors") else ""
+    return (f"  {label:<34} {stats['count']:>5}  p50 {stats['p50']:9.1f}  p95 {stats['p95']:9.1f}"
+            f"  p99 {stats['p99']:9.1f}  max {stats['max']:9.1f} ms{errors}")
+
+
+def print_report(result: Dict[str, Any]) -> None:
+    print(f"\n📊 会话 {result['sessions']}  恢复 {result['resumes']} 次  总耗时 {result['wall_seconds']} s"
+          f"  吞吐 {result['throughput_per_minute']} 会话/分钟")
+    for failure in result["failures"]:
+        print(f"  ❌ {failure['thread_id']}: {failure['error']}")
+    print("端到端（不含用户思考时间）")
+    print(_row("session", result["e2e"]))
+    print("节点")
+    for name, stats in result["nodes"].items():
+        print(_row(name, stats))
+    print("外部调用（含重试与模型回退）")
+    for name, stats in result["calls"].items():
+        print(_row(name, stats))
+    print("本地模拟服务")
+    for name, stats in result["standins"].items():
+        print(f"  {name:<10} 请求 {stats['requests']:>5}  成功 {stats['ok']:>5}  注入错误 {stats['error']:>4}"
+              f"  限流 {stats['throttled']:>4}  模拟延迟合计 {stats['simulated_latency_seconds']:8.2f} s")
+    cache = result["external_calls"]
+    print(f"外部调用缓存：调用 {cache['total']['requested']}  实际请求 {cache['total']['executed']}"
+          f"  命中 {cache['total']['cache_hits']}  合并 {cache['total']['coalesced']}  令牌桶等待 {cache['rate_limit_wait_seconds']}")
+    speculation = result["speculation"]
+    print(f"推测执行：启动 {speculation['started']}  命中 {speculation['hits']}  未命中 {speculation['misses']}"
+          f"  超时 {speculation['timeouts']}  丢弃 {speculation['discarded']}  失败 {speculation['failed']}")
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], quantile: str, tolerance: float, min_delta_ms: float) -> List[str]:
+    """与基线比较端到端、各节点、各外部调用的同一分位数，超出 (1 + tolerance) 倍且差值超过 min_delta_ms 视为退化"""
+    pairs = [("e2e", result["e2e"], baseline.get("e2e", {}))]
+    for group in ("nodes", "calls"):
+        for name, stats in result[group].items():
+            if name in baseline.get(group, {}):
+                pairs.append((f"{group}.{name}", stats, baseline[group][name]))
+    regressions = []
+    for label, current, base in pairs:
+        if quantile not in current or quantile not in base:
+            continue
+        if current[quantile] > base[quantile] * (1 + tolerance) and current[quantile] - base[quantile] > min_delta_ms:
+            regressions.append(f"{label} {quantile} {base[quantile]:.1f} → {current[quantile]:.1f} ms")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="离线端到端基准测试（本地模拟全部外部服务）")
+    parser.add_argument("--sessions", type=int, default=20, help="测量的会话数")
+    parser.add_argument("--concurrency", type=int, default=4, help="同时进行的会话数")
+    parser.add_argument("--warmup", type=int, default=1, help="预热会话数（不计入统计）")
+    parser.add_argument("--profile", help="覆盖模拟服务默认延迟 / 错误率 / QPS 的 JSON 文件")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="所有模拟延迟乘以该系数（CI 中可用 0.1）")
+    parser.add_argument("--seed", type=int, default=0, help="行程生成与错误注入的随机种子")
+    parser.add_argument("--research-mode", default="2", choices=["2", "3"], help="调研模式中断的回答（2 自动调研，3 跳过）")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="每个中断点模拟的用户思考时间（毫秒，不计入端到端耗时）")
+    parser.add_argument("--no-cache", action="store_true", help="关闭外部调用缓存，每次调用都请求模拟服务")
+    parser.add_argument("--checkpoint", default="sqlite", choices=["sqlite", "memory"], help="检查点存储")
+    parser.add_argument("--verbose", action="store_true", help="保留节点的调试输出与 LLM 用量日志")
+    parser.add_argument("--json", help="把结果写入该 JSON 文件")
+    parser.add_argument("--baseline", help="与之前 --json 保存的结果比较")
+    parser.add_argument("--quantile", default="p95", choices=["p50", "p95", "p99"], help="与基线比较的分位数")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许比基线慢的比例")
+    parser.add_argument("--min-delta-ms", type=float, default=20.0, help="差值低于该毫秒数时不视为退化（过滤抖动）")
+    args = parser.parse_args()
+
+    with StandinCluster(load_profile(args.profile), latency_scale=args.latency_scale, seed=args.seed) as standins, \
+            tempfile.TemporaryDirectory() as tmp:
+        # config.py 在导入时读取这些环境变量：必须在导入图之前设置
+        os.environ.update(standins.env())
+        os.environ["CHECKPOINT_DB_PATH"] = os.path.join(tmp, "travel.db")
+        os.environ["TRACE_LOG_ENABLED"] = "0"
+        os.environ["NO_PROXY"] = ",".join(filter(None, [os.environ.get("NO_PROXY"), "127.0.0.1", "localhost"]))
+        for key in ("AMAP_API_KEY", "JUHE_TRAIN_API_KEY", "SERPAPI_FLIGHTS_API_KEY", "DEEPSEEK_API_KEY", "DASHSCOPE_API_KEY"):
+            os.environ[key] = "offline"
+
+        from checkpointing import create_checkpointer
+        from external_calls import external_calls
+        from graph import build_travel_graph
+        from speculation import speculation_engine
+        from tracing import tracer
+
+        if not args.verbose:
+            # 每次 LLM 调用一行的用量日志同样关闭（统计取自 span）
+            logging.getLogger("llm_usage").setLevel(logging.WARNING)
+        recorder = SpanRecorder()
+        tracer.enabled, tracer.exporter = True, recorder
+        external_calls.enabled = not args.no_cache
+        saver = create_checkpointer(args.checkpoint, **({"path": os.environ["CHECKPOINT_DB_PATH"]} if args.checkpoint == "sqlite" else {}))
+        graph = build_travel_graph().compile(checkpointer=saver)
+        print(f"🧪 本地模拟服务 {standins.ports}，延迟系数 {args.latency_scale}，"
+              f"{args.sessions} 个会话 / 并发 {args.concurrency}，检查点 {args.checkpoint}，"
+              f"外部调用缓存{'关闭' if args.no_cache else '开启'}", file=sys.stderr)
+
+        quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+        with quiet:
+            if args.warmup:
+                run_sessions(graph, "warmup", args.warmup, min(args.warmup, args.concurrency), args)
+            recorder.clear()
+            standins_before = standins.stats()
+            counters = external_calls.counters()
+            started = time.perf_counter()
+            sessions = run_sessions(graph, "e2e", args.sessions, args.concurrency, args)
+            wall = time.perf_counter() - started
+            # 未被采用的推测任务可能仍在请求模拟服务：结束后再统计、停止服务
+            speculation_engine.wait_idle(timeout=60)
+
+        result = summarize(sessions, recorder.spans, wall)
+        result["standins"] = {name: _delta(stats, standins_before[name]) for name, stats in standins.stats().items()}
+        result["external_calls"] = external_calls.report(since=counters)
+        result["speculation"] = speculation_engine.report()
+        result["config"] = {key: value for key, value in vars(args).items() if key not in ("json", "baseline")}
+        close = getattr(saver, "close", None)
+        if close is not None:
+            close()
+
+    print_report(result)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"💾 结果已保存到 {args.json}")
+
+    failed = result["sessions"].get("FAILED", 0)
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(result, json.load(f), args.quantile, args.tolerance, args.min_delta_ms)
+        for line in regressions:
+            print(f"🐢 退化：{line}")
+        if not regressions:
+            print(f"✅ 各项 {args.quantile} 均在基线的 {1 + args.tolerance:.0%} 以内")
+    if failed or regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,590 @@
+#provider_standins.py
+"""
+外部服务的本地模拟（离线基准测试用）：高德（地理编码 / 驾车路径）、SerpApi（Google Flights）、聚合数据（高铁）、
+DeepSeek 与 DashScope（OpenAI 兼容的 /chat/completions），每个服务商一个本地 HTTP 服务，在独立子进程中运行
+- 每个服务商可配置延迟分布（对数正态，给出中位数与 p95）、错误率（返回 HTTP 500）与 QPS 上限
+  超过 QPS 上限时按各服务商的真实表现拒绝：高德 status "0" + CUQPS_HAS_EXCEEDED_THE_LIMIT、聚合 error_code 10012、
+  SerpApi / LLM 返回 HTTP 429
+- 响应结构与真实接口一致，内容由请求参数确定性地生成（同一地址总是同一坐标、同一航线总是同一批航班）
+- LLM 按 system 提示词识别调用点（参数提取 / 交通决策 / 企业推荐 / 企业地址），带 tools 时以 tool_call 返回结构化结果，
+  支持 stream=True（SSE）
+- GET /__stats 返回该服务的请求数、各结果计数与模拟延迟
+
+单独运行（在 final_target 目录下）：python -m benchmarks.provider_standins [--profile profile.json] [--latency-scale 0.1]
+启动后打印需要设置的环境变量，可供 api_bridge / api_server 在无网络环境下运行
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+from urllib.request import urlopen
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 默认配置接近线上观测到的量级：latency_ms 为对数正态分布的中位数与 p95，qps 为 None 表示不限
+DEFAULT_PROFILES: Dict[str, Dict[str, Any]] = {
+    "amap": {"latency_ms": {"median": 40, "p95": 150}, "error_rate": 0.01, "qps": 50},
+    "serpapi": {"latency_ms": {"median": 900, "p95": 2500}, "error_rate": 0.02, "qps": 10},
+    "juhe": {"latency_ms": {"median": 300, "p95": 900}, "error_rate": 0.02, "qps": 10},
+    "deepseek": {"latency_ms": {"median": 1500, "p95": 4000}, "error_rate": 0.01, "qps": 20},
+    "dashscope": {"latency_ms": {"median": 1200, "p95": 3500}, "error_rate": 0.01, "qps": 20},
+}
+
+# 环境变量名 → 服务商：config.py 中各服务的根地址由这些变量覆盖
+ENV_BY_PROVIDER = {
+    "amap": "AMAP_BASE_URL",
+    "serpapi": "SERPAPI_BASE_URL",
+    "juhe": "JUHE_BASE_URL",
+    "deepseek": "DEEPSEEK_API_BASE",
+    "dashscope": "DASHSCOPE_API_BASE",
+}
+
+# 城市中心坐标（lat, lon）；其余城市按名称哈希到国内范围内的某个点
+CITY_CENTERS = {
+    "北京": (39.9042, 116.4074), "上海": (31.2304, 121.4737), "深圳": (22.5431, 114.0579),
+    "广州": (23.1291, 113.2644), "杭州": (30.2741, 120.1551), "成都": (30.5728, 104.0668),
+    "重庆": (29.5630, 106.5516), "西安": (34.3416, 108.9398), "南京": (32.0603, 118.7969),
+    "武汉": (30.5928, 114.3055), "厦门": (24.4798, 118.0894), "苏州": (31.2990, 120.5853),
+}
+
+# 企业推荐的名称后缀（按城市拼出 15 家企业）
+_COMPANY_SUFFIXES = ["智能科技", "半导体", "云计算", "新能源", "生物医药", "机器人", "数据服务", "通信技术",
+                     "精密制造", "汽车电子", "光电", "网络安全", "工业软件", "材料科技", "物联网"]
+
+
+def _seed(*parts: Any) -> int:
+    return int.from_bytes(hashlib.md5("|".join(map(str, parts)).encode("utf-8")).digest()[:8], "big")
+
+
+def _city_center(city: str) -> Tuple[float, float]:
+    if city in CITY_CENTERS:
+        return CITY_CENTERS[city]
+    rng = random.Random(_seed("city", city))
+    return 22.0 + rng.random() * 18.0, 102.0 + rng.random() * 19.0
+
+
+def _haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin(math.radians(lat2 - lat1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 6371.0 * 2 * math.asin(math.sqrt(a))
+
+
+class LatencyModel:
+    """对数正态延迟：给定中位数与 p95（毫秒），scale 整体缩放（CI 中缩短运行时间）"""
+
+    def __init__(self, median_ms: float, p95_ms: float, scale: float = 1.0):
+        self.mu = math.log(max(median_ms * scale, 0.001))
+        self.sigma = max(math.log(max(p95_ms, median_ms) / median_ms), 0.0) / 1.645 if median_ms > 0 else 0.0
+        self.enabled = median_ms > 0 and scale > 0
+
+    def sample(self, rng: random.Random) -> float:
+        return rng.lognormvariate(self.mu, self.sigma) / 1000 if self.enabled else 0.0
+
+
+class QpsWindow:
+    """滑动 1 秒窗口的 QPS 上限（按请求到达时间计）"""
+
+    def __init__(self, qps: Optional[float]):
+        self.qps = qps
+        self._lock = threading.Lock()
+        self._arrivals: deque = deque()
+
+    def admit(self) -> bool:
+        if not self.qps:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            while self._arrivals and now - self._arrivals[0] >= 1.0:
+                self._arrivals.popleft()
+            if len(self._arrivals) >= self.qps:
+                return False
+            self._arrivals.append(now)
+            return True
+
+
+class ProviderState:
+    """单个服务商的运行状态：延迟 / 错误注入 / QPS 窗口与统计"""
+
+    def __init__(self, name: str, profile: Dict[str, Any], latency_scale: float, seed: int):
+        latency = profile.get("latency_ms") or {}
+        self.name = name
+        self.latency = LatencyModel(latency.get("median", 0), latency.get("p95", latency.get("median", 0)), latency_scale)
+        self.error_rate = profile.get("error_rate", 0.0)
+        self.window = QpsWindow(profile.get("qps"))
+        self._rng = random.Random(_seed(seed, name))
+        self._lock = threading.Lock()
+        self.stats: Dict[str, Any] = {"requests": 0, "ok": 0, "error": 0, "throttled": 0, "simulated_latency_seconds": 0.0,
+                                      "by_path": {}}
+
+    def decide(self, path: str) -> Tuple[str, float]:
+        """请求到达时决定结果（ok / error / throttled）与模拟延迟（秒）"""
+        admitted = self.window.admit()
+        with self._lock:
+            delay = self.latency.sample(self._rng)
+            if not admitted:
+                outcome, delay = "throttled", min(delay, 0.01)
+            elif self._rng.random() < self.error_rate:
+                outcome = "error"
+            else:
+                outcome = "ok"
+            self.stats["requests"] += 1
+            self.stats[outcome] += 1
+            self.stats["simulated_latency_seconds"] += delay
+            self.stats["by_path"][path] = self.stats["by_path"].get(path, 0) + 1
+        return outcome, delay
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, "by_path": dict(self.stats["by_path"]),
+                    "simulated_latency_seconds": round(self.stats["simulated_latency_seconds"], 3)}
+
+
+# ---------- 各服务商的响应 ----------
+
+def amap_response(path: str, params: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    if path == "/v3/geocode/geo":
+        address, city = params.get("address", ""), params.get("city", "")
+        lat, lon = _city_center(city)
+        rng = random.Random(_seed("geo", city, address))
+        lat, lon = lat + rng.uniform(-0.15, 0.15), lon + rng.uniform(-0.15, 0.15)
+        return {"status": "1", "info": "OK", "infocode": "10000", "count": "1",
+                "geocodes": [{"formatted_address": address, "city": city, "level": "门牌号",
+                              "location": f"{lon:.6f},{lat:.6f}"}]}
+    if path == "/v3/direction/driving":
+        try:
+            lon1, lat1 = map(float, params["origin"].split(","))
+            lon2, lat2 = map(float, params["destination"].split(","))
+        except (KeyError, ValueError):
+            return {"status": "0", "info": "INVALID_PARAMS", "infocode": "20000", "count": "0"}
+        meters = _haversine_km(lat1, lon1, lat2, lon2) * 1300      # 道路系数约 1.3
+        seconds = int(meters / 1000 / 30 * 3600) + 300              # 市内平均 30 km/h，另加 5 分钟起步
+        return {"status": "1", "info": "OK", "infocode": "10000", "count": "1",
+                "route": {"origin": params["origin"], "destination": params["destination"],
+                          "paths": [{"distance": str(int(meters)), "duration": str(seconds), "strategy": "速度最快"}]}}
+    if path == "/v3/place/text":
+        return {"status": "1", "info": "OK", "infocode": "10000", "count": "0", "pois": []}
+    return None
+
+
+def serpapi_response(path: str, params: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    if path != "/search.json":
+        return None
+    dep, arr, date = params.get("departure_id", ""), params.get("arrival_id", ""), params.get("outbound_date", "")
+    rng = random.Random(_seed("flight", dep, arr, date))
+    base = datetime.strptime(date, "%Y-%m-%d") if date else datetime(2026, 1, 1)
+    minutes = rng.randint(110, 200)
+    groups = []
+    for k in range(rng.randint(8, 14)):
+        departure = base + timedelta(hours=6, minutes=30 + k * 75 + rng.randint(0, 20))
+        duration = minutes + rng.randint(-10, 15)
+        arrival = departure + timedelta(minutes=duration)
+        airline = rng.choice(["CA", "MU", "CZ", "HU", "ZH", "FM"])
+        groups.append({
+            "flights": [{
+                "departure_airport": {"id": dep, "time": departure.strftime("%Y-%m-%d %H:%M")},
+                "arrival_airport": {"id": arr, "time": arrival.strftime("%Y-%m-%d %H:%M")},
+                "flight_number": f"{airline} {rng.randint(1000, 9999)}",
+                "duration": duration,
+            }],
+            "price": rng.randint(600, 2200),
+            "total_duration": duration,
+        })
+    return {"search_metadata": {"status": "Success"}, "best_flights": groups[:3], "other_flights": groups[3:]}
+
+
+def juhe_response(path: str, params: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    if path != "/fapigw/train/query":
+        return None
+    origin, destination, date = params.get("departure_station", ""), params.get("arrival_station", ""), params.get("date", "")
+    rng = random.Random(_seed("train", origin, destination, date))
+    distance = _haversine_km(*_city_center(origin), *_city_center(destination))
+    minutes = int(distance * 1.2 / 250 * 60) + 20                   # 高铁线路系数约 1.2，均速 250 km/h
+    departure_stations = [f"{origin}站", f"{origin}南站"]
+    arrival_stations = [f"{destination}站", f"{destination}北站"]
+    trains = []
+    for k in range(rng.randint(10, 16)):
+        departure = datetime(2026, 1, 1, 6, 0) + timedelta(minutes=k * 55 + rng.randint(0, 25))
+        duration = minutes + rng.randint(-15, 40)
+        arrival = departure + timedelta(minutes=duration)
+        trains.append({
+            "train_no": f"G{rng.randint(1, 9999)}",
+            "departure_station": rng.choice(departure_stations),
+            "arrival_station": rng.choice(arrival_stations),
+            "departure_time": departure.strftime("%H:%M"),
+            "arrival_time": arrival.strftime("%H:%M"),
+            "duration": f"{duration // 60}:{duration % 60:02d}",
+            "prices": [{"seat_name": "二等座", "price": round(distance * 0.46, 1)},
+                       {"seat_name": "一等座", "price": round(distance * 0.74, 1)}],
+        })
+    return {"reason": "查询成功", "error_code": 0, "result": trains}
+
+
+# ---------- LLM（OpenAI 兼容）----------
+
+_TRIP_PATTERNS = {
+    "route": re.compile(r"从(\S+?)出发去(\S+?)出差"),
+    "days": re.compile(r"出差\s*(\d+)\s*天"),
+    "date": re.compile(r"(\d{4}-\d{2}-\d{2})\s*出发"),
+    "home": re.compile(r"家在(.+?)[，,。]"),
+    "hotel": re.compile(r"酒店订在(.+?)[，,。]"),
+    "event": re.compile(r"(\d{4}-\d{2}-\d{2})\s*(\d{1,2}:\d{2})-(\d{1,2}:\d{2})\s*在(.+?)参加(.+?)[，,。]"),
+}
+
+
+def _extract_trip(text: str) -> Dict[str, Any]:
+    """参数提取：按离线基准测试生成的行程描述格式解析（见 benchmarks/offline_e2e.py 的 trip_text）"""
+    route = _TRIP_PATTERNS["route"].search(text)
+    origin, destination = route.groups() if route else ("", "")
+    days = _TRIP_PATTERNS["days"].search(text)
+    date = _TRIP_PATTERNS["date"].search(text)
+    home = _TRIP_PATTERNS["home"].search(text)
+    hotel = _TRIP_PATTERNS["hotel"].search(text)
+    events = [{
+        "name": name,
+        "start_time": f"{day}T{start.zfill(5)}:00",
+        "end_time": f"{day}T{end.zfill(5)}:00",
+        "location": {"city": destination, "address": venue, "name": venue},
+    } for day, start, end, venue, name in _TRIP_PATTERNS["event"].findall(text)]
+    return {
+        "origin_city": origin,
+        "destination_city": destination,
+        "departure_date": date.group(1) if date else "",
+        "home_address": home.group(1) if home else "",
+        "hotel_address": hotel.group(1) if hotel else "",
+        "fixed_events": events,
+        "trip_days": int(days.group(1)) if days else None,
+    }
+
+
+def _choose_transport(text: str) -> Dict[str, Any]:
+    """交通决策：在不晚于最晚到达时间的班次中选出发最晚的一个；都赶不上时选最早到达的"""
+    latest = re.search(r"最晚允许到达枢纽时间（已含缓冲）：(\d{4}-\d{2}-\d{2} \d{2}:\d{2})", text)
+    candidates_text = text.split("候选交通方案：", 1)[-1].strip()
+    try:
+        candidates = json.loads(candidates_text)
+    except ValueError:
+        candidates = []
+    if not candidates:
+        return {"type": "", "id": "", "reasoning": "没有候选方案"}
+
+    def arrival(opt: Dict[str, Any]) -> str:
+        return f"{opt.get('arrival_date', '')} {opt.get('arrival_time', '')}"
+
+    feasible = [opt for opt in candidates if latest and arrival(opt) <= latest.group(1)]
+    if feasible:
+        chosen = max(feasible, key=lambda opt: f"{opt.get('departure_date', '')} {opt.get('departure_time', '')}")
+        reasoning = "满足最晚到达时间的班次中出发最晚的一个，减少等待"
+    else:
+        chosen = min(candidates, key=arrival)
+        reasoning = "没有班次满足最晚到达时间，选择最早到达的班次"
+    return {"type": chosen.get("type"), "id": chosen.get("id"), "reasoning": reasoning}
+
+
+def _human_field(text: str, label: str) -> str:
+    match = re.search(rf"{label}：(.+)", text)
+    return match.group(1).strip() if match else ""
+
+
+def llm_answer(system: str, human: str) -> Any:
+    """按 system 提示词识别调用点，返回结构化结果（dict）或文本（str）"""
+    if "精确地提取" in system:
+        return _extract_trip(human)
+    if "专业的商务出差行程规划" in system:
+        return _choose_transport(human)
+    if "地理信息助手" in system:
+        company, city = _human_field(human, "公司名称"), _human_field(human, "城市")
+        rng = random.Random(_seed("address", city, company))
+        return f"{city}市{rng.choice(['高新', '科技', '软件', '湖滨', '金融'])}区{company}大厦{rng.randint(1, 300)}号"
+    if "商务调研分析师" in system:
+        city = _human_field(human, "城市")
+        return "、".join(f"{city}{suffix}有限公司" for suffix in _COMPANY_SUFFIXES)
+    # 其它调用点默认配置（规则 / 求解器 / 模板）下不会调用 LLM
+    return {}
+
+
+def _message_text(message: Dict[str, Any]) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content
+
+
+def chat_completion(body: Dict[str, Any]) -> Dict[str, Any]:
+    messages = body.get("messages") or []
+    system = "\n".join(_message_text(m) for m in messages if m.get("role") == "system")
+    human = next((_message_text(m) for m in reversed(messages) if m.get("role") == "user"), "")
+    answer = llm_answer(system, human)
+
+    message: Dict[str, Any] = {"role": "assistant", "content": ""}
+    finish_reason = "stop"
+    tools = body.get("tools") or []
+    if tools and isinstance(answer, dict):
+        message["tool_calls"] = [{
+            "id": f"call_{uuid.uuid4().hex[:24]}",
+            "type": "function",
+            "function": {"name": tools[0]["function"]["name"], "arguments": json.dumps(answer, ensure_ascii=False)},
+        }]
+        finish_reason = "tool_calls"
+    else:
+        message["content"] = answer if isinstance(answer, str) else json.dumps(answer, ensure_ascii=False)
+
+    prompt_tokens = (len(system) + len(human)) // 2
+    completion_tokens = max(1, len(message["content"] or json.dumps(message.get("tool_calls"), ensure_ascii=False)) // 2)
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", ""),
+        "choices": [{"index": 0, "message": message, "finish_reason": finish_reason, "logprobs": None}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                  "total_tokens": prompt_tokens + completion_tokens},
+    }
+
+
+def stream_chunks(completion: Dict[str, Any], include_usage: bool) -> List[Dict[str, Any]]:
+    """把完整响应拆成 SSE 增量：内容按约 16 字一段，tool_call 一次给出"""
+    choice = completion["choices"][0]
+    message = choice["message"]
+    base = {key: completion[key] for key in ("id", "created", "model")}
+    base["object"] = "chat.completion.chunk"
+    chunks = [{**base, "choices": [{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}]}]
+    if message.get("tool_calls"):
+        calls = [{**call, "index": k} for k, call in enumerate(message["tool_calls"])]
+        chunks.append({**base, "choices": [{"index": 0, "delta": {"tool_calls": calls}, "finish_reason": None}]})
+    content = message.get("content") or ""
+    for start in range(0, len(content), 16):
+        chunks.append({**base, "choices": [{"index": 0, "delta": {"content": content[start:start + 16]}, "finish_reason": None}]})
+    chunks.append({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": choice["finish_reason"]}]})
+    if include_usage:
+        chunks.append({**base, "choices": [], "usage": completion["usage"]})
+    return chunks
+
+
+# ---------- HTTP 服务 ----------
+
+_REJECTIONS = {
+    "amap": (200, {"status": "0", "info": "CUQPS_HAS_EXCEEDED_THE_LIMIT", "infocode": "10019", "count": "0"}),
+    "juhe": (200, {"reason": "请求超过次数限制", "error_code": 10012, "result": None}),
+    "serpapi": (429, {"error": "Your account has run out of searches per second."}),
+    "deepseek": (429, {"error": {"message": "Rate limit reached", "type": "rate_limit_error"}}),
+    "dashscope": (429, {"error": {"message": "Requests rate limit exceeded", "type": "limit_requests"}}),
+}
+
+_HTTP_HANDLERS = {"amap": amap_response, "serpapi": serpapi_response, "juhe": juhe_response}
+
+
+def _make_handler(state: ProviderState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status: int, payload: Any) -> None:
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_stream(self, completion: Dict[str, Any], include_usage: bool) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            for chunk in stream_chunks(completion, include_usage):
+                self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+            self.close_connection = True
+
+        def _admit(self, path: str) -> Optional[str]:
+            """注入延迟与错误；请求被拒绝或出错时直接写回响应并返回 None"""
+            outcome, delay = state.decide(path)
+            if delay:
+                time.sleep(delay)
+            if outcome == "throttled":
+                self._send_json(*_REJECTIONS[state.name])
+                return None
+            if outcome == "error":
+                self._send_json(500, {"error": {"message": "injected upstream error", "type": "server_error"}})
+                return None
+            return outcome
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/__stats":
+                self._send_json(200, state.report())
+                return
+            responder = _HTTP_HANDLERS.get(state.name)
+            params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            payload = responder(url.path, params) if responder is not None else None
+            if payload is None:
+                self._send_json(404, {"error": f"unknown path {url.path}"})
+                return
+            if self._admit(url.path) is None:
+                return
+            self._send_json(200, payload)
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length) if length else b""
+            if state.name not in ("deepseek", "dashscope") or not url.path.endswith("/chat/completions"):
+                self._send_json(404, {"error": f"unknown path {url.path}"})
+                return
+            if self._admit("/chat/completions") is None:
+                return
+            body = json.loads(raw or b"{}")
+            completion = chat_completion(body)
+            if body.get("stream"):
+                self._send_stream(completion, bool((body.get("stream_options") or {}).get("include_usage")))
+            else:
+                self._send_json(200, completion)
+
+    return Handler
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+
+def merge_profiles(overrides: Optional[Dict[str, Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+    profiles = {name: dict(profile) for name, profile in DEFAULT_PROFILES.items()}
+    for name, override in (overrides or {}).items():
+        if name not in profiles:
+            raise ValueError(f"未知的服务商: {name}（可选 {', '.join(profiles)}）")
+        profiles[name].update(override)
+    return profiles
+
+
+def serve(profiles: Dict[str, Dict[str, Any]], latency_scale: float, seed: int, host: str = "127.0.0.1",
+          ports: Optional[Dict[str, int]] = None) -> Dict[str, int]:
+    """在后台线程中启动全部服务，返回各服务商实际监听的端口（ports 未给出的服务商使用空闲端口）"""
+    actual = {}
+    for name, profile in profiles.items():
+        server = _Server((host, (ports or {}).get(name, 0)), _make_handler(ProviderState(name, profile, latency_scale, seed)))
+        threading.Thread(target=server.serve_forever, name=f"standin-{name}", daemon=True).start()
+        actual[name] = server.server_address[1]
+    return actual
+
+
+def standin_env(ports: Dict[str, int], host: str = "127.0.0.1") -> Dict[str, str]:
+    """把 config.py 中各服务的根地址指向本地模拟服务所需的环境变量"""
+    env = {variable: f"http://{host}:{ports[name]}" for name, variable in ENV_BY_PROVIDER.items()}
+    env["DEEPSEEK_API_BASE"] += "/v1"
+    env["DASHSCOPE_API_BASE"] += "/compatible-mode/v1"
+    return env
+
+
+class StandinCluster:
+    """在子进程中运行全部模拟服务（不与被测图争用 GIL）；env() 给出把 config.py 指向它们所需的环境变量"""
+
+    def __init__(self, profiles: Optional[Dict[str, Dict[str, Any]]] = None, latency_scale: float = 1.0, seed: int = 0,
+                 host: str = "127.0.0.1"):
+        self.profiles = merge_profiles(profiles)
+        self.latency_scale = latency_scale
+        self.seed = seed
+        self.host = host
+        self.ports: Dict[str, int] = {}
+        self._process: Optional[subprocess.Popen] = None
+
+    def start(self) -> "StandinCluster":
+        self._process = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.provider_standins", "--profile-json", json.dumps(self.profiles),
+             "--latency-scale", str(self.latency_scale), "--seed", str(self.seed), "--host", self.host, "--ready-json"],
+            cwd=ROOT, env={**os.environ, "PYTHONPATH": ROOT}, stdout=subprocess.PIPE, text=True
+        )
+        # 子进程启动完成后在 stdout 输出一行端口表
+        line = self._process.stdout.readline()
+        if not line:
+            self.stop()
+            raise RuntimeError("本地模拟服务启动失败")
+        self.ports = json.loads(line)
+        return self
+
+    def url(self, name: str) -> str:
+        return f"http://{self.host}:{self.ports[name]}"
+
+    def env(self) -> Dict[str, str]:
+        return standin_env(self.ports, self.host)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        result = {}
+        for name in self.ports:
+            with urlopen(f"{self.url(name)}/__stats", timeout=5) as response:
+                result[name] = json.loads(response.read())
+        return result
+
+    def stop(self) -> None:
+        if self._process is None:
+            return
+        self._process.terminate()
+        try:
+            self._process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+        self._process = None
+
+    def __enter__(self) -> "StandinCluster":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def load_profile(path: Optional[str]) -> Optional[Dict[str, Dict[str, Any]]]:
+    """配置文件为 JSON，只需写出要覆盖的字段，如 {"amap": {"qps": 5}, "deepseek": {"error_rate": 0.1}}"""
+    if not path:
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="外部服务的本地模拟")
+    parser.add_argument("--profile", help="覆盖默认延迟 / 错误率 / QPS 的 JSON 文件")
+    parser.add_argument("--profile-json", help="同 --profile，直接给出 JSON 字符串")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="所有模拟延迟乘以该系数")
+    parser.add_argument("--seed", type=int, default=0, help="延迟与错误注入的随机种子")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port-base", type=int, help="从该端口起依次监听（默认使用空闲端口）")
+    parser.add_argument("--ready-json", action="store_true", help="启动后只输出一行 JSON 端口表（供 StandinCluster 读取）")
+    args = parser.parse_args()
+
+    overrides = json.loads(args.profile_json) if args.profile_json else load_profile(args.profile)
+    profiles = merge_profiles(overrides)
+    ports = {name: args.port_base + k for k, name in enumerate(profiles)} if args.port_base else None
+    actual = serve(profiles, args.latency_scale, args.seed, args.host, ports)
+    if args.ready_json:
+        print(json.dumps(actual), flush=True)
+    else:
+        print("🧪 本地模拟服务已启动，设置以下环境变量后运行 api_bridge / api_server：")
+        for variable, value in standin_env(actual, args.host).items():
+            print(f"export {variable}={value}")
+        print("export AMAP_API_KEY=offline JUHE_TRAIN_API_KEY=offline SERPAPI_FLIGHTS_API_KEY=offline "
+              "DEEPSEEK_API_KEY=offline DASHSCOPE_API_KEY=offline", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
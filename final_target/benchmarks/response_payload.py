@@ -0,0 +1,110 @@
+#response_payload.py
+"""
+api_server /run 响应测量：在停在 refine_itinerary 中断点的完整状态上（40 个航班、60 个车次、15 家企业、
+5 个调研日、通勤矩阵、最终报告），比较各 view / fields 的响应大小与序列化耗时：
+- 旧版：返回 dict，FastAPI 先 jsonable_encoder 再 json.dumps
+- 新版：project_state 裁剪后由 OrjsonResponse 直接序列化
+以及 gzip（GZipMiddleware 默认压缩级别 9）后的大小与压缩耗时
+
+用法（在 final_target 目录下）：python -m benchmarks.response_payload [--repeat 200]
+"""
+import argparse
+import gzip
+import statistics
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from langgraph.types import Interrupt
+
+from benchmarks.checkpoint_bench import _day, _items, _options
+from data_models import CompanyInfo
+from response_views import OrjsonResponse, project_state
+
+
+def realistic_state(days: int = 5) -> Dict[str, Any]:
+    """与 user_refine_itinerary 中断时的 invoke 结果同形（含 __interrupt__）"""
+    hotel = {"city": "深圳", "address": "深圳市南山区科苑南路 3099 号", "name": "深圳湾万丽酒店", "lat": 22.5178, "lon": 113.9437}
+    fixed_events = [{"name": f"客户会议 #{k}", "start_time": datetime(2026, 1, 15 + k, 14), "end_time": datetime(2026, 1, 15 + k, 16),
+                     "location": {**hotel, "name": f"会场 {k}"}} for k in range(2)]
+    flights, trains = _options("Flight", 40), _options("Train", 60)
+    selected = {"type": "transport", "description": "航班 F1003 上海虹桥 → 深圳宝安",
+                "start_time": datetime(2026, 1, 15, 9, 3), "end_time": datetime(2026, 1, 15, 11, 24),
+                "location": hotel, "details": flights[3]}
+    candidates = [CompanyInfo(name=f"深圳某科技有限公司{k}", address=f"深圳市南山区科技南{k}路{k * 3}号",
+                              lat=22.5 + k / 200, lon=113.9 + k / 300) for k in range(15)]
+    day_plans = [_day(d, 4, [c.name for c in candidates[3 * (d - 2):3 * (d - 1)]]) for d in range(1, days + 2)]
+    final_itinerary = [item for day in day_plans for item in day["items"]]
+    rows = {str(day["day_index"]): [f"| Day {day['day_index']} | {item['start_time']:%H:%M}-{item['end_time']:%H:%M} "
+                                    f"| {item['description']} | {item['location']['address']} |" for item in day["items"]]
+            for day in day_plans}
+    report = "| 日期 | 时间 | 安排 | 地点 |\n|---|---|---|---|\n" + "\n".join(r for day_rows in rows.values() for r in day_rows)
+    violations = [{"type": "late_arrival", "severity": "warning", "day_index": 3, "message": "到达会场晚于会前缓冲"}]
+    state = {
+        "user": {"raw_input": "我要从上海出发去深圳出差 6 天，住深圳湾万丽酒店，15、16 号下午各有一场客户会议，其余时间调研当地科技企业。",
+                 "parsed_params": {"origin_city": "上海", "destination_city": "深圳", "departure_date": "2026-01-15",
+                                   "home_address": "上海市徐汇区漕溪北路 88 号", "hotel_address": hotel["address"],
+                                   "fixed_events": fixed_events, "trip_days": days + 1}},
+        "locations": {"home": {"city": "上海", "address": "上海市徐汇区漕溪北路 88 号", "name": "家", "lat": 31.19, "lon": 121.43},
+                      "hotel": hotel},
+        "transport": {"flight_options": flights, "train_options": trains, "selected_index": 3,
+                      "selected_option_raw": flights[3], "selected_transport": selected, "approved": True},
+        "companies": {"target_names": [c.name for c in candidates], "candidates": candidates, "unscheduled": []},
+        "itinerary": {"fixed_events": fixed_events, "final_itinerary": final_itinerary, "final_report": report,
+                      "report_rows": rows, "violations": {"final": violations}},
+        "control": {"error_message": None, "refinement_instruction": None},
+        "days": day_plans,
+        "commute_cache": {f"{22.5 + i / 100:.4f},113.9{i}": {f"{22.5 + j / 100:.4f},113.9{j}": 12.5 + i + j for j in range(20)}
+                          for i in range(20)},
+        "policy": None,
+    }
+    payload = {"type": "refine_itinerary", "final_report": report, "violations": violations,
+               "message": "是否需要修改行程？如果需要，请输入修改要求；不需要请直接确认。"}
+    state["__interrupt__"] = [Interrupt(value=payload, id="0" * 32)]
+    return state
+
+
+def _median_ms(fn: Callable[[], Any], repeat: int) -> float:
+    samples: List[float] = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def _response(state: Dict[str, Any], data: Any) -> Dict[str, Any]:
+    return {"thread_id": "api-bench", "status": "interrupted", "data": data, "interrupt_info": state["__interrupt__"]}
+
+
+def measure(label: str, state: Dict[str, Any], repeat: int, view: str = "full", fields: Optional[List[str]] = None,
+            legacy: bool = False) -> None:
+    if legacy:
+        render = lambda: JSONResponse(jsonable_encoder(_response(state, state))).body
+    else:
+        render = lambda: OrjsonResponse(_response(state, project_state(state, view, fields))).body
+    body = render()
+    compressed = gzip.compress(body, compresslevel=9)
+    print(f"{label:<34} {len(body) / 1024:8.1f} KB  序列化 {_median_ms(render, repeat):7.3f} ms"
+          f"  gzip 后 {len(compressed) / 1024:6.1f} KB（压缩 {_median_ms(lambda: gzip.compress(body, 9), repeat):6.3f} ms）")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="api_server 响应大小与序列化耗时")
+    parser.add_argument("--repeat", type=int, default=200, help="每种方式重复次数（取中位数）")
+    parser.add_argument("--days", type=int, default=5, help="调研日天数")
+    args = parser.parse_args()
+
+    state = realistic_state(args.days)
+    measure("旧版 full（jsonable_encoder + json）", state, args.repeat, legacy=True)
+    measure("view=full（orjson）", state, args.repeat)
+    measure("view=summary", state, args.repeat, view="summary")
+    measure("view=report", state, args.repeat, view="report")
+    measure("view=interrupt", state, args.repeat, view="interrupt")
+    measure("fields=[transport.selected_transport]", state, args.repeat, fields=["transport.selected_transport"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#run_pool_load.py
+"""
+api_bridge 运行线程池压测：用睡眠节点模拟 LLM / 地图调用的图替换 run_pool 中的图，
+通过 HTTP 并发请求 /workflow/run，比较不同线程池大小下的吞吐，同时持续请求 /health 观察事件循环是否被阻塞；
+最后用很小的排队上限验证 429 + Retry-After 与取消
+
+用法（在 final_target 目录下）：python -m benchmarks.run_pool_load [--runs 32] [--step-seconds 0.1]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import threading
+import time
+from typing import Any, Dict, List, TypedDict
+
+os.environ.setdefault("CHECKPOINT_BACKEND", "memory")
+
+import httpx
+import uvicorn
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import END, START, StateGraph
+
+import api_bridge
+from run_pool import RunPool
+
+PORT = 8765
+BASE_URL = f"http://127.0.0.1:{PORT}"
+
+
+class LoadState(TypedDict):
+    steps: List[str]
+
+
+def build_stand_in_graph(step_seconds: float, steps: int = 3):
+    """每个节点阻塞 step_seconds 秒（与真实节点一样是同步 I/O），共 steps 个超步"""
+    graph = StateGraph(LoadState)
+    names = [f"step_{k}" for k in range(steps)]
+    for name in names:
+        def node(state: LoadState, __name=name) -> Dict[str, Any]:
+            time.sleep(step_seconds)
+            return {"steps": state.get("steps", []) + [__name]}
+        graph.add_node(name, node)
+    graph.add_edge(START, names[0])
+    for a, b in zip(names, names[1:]):
+        graph.add_edge(a, b)
+    graph.add_edge(names[-1], END)
+    return graph.compile(checkpointer=MemorySaver())
+
+
+def start_server() -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(api_bridge.app, host="127.0.0.1", port=PORT, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def _probe_health(client: httpx.AsyncClient, stop: asyncio.Event, latencies: List[float]) -> None:
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await client.get(f"{BASE_URL}/health")
+        latencies.append((time.perf_counter() - t0) * 1000)
+        await asyncio.sleep(0.02)
+
+
+async def _client_loop(client: httpx.AsyncClient, jobs: asyncio.Queue, status: Dict[int, int]) -> None:
+    """单个客户端：依次取任务发请求；遇到 429 按 Retry-After 等待后重试"""
+    while not jobs.empty():
+        thread_id = await jobs.get()
+        while True:
+            response = await client.post(f"{BASE_URL}/workflow/run", json={"thread_id": thread_id, "initial_input": {"steps": []}})
+            status[response.status_code] = status.get(response.status_code, 0) + 1
+            if response.status_code != 429:
+                break
+            await asyncio.sleep(float(response.headers.get("Retry-After", 1)))
+
+
+async def measure(workers: int, runs: int, clients: int, step_seconds: float) -> None:
+    api_bridge.run_pool = RunPool(build_stand_in_graph(step_seconds), workers=workers, max_queue=runs)
+    jobs: asyncio.Queue = asyncio.Queue()
+    for k in range(runs):
+        jobs.put_nowait(f"load-{workers}-{k}")
+
+    status: Dict[int, int] = {}
+    health: List[float] = []
+    stop = asyncio.Event()
+    async with httpx.AsyncClient(timeout=120.0) as client:
+        probe = asyncio.create_task(_probe_health(client, stop, health))
+        t0 = time.perf_counter()
+        await asyncio.gather(*[_client_loop(client, jobs, status) for _ in range(clients)])
+        elapsed = time.perf_counter() - t0
+        stop.set()
+        await probe
+
+    print(f"线程池 {workers:>2}  运行 {runs}  耗时 {elapsed:6.2f} s  吞吐 {runs / elapsed:6.2f} 次/s"
+          f"  /health p50 {statistics.median(health):6.1f} ms  max {max(health):6.1f} ms  状态码 {status}")
+
+
+async def admission_demo(step_seconds: float) -> None:
+    """线程池 1、排队上限 1：第三个并发请求应收到 429；排队中的运行可被取消"""
+    api_bridge.run_pool = RunPool(build_stand_in_graph(step_seconds), workers=1, max_queue=1)
+    async with httpx.AsyncClient(timeout=60.0) as client:
+        post = lambda tid: client.post(f"{BASE_URL}/workflow/run", json={"thread_id": tid, "initial_input": {"steps": []}})
+        first = asyncio.create_task(post("admit-1"))
+        await asyncio.sleep(0.05)
+        second = asyncio.create_task(post("admit-2"))
+        await asyncio.sleep(0.05)
+        third = await post("admit-3")
+        print(f"排队已满: {third.status_code} Retry-After={third.headers.get('Retry-After')} {third.json()['detail']}")
+        cancelled = await client.post(f"{BASE_URL}/workflow/cancel/admit-2")
+        running = await client.post(f"{BASE_URL}/workflow/cancel/admit-1")
+        print(f"取消排队中的运行: {cancelled.json()}  取消执行中的运行: {running.json()}")
+        print(f"结果: admit-1 → {(await first).json()['status']}  admit-2 → {(await second).json()['status']}")
+        print(f"线程池统计: {(await client.get(f'{BASE_URL}/workflow/pool')).json()}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="api_bridge 运行线程池压测")
+    parser.add_argument("--runs", type=int, default=32, help="每种线程池大小下的运行次数")
+    parser.add_argument("--clients", type=int, default=16, help="并发客户端数")
+    parser.add_argument("--step-seconds", type=float, default=0.1, help="每个节点模拟的阻塞时长")
+    args = parser.parse_args()
+
+    server = start_server()
+    print(f"每次运行 3 个超步 × {args.step_seconds}s，{args.clients} 个并发客户端")
+    for workers in (1, 2, 4, 8):
+        asyncio.run(measure(workers, args.runs, args.clients, args.step_seconds))
+    asyncio.run(admission_demo(args.step_seconds))
+    server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
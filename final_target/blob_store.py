@@ -0,0 +1,140 @@
+#blob_store.py
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, Optional, Set, Tuple
+
+from config import CHECKPOINT_BLOB_GRACE_SECONDS
+
+
+class BlobStore:
+    """
+    内容寻址的大对象存储：键为内容哈希，同样的内容只存一份
+    检查点序列化时把大字段（交通选项、企业列表、最终报告等）放到这里，检查点里只保留哈希引用
+    """
+
+    def __init__(self):
+        self.stats = {"puts": 0, "reused": 0, "new_bytes": 0, "gets": 0}
+
+    def put(self, key: str, type_: str, data: bytes) -> None:
+        raise NotImplementedError
+
+    def get(self, key: str) -> Tuple[str, bytes]:
+        raise NotImplementedError
+
+    def sweep(self, live: Set[str], grace_seconds: float) -> int:
+        """删除不在 live 中、且超过 grace_seconds 未写入的内容（宽限期内的可能属于其它进程尚未落盘的检查点），返回删除数量"""
+        return 0
+
+    def report(self) -> Dict[str, int]:
+        return dict(self.stats)
+
+
+class MemoryBlobStore(BlobStore):
+    """进程内存储（配合 MemorySaver 使用）"""
+
+    def __init__(self):
+        super().__init__()
+        self._blobs: Dict[str, Tuple[str, bytes]] = {}
+        self._lock = threading.Lock()
+
+    def put(self, key: str, type_: str, data: bytes) -> None:
+        with self._lock:
+            self.stats["puts"] += 1
+            if key in self._blobs:
+                self.stats["reused"] += 1
+                return
+            self._blobs[key] = (type_, data)
+            self.stats["new_bytes"] += len(data)
+
+    def sweep(self, live: Set[str], grace_seconds: float) -> int:
+        with self._lock:
+            dead = [key for key in self._blobs if key not in live]
+            for key in dead:
+                del self._blobs[key]
+        return len(dead)
+
+    def get(self, key: str) -> Tuple[str, bytes]:
+        self.stats["gets"] += 1
+        try:
+            return self._blobs[key]
+        except KeyError:
+            raise KeyError(f"检查点引用的大对象不存在: {key}") from None
+
+
+class FileBlobStore(BlobStore):
+    """
+    本地目录存储：root/<前两位>/<哈希>，文件首行为序列化类型，其余为数据
+    写入先落临时文件再原子替换，多进程同时写同一内容也安全；已存在的内容只刷新修改时间（供 sweep 判断宽限期）
+    本进程 refresh_seconds 内刷新过的键不再重复 utime；该间隔须远小于 sweep 的宽限期，否则仍被引用的内容可能在刷新前被清除
+    """
+
+    def __init__(self, root: str, refresh_seconds: float = CHECKPOINT_BLOB_GRACE_SECONDS / 4):
+        super().__init__()
+        self.root = root
+        self.refresh_seconds = refresh_seconds
+        os.makedirs(root, exist_ok=True)
+        self._known: Dict[str, float] = {}    # 本进程已确认存在的键 → 上次刷新修改时间
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def put(self, key: str, type_: str, data: bytes) -> None:
+        now = time.time()
+        with self._lock:
+            self.stats["puts"] += 1
+            touched = self._known.get(key)
+            if touched is not None and now - touched < self.refresh_seconds:
+                self.stats["reused"] += 1
+                return
+
+        path = self._path(key)
+        if os.path.exists(path):
+            os.utime(path)
+            with self._lock:
+                self.stats["reused"] += 1
+                self._known[key] = now
+            return
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(type_.encode("utf-8") + b"\n" + data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.stats["new_bytes"] += len(data)
+            self._known[key] = now
+
+    def get(self, key: str) -> Tuple[str, bytes]:
+        self.stats["gets"] += 1
+        try:
+            with open(self._path(key), "rb") as f:
+                raw = f.read()
+        except FileNotFoundError:
+            raise KeyError(f"检查点引用的大对象不存在: {key}") from None
+        type_, _, data = raw.partition(b"\n")
+        return type_.decode("utf-8"), data
+
+    def sweep(self, live: Set[str], grace_seconds: float) -> int:
+        cutoff = time.time() - grace_seconds
+        removed = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename in live:
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except FileNotFoundError:
+                    continue
+        with self._lock:
+            self._known.clear()
+        return removed
+
+
+def create_blob_store(root: Optional[str]) -> BlobStore:
+    return FileBlobStore(root) if root else MemoryBlobStore()
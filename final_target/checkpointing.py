@@ -0,0 +1,573 @@
+#checkpointing.py
+import atexit
+import hashlib
+import os
+import random
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    SerializerProtocol,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.types import Send
+from pydantic import BaseModel
+
+import data_models
+from blob_store import BlobStore, FileBlobStore
+from config import (
+    CHECKPOINT_BACKEND,
+    CHECKPOINT_DB_PATH,
+    CHECKPOINT_BATCH_SIZE,
+    CHECKPOINT_FLUSH_INTERVAL_SECONDS,
+    CHECKPOINT_COMPRESS_MIN_BYTES,
+    CHECKPOINT_KEEP_PER_THREAD,
+    CHECKPOINT_TTL_HOURS,
+    CHECKPOINT_SWEEP_INTERVAL_SECONDS,
+    CHECKPOINT_BLOB_DIR,
+    CHECKPOINT_BLOB_MIN_BYTES,
+    CHECKPOINT_BLOB_GRACE_SECONDS,
+)
+
+_COMPRESSED_SUFFIX = "+z"
+_BLOB_REF = "__blob__"
+# 状态中会出现的 pydantic 模型（CompanyInfo 等）：显式登记后反序列化不再告警，其余非内置类型一律拒绝
+_STATE_MODELS = [
+    (data_models.__name__, name) for name, obj in vars(data_models).items()
+    if isinstance(obj, type) and issubclass(obj, BaseModel) and obj.__module__ == data_models.__name__
+]
+_INTERRUPT_CHANNEL = "__interrupt__"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT,
+    checkpoint BLOB,
+    metadata_type TEXT,
+    metadata BLOB,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    channel TEXT NOT NULL,
+    version TEXT NOT NULL,
+    type TEXT NOT NULL,
+    blob BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT,
+    value BLOB,
+    task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+CREATE INDEX IF NOT EXISTS idx_checkpoints_created ON checkpoints (thread_id, created_at);
+"""
+
+
+class CompactSerializer(SerializerProtocol):
+    """
+    在默认的 JsonPlus（msgpack）序列化之上：
+    - 对超过 CHECKPOINT_COMPRESS_MIN_BYTES 的值做 zlib 压缩；类型标记加 "+z" 后缀，读取时按后缀解压
+    - 配置了 blob_store 时，通道值（如 transport / companies / itinerary 上下文）中序列化后超过 blob_min_bytes 的字段
+      单独存入内容寻址存储，检查点里只留 {"__blob__": 哈希}；读取时自动还原，节点拿到的仍是完整状态
+      交通选项、企业列表、最终报告等在后续超步中内容不变，只在第一次出现时写入一次
+    - 检查点本体与元数据（channel_versions 等每个超步都会变化的记录）用 dumps_typed_inline，不外置
+    """
+
+    def __init__(self, inner: Optional[SerializerProtocol] = None, min_bytes: int = CHECKPOINT_COMPRESS_MIN_BYTES,
+                 blob_store: Optional[BlobStore] = None, blob_min_bytes: Optional[int] = CHECKPOINT_BLOB_MIN_BYTES):
+        self.inner = inner or JsonPlusSerializer(allowed_msgpack_modules=_STATE_MODELS)
+        self.min_bytes = min_bytes
+        self.blob_store = blob_store if blob_min_bytes else None
+        self.blob_min_bytes = blob_min_bytes
+
+    def _dumps(self, obj: Any) -> Tuple[str, bytes]:
+        type_, data = self.inner.dumps_typed(obj)
+        if len(data) >= self.min_bytes:
+            compressed = zlib.compress(data, 1)
+            if len(compressed) < len(data):
+                return type_ + _COMPRESSED_SUFFIX, compressed
+        return type_, data
+
+    def _loads(self, data: Tuple[str, bytes]) -> Any:
+        type_, payload = data
+        if type_.endswith(_COMPRESSED_SUFFIX):
+            return self.inner.loads_typed((type_[:-len(_COMPRESSED_SUFFIX)], zlib.decompress(payload)))
+        return self.inner.loads_typed((type_, payload))
+
+    def _externalize(self, value: Any) -> Any:
+        """只处理一层：大字段整体外置，字段内部不再拆分"""
+        if not isinstance(value, (dict, list, str, BaseModel)):
+            return value
+        if isinstance(value, str) and len(value.encode("utf-8")) < self.blob_min_bytes:
+            return value
+        type_, data = self._dumps(value)
+        if len(data) < self.blob_min_bytes:
+            return value
+        key = hashlib.blake2b(type_.encode("utf-8") + b"\0" + data, digest_size=20).hexdigest()
+        self.blob_store.put(key, type_, data)
+        return {_BLOB_REF: key}
+
+    @staticmethod
+    def _ref_key(value: Any) -> Optional[str]:
+        if isinstance(value, dict) and len(value) == 1 and _BLOB_REF in value:
+            return value[_BLOB_REF]
+        return None
+
+    def _resolve(self, value: Any) -> Any:
+        key = self._ref_key(value)
+        return self._loads(self.blob_store.get(key)) if key else value
+
+    @staticmethod
+    def _map_fields(obj: Any, fn) -> Any:
+        """对通道值的第一层字段逐个应用 fn；Send（并行分支的输入，如各调研日共用的通勤缓存）处理其 arg 的字段"""
+        if isinstance(obj, dict):
+            return {k: fn(v) for k, v in obj.items()}
+        if isinstance(obj, list):
+            return [fn(v) for v in obj]
+        if isinstance(obj, Send) and isinstance(obj.arg, dict):
+            return Send(obj.node, {k: fn(v) for k, v in obj.arg.items()})
+        return obj
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        if self.blob_store is not None:
+            obj = self._map_fields(obj, self._externalize)
+        return self._dumps(obj)
+
+    def dumps_typed_inline(self, obj: Any) -> Tuple[str, bytes]:
+        """只压缩、不外置大字段（检查点本体与元数据每个超步都不同，外置只会产生无法复用的大对象）"""
+        return self._dumps(obj)
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        obj = self._loads(data)
+        if self.blob_store is not None:
+            obj = self._map_fields(obj, self._resolve)
+        return obj
+
+    def blob_refs(self, data: Tuple[str, bytes]) -> List[str]:
+        """序列化数据中引用的大对象哈希（不还原内容，供清理时标记仍在使用的大对象）"""
+        keys: List[str] = []
+        self._map_fields(self._loads(data), lambda v: keys.append(self._ref_key(v)))
+        return [key for key in keys if key]
+
+
+class SQLiteCheckpointSaver(BaseCheckpointSaver[str]):
+    """
+    基于 SQLite（WAL 模式）的 LangGraph 检查点存储：
+    - 与 MemorySaver 相同的存储布局：检查点本体 + 按 (通道, 版本) 存放的通道值，未变化的通道不会重复写入
+    - 批量写入：put / put_writes 先进入内存缓冲，满 CHECKPOINT_BATCH_SIZE 条、距上次落盘超过
+      CHECKPOINT_FLUSH_INTERVAL_SECONDS、遇到 interrupt、任何读取之前、或进程退出时，在一个事务里统一写入
+    - 保留策略：每个会话只保留最近 CHECKPOINT_KEEP_PER_THREAD 个检查点，超过 CHECKPOINT_TTL_HOURS 未更新的会话整体删除；
+      启动时及之后每 CHECKPOINT_SWEEP_INTERVAL_SECONDS 秒执行一次过期删除与大对象清除
+    多个进程可共用同一个数据库文件（WAL 允许并发读，写入由 SQLite 串行化）
+    """
+
+    def __init__(
+        self,
+        path: str = CHECKPOINT_DB_PATH,
+        *,
+        serde: Optional[SerializerProtocol] = None,
+        batch_size: int = CHECKPOINT_BATCH_SIZE,
+        flush_interval: float = CHECKPOINT_FLUSH_INTERVAL_SECONDS,
+        keep_per_thread: Optional[int] = CHECKPOINT_KEEP_PER_THREAD,
+        ttl_hours: Optional[float] = CHECKPOINT_TTL_HOURS,
+        sweep_interval: Optional[float] = CHECKPOINT_SWEEP_INTERVAL_SECONDS,
+    ):
+        super().__init__(serde=serde or CompactSerializer())
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.keep_per_thread = keep_per_thread
+        self.ttl_hours = ttl_hours
+        self.sweep_interval = sweep_interval
+
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+        self._pending_checkpoints: List[tuple] = []
+        self._pending_blobs: List[tuple] = []
+        self._pending_writes: List[tuple] = []
+        self._touched: set = set()
+        self._last_flush = time.monotonic()
+        self.stats = {"flushes": 0, "checkpoints": 0, "writes": 0, "bytes": 0, "pruned": 0, "expired_threads": 0,
+                      "swept_blobs": 0}
+
+        self._expire_threads()
+        self._last_sweep = time.monotonic()
+        atexit.register(self.flush)
+        # 一次运行结束后不会再有 put 触发按时落盘：后台线程保证缓冲最多停留 flush_interval 秒（其它进程也能及时读到）
+        self._closed = threading.Event()
+        threading.Thread(target=self._flush_loop, name="checkpoint-flush", daemon=True).start()
+
+    # ========= 写入（缓冲） =========
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        c = checkpoint.copy()
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        values: Dict[str, Any] = c.pop("channel_values")
+        blobs = []
+        for channel, version in new_versions.items():
+            type_, blob = self.serde.dumps_typed(values[channel]) if channel in values else ("empty", b"")
+            blobs.append((thread_id, checkpoint_ns, channel, str(version), type_, blob))
+        # 只有通道值与 put_writes 的值外置大字段；检查点本体、元数据原样内联
+        dumps_inline = getattr(self.serde, "dumps_typed_inline", self.serde.dumps_typed)
+        type_, data = dumps_inline(c)
+        meta_type, meta = dumps_inline(get_checkpoint_metadata(config, metadata))
+
+        with self._lock:
+            self._pending_blobs.extend(blobs)
+            self._pending_checkpoints.append((
+                thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                type_, data, meta_type, meta, time.time()
+            ))
+            self._touched.add((thread_id, checkpoint_ns))
+            self.stats["checkpoints"] += 1
+            self.stats["bytes"] += len(data) + len(meta) + sum(len(b[5]) for b in blobs)
+            self._maybe_flush()
+
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            type_, blob = self.serde.dumps_typed(value)
+            rows.append((thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx),
+                         channel, type_, blob, task_path))
+
+        with self._lock:
+            self._pending_writes.extend(rows)
+            self.stats["writes"] += len(rows)
+            self.stats["bytes"] += sum(len(row[7]) for row in rows)
+            # 图在 interrupt 处暂停后可能长时间无后续写入，立即落盘保证重启后可恢复
+            if any(channel == _INTERRUPT_CHANNEL for channel, _ in writes):
+                self.flush()
+            else:
+                self._maybe_flush()
+
+    def _maybe_flush(self) -> None:
+        buffered = len(self._pending_checkpoints) + len(self._pending_writes)
+        if buffered >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        """把缓冲区在一个事务中写入数据库，并对本批涉及的会话执行保留策略"""
+        with self._lock:
+            if not (self._pending_checkpoints or self._pending_blobs or self._pending_writes):
+                self._last_flush = time.monotonic()
+                return
+            checkpoints, blobs, writes = self._pending_checkpoints, self._pending_blobs, self._pending_writes
+            touched = self._touched
+            self._pending_checkpoints, self._pending_blobs, self._pending_writes = [], [], []
+            self._touched = set()
+
+            cur = self._conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                cur.executemany("INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?)", blobs)
+                cur.executemany("INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", checkpoints)
+                # 同一 (task, idx) 的普通写入只保留第一次（与 MemorySaver 一致）；特殊通道（idx < 0）覆盖
+                cur.executemany(
+                    "INSERT INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT DO UPDATE SET channel = excluded.channel, type = excluded.type, "
+                    "value = excluded.value, task_path = excluded.task_path WHERE excluded.idx < 0",
+                    writes
+                )
+                for thread_id, checkpoint_ns in touched:
+                    self._prune(cur, thread_id, checkpoint_ns)
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+            self.stats["flushes"] += 1
+            self._last_flush = time.monotonic()
+
+    def _flush_loop(self) -> None:
+        while not self._closed.wait(self.flush_interval):
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"⚠️ 检查点落盘失败: {e}")
+                continue
+            if self.sweep_interval and time.monotonic() - self._last_sweep >= self.sweep_interval:
+                self._last_sweep = time.monotonic()
+                try:
+                    self._expire_threads()
+                except sqlite3.Error as e:
+                    print(f"⚠️ 检查点定期清理失败: {e}")
+
+    # ========= 保留策略 =========
+    def _prune(self, cur: sqlite3.Cursor, thread_id: str, checkpoint_ns: str) -> None:
+        """只保留最近 keep_per_thread 个检查点；删除更早检查点的 writes，以及之后不再被引用的通道版本"""
+        if not self.keep_per_thread:
+            return
+        rows = cur.execute(
+            "SELECT checkpoint_id, type, checkpoint FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+            "ORDER BY checkpoint_id DESC LIMIT 1 OFFSET ?",
+            (thread_id, checkpoint_ns, self.keep_per_thread - 1)
+        ).fetchall()
+        if not rows:
+            return
+        oldest_id, type_, data = rows[0]
+        removed = cur.execute(
+            "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?",
+            (thread_id, checkpoint_ns, oldest_id)
+        ).rowcount
+        if not removed:
+            return
+        cur.execute(
+            "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?",
+            (thread_id, checkpoint_ns, oldest_id)
+        )
+        # 通道版本单调递增：早于最旧保留检查点所引用版本的通道值不会再被读取
+        versions = self.serde.loads_typed((type_, data))["channel_versions"]
+        cur.executemany(
+            "DELETE FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version < ?",
+            [(thread_id, checkpoint_ns, channel, str(version)) for channel, version in versions.items()]
+        )
+        self.stats["pruned"] += removed
+
+    def _expire_threads(self) -> None:
+        """删除超过 ttl_hours 未更新的会话，再清除不再被引用的大对象（启动时执行一次，之后由后台线程每 sweep_interval 秒执行）"""
+        if self.ttl_hours:
+            cutoff = time.time() - self.ttl_hours * 3600
+            with self._lock:
+                expired = [row[0] for row in self._conn.execute(
+                    "SELECT thread_id FROM checkpoints GROUP BY thread_id HAVING MAX(created_at) < ?", (cutoff,)
+                )]
+                for thread_id in expired:
+                    self._delete_rows(thread_id)
+                self.stats["expired_threads"] += len(expired)
+        self._sweep_blob_store()
+
+    def _sweep_blob_store(self) -> None:
+        """
+        标记-清除：扫描仍保留的检查点、通道值与写入（含本进程尚未落盘的缓冲）中的大对象引用，删除其余大对象
+        CHECKPOINT_BLOB_GRACE_SECONDS 内写入 / 复用过的保留（可能属于其它进程未落盘的检查点，或正在序列化的 put）
+        """
+        blob_store = getattr(self.serde, "blob_store", None)
+        if blob_store is None:
+            return
+        with self._lock:
+            live = set()
+            pending = [(row[4], row[5]) for row in self._pending_blobs if row[4] != "empty"]
+            pending += [(row[6], row[7]) for row in self._pending_writes]
+            pending += [pair for row in self._pending_checkpoints for pair in ((row[4], row[5]), (row[6], row[7]))]
+            for type_, data in pending:
+                live.update(self.serde.blob_refs((type_, data)))
+            for type_, data in self._conn.execute(
+                "SELECT type, blob FROM blobs WHERE type != 'empty' UNION ALL SELECT type, value FROM writes "
+                "UNION ALL SELECT type, checkpoint FROM checkpoints UNION ALL SELECT metadata_type, metadata FROM checkpoints"
+            ):
+                live.update(self.serde.blob_refs((type_, data)))
+        self.stats["swept_blobs"] += blob_store.sweep(live, grace_seconds=CHECKPOINT_BLOB_GRACE_SECONDS)
+
+    def expire_threads(self) -> None:
+        self.flush()
+        self._expire_threads()
+
+    # ========= 读取 =========
+    def _load_blobs(self, thread_id: str, checkpoint_ns: str, versions: ChannelVersions) -> Dict[str, Any]:
+        if not versions:
+            return {}
+        keys = [(channel, str(version)) for channel, version in versions.items()]
+        placeholders = " OR ".join(["(channel = ? AND version = ?)"] * len(keys))
+        rows = self._conn.execute(
+            f"SELECT channel, type, blob FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND ({placeholders})",
+            [thread_id, checkpoint_ns] + [v for key in keys for v in key]
+        ).fetchall()
+        return {channel: self.serde.loads_typed((type_, blob)) for channel, type_, blob in rows if type_ != "empty"}
+
+    def _to_tuple(self, thread_id: str, checkpoint_ns: str, row: tuple) -> CheckpointTuple:
+        checkpoint_id, parent_id, type_, data, meta_type, meta = row
+        checkpoint = self.serde.loads_typed((type_, data))
+        writes = self._conn.execute(
+            "SELECT task_id, channel, type, value FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_path, task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id)
+        ).fetchall()
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                     "checkpoint_id": checkpoint_id}},
+            checkpoint={
+                **checkpoint,
+                "channel_values": self._load_blobs(thread_id, checkpoint_ns, checkpoint["channel_versions"]),
+            },
+            metadata=self.serde.loads_typed((meta_type, meta)),
+            parent_config=(
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                  "checkpoint_id": parent_id}}
+                if parent_id else None
+            ),
+            pending_writes=[(task_id, channel, self.serde.loads_typed((t, v))) for task_id, channel, t, v in writes],
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        self.flush()
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        columns = "checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata"
+        with self._lock:
+            if checkpoint_id := get_checkpoint_id(config):
+                row = self._conn.execute(
+                    f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id)
+                ).fetchone()
+            else:
+                row = self._conn.execute(
+                    f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                    "ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns)
+                ).fetchone()
+            return self._to_tuple(thread_id, checkpoint_ns, row) if row else None
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        self.flush()
+        clauses, params = [], []
+        if config:
+            clauses.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if config["configurable"].get("checkpoint_ns") is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(config["configurable"]["checkpoint_ns"])
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            clauses.append("checkpoint_id < ?")
+            params.append(before_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, "
+                f"metadata_type, metadata FROM checkpoints {where} ORDER BY checkpoint_id DESC",
+                params
+            ).fetchall()
+
+        for row in rows:
+            if limit is not None and limit <= 0:
+                break
+            thread_id, checkpoint_ns = row[0], row[1]
+            if filter:
+                metadata = self.serde.loads_typed((row[6], row[7]))
+                if not all(metadata.get(k) == v for k, v in filter.items()):
+                    continue
+            with self._lock:
+                yield_value = self._to_tuple(thread_id, checkpoint_ns, row[2:])
+            if limit is not None:
+                limit -= 1
+            yield yield_value
+
+    # ========= 删除 =========
+    def _delete_rows(self, thread_id: str) -> None:
+        for table in ("checkpoints", "blobs", "writes"):
+            self._conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+
+    def delete_thread(self, thread_id: str) -> None:
+        self.flush()
+        with self._lock:
+            self._delete_rows(thread_id)
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        # 与 MemorySaver 相同：定长数字前缀保证版本号可按字符串比较
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    # ========= 异步接口（FastAPI 中经 ainvoke 调用时使用，内部仍为同步 SQLite） =========
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return self.get_tuple(config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+                    before: Optional[RunnableConfig] = None, limit: Optional[int] = None):
+        for item in self.list(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        self.put_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        self.delete_thread(thread_id)
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.stats,
+                "backend": "sqlite",
+                "path": self.path,
+                "buffered": len(self._pending_checkpoints) + len(self._pending_writes),
+                "blob_store": self.serde.blob_store.report() if getattr(self.serde, "blob_store", None) else None,
+            }
+
+    def close(self) -> None:
+        self._closed.set()
+        self.flush()
+        atexit.unregister(self.flush)
+        with self._lock:
+            self._conn.close()
+
+
+def create_checkpointer(backend: str = CHECKPOINT_BACKEND, **kwargs) -> BaseCheckpointSaver:
+    """
+    所有入口（api_server / api_bridge / app）统一通过此工厂创建检查点存储：
+    - "sqlite"（默认）：SQLiteCheckpointSaver，进程重启后会话仍可恢复，多个 worker 可共用同一文件
+    - "memory"：进程内 MemorySaver（调试用），只做压缩，不外置大字段（进程内没有清理时机，外置的大对象只增不减）
+    sqlite 把大字段外置到 CHECKPOINT_BLOB_DIR 目录下的内容寻址存储，由定期清理回收
+    """
+    if backend == "memory":
+        return MemorySaver(serde=CompactSerializer())
+    if backend == "sqlite":
+        kwargs.setdefault("serde", CompactSerializer(blob_store=FileBlobStore(CHECKPOINT_BLOB_DIR)))
+        return SQLiteCheckpointSaver(**kwargs)
+    raise ValueError(f"未知的检查点存储类型: {backend}")
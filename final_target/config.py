@@ -15,35 +15,207 @@ SERPAPI_FLIGHTS_API_KEY = os.getenv("SERPAPI_FLIGHTS_API_KEY")
 
 
 # --- 外部服务 URL ---
-AMAP_GEOCODE_URL = "https://restapi.amap.com/v3/geocode/geo"
-AMAP_ROUTE_URL = "https://restapi.amap.com/v3/direction/driving"
-AMAP_POI_URL = "https://restapi.amap.com/v3/place/text"
-JUHE_TRAIN_QUERY_URL = "https://apis.juhe.cn/fapigw/train/query"
-GOOGLE_FLIGHTS_URL = "https://serpapi.com/search.json"
-DEEPSEEK_BASE_URL = "https://api.deepseek.com"
+# 各服务的根地址可用环境变量覆盖（离线基准测试指向本地模拟服务，见 benchmarks/offline_e2e.py）
+AMAP_BASE_URL = os.getenv("AMAP_BASE_URL", "https://restapi.amap.com")
+JUHE_BASE_URL = os.getenv("JUHE_BASE_URL", "https://apis.juhe.cn")
+SERPAPI_BASE_URL = os.getenv("SERPAPI_BASE_URL", "https://serpapi.com")
+AMAP_GEOCODE_URL = f"{AMAP_BASE_URL}/v3/geocode/geo"
+AMAP_ROUTE_URL = f"{AMAP_BASE_URL}/v3/direction/driving"
+AMAP_POI_URL = f"{AMAP_BASE_URL}/v3/place/text"
+JUHE_TRAIN_QUERY_URL = f"{JUHE_BASE_URL}/fapigw/train/query"
+GOOGLE_FLIGHTS_URL = f"{SERPAPI_BASE_URL}/search.json"
+DEEPSEEK_BASE_URL = os.getenv("DEEPSEEK_API_BASE", "https://api.deepseek.com")
+DASHSCOPE_BASE_URL = os.getenv("DASHSCOPE_API_BASE", "https://dashscope-intl.aliyuncs.com/compatible-mode/v1")
 
 
 # 时间约束
 PRE_MEETING_BUFFER_MINUTES = 20
+COMPANY_VISIT_MINUTES = 90          # 单家企业调研时长
+WORKDAY_START = "09:00"             # 调研最早开始时间
+WORKDAY_END = "18:00"               # 调研最晚结束时间
+MIDDAY_BREAK = ("12:00", "13:30")   # 调研避开的午间时段
+
+# Day 1 规划方式："rules" 使用规则化时间线构建（默认，毫秒级），"llm" 使用 LLM 生成
+DAY1_PLANNER_MODE = "rules"
+
+# 行程可行性校验：通勤时长允许比通勤矩阵短多少分钟（容忍路况估计误差）
+VALIDATOR_COMMUTE_TOLERANCE_MINUTES = 5.0
+
+# 最终行程表生成方式："template" 本地按固定格式渲染（默认，修改行程时可只重渲染变动的天），"llm" 由 LLM 整理
+FINAL_REPORT_MODE = "template"
+
+# 出差天数：用户未提及时默认 3 天（Day 1 为到达日，其余为调研日），上限防止误解析出超长行程
+DEFAULT_TRIP_DAYS = 3
+MAX_TRIP_DAYS = 14
+
+# 调研日规划方式："solver" 使用确定性路径求解器（默认，毫秒级），"llm" 由 LLM 逐天生成（各天并行）
+RESEARCH_DAY_PLANNER_MODE = "solver"
+
+# 企业分天方式："cluster" 按地理位置 k-medoids 聚类（默认，以各天固定事务为锚点），"solver" 在粗估矩阵上跑一遍多日求解器
+DAY_SPLIT_MODE = "cluster"
+CLUSTER_TRAVEL_ALLOWANCE_MINUTES = 20.0     # 估算每天容量时，每场调研预留的通勤分钟
+CLUSTER_MAX_ITERATIONS = 20
+
+# 自动推荐企业时，按调研日空闲时间窗与粗估通勤给出推荐组合与额外通勤标注：
+# 交互模式不等待，只用已完成地理编码的候选企业筛选（其余标注为 fits: None，编码在用户勾选期间继续进行）；
+# 由无人值守策略取推荐列表时等待全部候选企业编码完成，同一行程的推荐结果不随时序变化
+COMPANY_SHORTLIST_ENABLED = True
+
+# 企业分天 / 推荐筛选时的通勤粗估（不调用地图 API）：直线距离 / 平均车速 + 固定开销
+ESTIMATE_SPEED_KMH = 30.0
+ESTIMATE_OVERHEAD_MINUTES = 10.0
+
+# 会话检查点存储："sqlite" 本地 SQLite（WAL 模式，默认，进程重启后会话可恢复），"memory" 进程内 MemorySaver
+CHECKPOINT_BACKEND = os.getenv("CHECKPOINT_BACKEND", "sqlite")
+CHECKPOINT_DB_PATH = os.getenv("CHECKPOINT_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".checkpoints", "travel.db"))
+CHECKPOINT_BATCH_SIZE = 16                  # 缓冲多少条检查点 / 写入后落盘一次
+CHECKPOINT_FLUSH_INTERVAL_SECONDS = 0.5     # 距上次落盘超过该时长时立即落盘
+CHECKPOINT_COMPRESS_MIN_BYTES = 2048        # 序列化后超过该大小的值做 zlib 压缩
+CHECKPOINT_KEEP_PER_THREAD = 20             # 每个会话保留最近多少个检查点（None 表示全部保留）
+CHECKPOINT_TTL_HOURS = 72                   # 超过该时长未更新的会话整体删除（None 表示不过期）
+CHECKPOINT_SWEEP_INTERVAL_SECONDS = 3600    # 后台定期删除过期会话、清除不再被引用的大对象的间隔（None 表示只在启动时执行）
+CHECKPOINT_BLOB_DIR = os.getenv("CHECKPOINT_BLOB_DIR", os.path.join(os.path.dirname(CHECKPOINT_DB_PATH), "blobs"))
+CHECKPOINT_BLOB_MIN_BYTES = 1024            # 序列化后超过该大小的状态字段单独按内容哈希存储（None 表示不外置）
+CHECKPOINT_BLOB_GRACE_SECONDS = 3600        # 清除大对象时保留该时长内写入 / 复用过的（可能属于其它进程尚未落盘的检查点）
 
 
 # 模型类型
 deepseek_chat = ChatDeepSeek(
     model="deepseek-chat",
     temperature=0.5,
+    api_base=DEEPSEEK_BASE_URL,
 )
 
 deepseek_reasoner = ChatDeepSeek(
     model="deepseek-reasoner",
     temperature=0.5,
+    api_base=DEEPSEEK_BASE_URL,
 )
 
 qwen_max = ChatQwen(
     model="qwen-max",
     temperature=0.5,
-    timeout=30.0
+    timeout=30.0,
+    api_base=DASHSCOPE_BASE_URL,
 )
 
+# 模型路由：可用模型及其质量等级（数值越大能力越强）
+LLM_MODELS = {
+    "deepseek-chat": deepseek_chat,
+    "deepseek-reasoner": deepseek_reasoner,
+    "qwen-max": qwen_max,
+}
+
+MODEL_QUALITY_TIERS = {
+    "deepseek-chat": 2,
+    "qwen-max": 2,
+    "deepseek-reasoner": 3,
+}
+
+# 每个 LLM 调用点的偏好模型列表（按优先级）、延迟目标（秒，按 p95 判定）与最低质量等级
+# 注意：deepseek-reasoner 不支持结构化输出（tool calling），只能用于纯文本输出的调用点
+LLM_ROUTES = {
+    "parse_user_input": {"preferences": ["deepseek-chat", "qwen-max"], "latency_target": 20.0, "min_tier": 2, "hedge": True},
+    "llm_choose_transport": {"preferences": ["qwen-max", "deepseek-chat"], "latency_target": 20.0, "min_tier": 2, "hedge": True},
+    "generate_day1_tasks": {"preferences": ["deepseek-chat", "qwen-max"], "latency_target": 40.0, "min_tier": 2, "hedge": True},
+    "plan_research_day": {"preferences": ["deepseek-chat", "qwen-max", "deepseek-reasoner"], "latency_target": 60.0, "min_tier": 2, "hedge": True},
+    "generate_company_recommendations": {"preferences": ["qwen-max", "deepseek-chat"], "latency_target": 15.0, "min_tier": 2},
+    "geocode_company_by_name": {"preferences": ["qwen-max", "deepseek-chat"], "latency_target": 10.0, "min_tier": 2},
+    "repair_itinerary_item": {"preferences": ["deepseek-chat", "qwen-max"], "latency_target": 10.0, "min_tier": 2},
+    "build_final_report": {"preferences": ["deepseek-chat", "qwen-max"], "latency_target": 40.0, "min_tier": 2},
+    "refine_final_itinerary": {"preferences": ["deepseek-chat", "qwen-max", "deepseek-reasoner"], "latency_target": 60.0, "min_tier": 2},
+    "classify_refinement": {"preferences": ["deepseek-chat", "qwen-max"], "latency_target": 10.0, "min_tier": 2},
+}
+
+ROUTER_WINDOW_SIZE = 50             # 每个模型保留最近多少次调用用于统计 p50/p95
+ROUTER_MAX_ERROR_RATE = 0.5         # 窗口内错误率超过该值视为不健康
+ROUTER_MIN_SAMPLES = 3              # 样本数不足时不判定健康度 / 延迟
+ROUTER_COOLDOWN_SECONDS = 60.0      # 连续失败后暂时摘除模型的冷却时间
+ROUTER_MAX_CONSECUTIVE_FAILURES = 3
+
+# LLM 计价（元 / 百万 tokens，参考各平台公开价格，以官网为准）：缓存命中输入 / 未命中输入 / 输出
+LLM_PRICING = {
+    "deepseek-chat": {"input_cache_hit": 0.2, "input_cache_miss": 2.0, "output": 3.0},
+    "deepseek-reasoner": {"input_cache_hit": 0.2, "input_cache_miss": 2.0, "output": 3.0},
+    "qwen-max": {"input_cache_hit": 0.96, "input_cache_miss": 2.4, "output": 9.6},
+}
+
+LLM_USAGE_MAX_THREADS = 1000        # 进程内最多保留多少个 thread 的 LLM 用量汇总（LRU 淘汰）
+
+# 对冲请求：路由中 "hedge": True 的调用点，主模型超过其滚动 p90 仍未返回时，向次选模型发出同样的请求，取先返回的有效结果
+HEDGE_QUANTILE = 0.9                # 触发对冲的主模型延迟分位数（样本不足时使用该调用点的 latency_target）
+HEDGE_MAX_EXTRA_RATIO = 0.1         # 对冲请求占该调用点总请求数的上限（额外请求预算）
+HEDGE_BUDGET_BURST = 1              # 预算之外允许的突发对冲次数（冷启动时样本少）
+HEDGE_PARALLEL_CALLS_PER_RUN = 7    # 一次运行中同时进行的对冲调用数上限（调研日并行规划，按最多一周估计）
+# 对冲线程池大小（HEDGE_MAX_WORKERS）依赖运行线程池与批量规划的并发数，定义在批量规划配置之后
+
+# 推测执行：图在 interrupt 处等待用户时，后台提前执行最可能的下一步（Day 1 规划、推荐企业地理编码等）
+SPECULATION_ENABLED = True
+SPECULATION_MAX_WORKERS = 4
+SPECULATION_TTL_SECONDS = 600.0     # 推测结果的保留时间，超时未被使用则丢弃
+
+# api_bridge 图运行线程池：一次运行可能持续数分钟（LLM / 地图调用），放到线程池中执行，避免阻塞事件循环
+RUN_POOL_WORKERS = int(os.getenv("RUN_POOL_WORKERS", 4))
+RUN_QUEUE_MAX_DEPTH = 16                # 排队等待执行的运行数上限，超过时返回 429
+RUN_RETRY_AFTER_DEFAULT_SECONDS = 30.0  # 尚无运行耗时样本时 Retry-After 的估计值
+
+# 异步任务（/jobs）：提交后立即返回 job_id，客户端轮询或接收 webhook 回调（到达 interrupt / 完成 / 失败时）
+WEBHOOK_TIMEOUT_SECONDS = 5.0
+WEBHOOK_MAX_ATTEMPTS = 3                # 回调失败时的最大尝试次数（指数退避）
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")  # 设置后回调附带 X-Webhook-Signature（HMAC-SHA256）
+
+# 外部调用共享缓存：所有会话共用，相同参数的并发调用只请求一次（single-flight），成功结果按服务缓存 TTL 秒
+EXTERNAL_CACHE_ENABLED = True
+EXTERNAL_CACHE_MAX_ENTRIES = 5000
+EXTERNAL_CACHE_TTL_SECONDS = {
+    "amap_geocode": 24 * 3600,
+    "amap_route": 3600,
+    "flight_search": 600,               # 航班 / 车次余票与价格变化较快
+    "train_search": 600,
+    "company_geocode": 24 * 3600,       # LLM 补全地址 + 高德地理编码
+    "company_recommendations": 3600,
+}
+# 各服务商的共享令牌桶 (速率 次/秒, 突发次数)，所有会话的请求合计不超过该速率
+# 按所用 key 的实际配额设置（高德个人开发者 key 的默认并发配额约 3 QPS，认证 / 企业 key 高得多）；
+# 突发次数允许一个行程开始时的一批地理编码、路径规划同时发出，而不是逐个间隔 1/速率 秒
+EXTERNAL_RATE_LIMITS = {
+    "amap": (float(os.getenv("AMAP_QPS", 3)), int(os.getenv("AMAP_BURST", 3))),
+    "serpapi": (float(os.getenv("SERPAPI_QPS", 5)), int(os.getenv("SERPAPI_BURST", 5))),
+    "juhe": (float(os.getenv("JUHE_QPS", 5)), int(os.getenv("JUHE_BURST", 5))),
+}
+
+# 多 worker 部署：外部调用缓存、令牌桶、任务记录、会话运行租约放在共享存储中，任一 worker 都能查询任务、恢复任意会话
+# "memory" 单进程（默认）；"sqlite" 单机多 worker（uvicorn --workers N），需同时使用 sqlite 检查点存储
+SHARED_STORE_BACKEND = os.getenv("SHARED_STORE_BACKEND", "memory")
+SHARED_STORE_PATH = os.getenv("SHARED_STORE_PATH", os.path.join(os.path.dirname(CHECKPOINT_DB_PATH), "shared.db"))
+SHARED_STORE_MEMORY_MAX_ENTRIES = 20000
+RUN_LEASE_TTL_SECONDS = 3600.0          # 会话运行租约的有效期（持有租约的 worker 异常退出后，最迟这么久之后可重新运行该会话）
+JOB_RECORD_TTL_SECONDS = 24 * 3600      # 任务记录的保留时长
+
+# 批量规划（batch.py / api_bridge /batch）：多个行程并发、按无人值守策略运行
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 8))      # 单个批次的并发行程数上限（请求中的 concurrency 不能超过）
+BATCH_MAX_ACTIVE = int(os.getenv("BATCH_MAX_ACTIVE", 2))         # 每个 worker 同时执行的批次数，超过时 /batch 返回 429
+
+# 对冲调用的主请求与对冲请求都在该线程池中执行：按所有可能同时发起 LLM 调用的图运行线程（交互式 + 批量）
+# × 每次运行的并行调用数 × 2（主请求 + 对冲请求）估算，主请求不会因为排队而被误判为慢
+HEDGE_MAX_WORKERS = 2 * (RUN_POOL_WORKERS + BATCH_CONCURRENCY * BATCH_MAX_ACTIVE) * HEDGE_PARALLEL_CALLS_PER_RUN
+
+# 追踪：图中每个节点、每次外部调用（高德 / 航班 / 高铁 / LLM）一个 span，
+# 输出结构化日志、按 OTLP/HTTP JSON 批量导出到本地 collector，并汇总为 /metrics 的 Prometheus 直方图
+TRACING_ENABLED = True
+TRACE_LOG_ENABLED = os.getenv("TRACE_LOG_ENABLED", "1") == "1"       # 每个 span 一行 JSON 日志（logger "trace"）
+TRACE_OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")       # 如 http://127.0.0.1:4318；未设置时不导出
+TRACE_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "travel-planner")
+TRACE_EXPORT_BATCH_SIZE = 256
+TRACE_EXPORT_INTERVAL_SECONDS = 2.0
+TRACE_EXPORT_QUEUE_MAX = 10000                                      # 导出队列上限，collector 不可用时超出部分丢弃
+INTERRUPT_WAIT_TTL_SECONDS = 7 * 24 * 3600                          # 中断开始时间的保留时长（超过后恢复不再计入等待时间）
+METRICS_DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+METRICS_INTERRUPT_WAIT_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 4 * 3600, 24 * 3600)
+
+# api_server 响应：客户端声明 Accept-Encoding: gzip 且响应超过该大小时压缩（None 表示不压缩）
+API_GZIP_MIN_BYTES = 1024
+
 # 城市与机场映射表
 # CITY_TO_PRIMARY_IATA = {
 #     "北京": "PEK",
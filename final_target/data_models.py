@@ -1,6 +1,6 @@
 #data_models.py
-from typing import List, Optional
-from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Literal, Optional
+from pydantic import BaseModel, Field, field_validator
 from datetime import datetime
 
 
@@ -32,6 +32,10 @@ class UserInputParams(BaseModel):
     fixed_events: List[FixedEvent] = Field(
         description="用户出差过程中必须安排的固定事务列表（会议、培训、拜访等）。"
     )
+    trip_days: Optional[int] = Field(
+        default=None,
+        description="出差总天数（含出发当天），例如 '出差 5 天' 为 5；用户未提及时填 null。"
+    )
 
 class CompanyInfo(BaseModel):
     name: str
@@ -49,4 +53,69 @@ class CompanyRecommendations(BaseModel):
     """LLM 推荐的三组公司，每组包含三家公司。"""
     recommendation_groups: List[CompanyGroup] = Field(
         description="包含三个推荐组的列表。每个组应包含三家公司。"
-    )
\ No newline at end of file
+    )
+
+
+class ItineraryLocation(BaseModel):
+    city: Optional[str] = None
+    address: Optional[str] = None
+    name: Optional[str] = None
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+
+    @field_validator("city", "address", "name", "lat", "lon", mode="before")
+    @classmethod
+    def _none_placeholder(cls, value: Any) -> Any:
+        # LLM 常把空值写成 "None" / "null" / "..." 字符串
+        if isinstance(value, str) and value.strip() in ("", "None", "none", "null", "...", "N/A"):
+            return None
+        return value
+
+
+class ItineraryItemModel(BaseModel):
+    """LLM 输出的单个 ItineraryItem 的校验模型（对应 state.ItineraryItem）。"""
+    type: str = Field(description="行程类型图案符号，如 ✈️ 🚄 🚗 🏢 🤝 🏨 📍")
+    description: str = Field(description="行程描述")
+    start_time: datetime = Field(description="开始时间，'YYYY-MM-DD HH:MM'")
+    end_time: datetime = Field(description="结束时间，'YYYY-MM-DD HH:MM'")
+    location: ItineraryLocation = Field(default_factory=ItineraryLocation)
+    details: Dict[str, Any] = Field(default_factory=dict)
+
+    @field_validator("location", "details", mode="before")
+    @classmethod
+    def _empty_to_default(cls, value: Any) -> Any:
+        return value if isinstance(value, dict) else {}
+
+    @field_validator("end_time")
+    @classmethod
+    def _end_after_start(cls, value: datetime, info) -> datetime:
+        start = info.data.get("start_time")
+        if start is not None and value < start:
+            raise ValueError("end_time 早于 start_time")
+        return value
+
+
+class ItineraryEditOp(BaseModel):
+    """一条针对调研日的结构化修改操作。"""
+    op: Literal["shift", "swap", "remove", "add_visit", "unsupported"] = Field(
+        description="操作类型：shift 推迟/提前某项调研；swap 交换两项调研；remove 删除某项调研；add_visit 新增一家调研企业；unsupported 无法用以上操作表达"
+    )
+    target: Optional[str] = Field(default=None, description="被操作的企业/事务名称（add_visit 时为新企业名称）")
+    other: Optional[str] = Field(default=None, description="swap 时与 target 交换的另一项名称")
+    day: Optional[int] = Field(default=None, description="add_visit 时指定的天数（与停靠点列表中的 day 一致），未指定填 null")
+    minutes: Optional[int] = Field(default=None, description="shift 时的偏移分钟数，推迟为正、提前为负")
+
+
+class ItineraryEditPlan(BaseModel):
+    """用户修改要求对应的结构化修改操作列表。"""
+    ops: List[ItineraryEditOp] = Field(description="按执行顺序排列的修改操作")
+
+
+class HeadlessPolicy(BaseModel):
+    """无人值守运行策略：启动时随初始状态传入，各中断节点先按策略决策；某项为 None 时该中断点仍照常等待用户。"""
+    approve_transport: Optional[bool] = Field(default=True, description="是否直接采纳 LLM 推荐的交通方案")
+    transport_index: Optional[int] = Field(default=0, description="否决推荐方案后按出发时间排序选第几个方案")
+    research_mode: Optional[str] = Field(default="2", description="调研模式，格式同用户输入：'1: 华为, 腾讯' / '2' / '3'")
+    companies: Optional[List[str]] = Field(default=None, description="智能推荐调研时直接指定的企业；None 时取推荐列表的前 max_companies 家")
+    max_companies: Optional[int] = Field(default=3, description="智能推荐调研时取推荐列表的前几家；None 时等待用户勾选")
+    refinement: Optional[str] = Field(default="", description="最终行程的修改要求，空字符串表示不修改")
@@ -0,0 +1,188 @@
+#external_calls.py
+import copy
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from functools import wraps
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from config import EXTERNAL_CACHE_ENABLED, EXTERNAL_CACHE_MAX_ENTRIES, EXTERNAL_CACHE_TTL_SECONDS, EXTERNAL_RATE_LIMITS
+from shared_store import SharedStore, shared_store
+
+_COUNTERS = ("requested", "executed", "cache_hits", "coalesced", "failed")
+
+
+class RateLimiter:
+    """令牌桶限速：平均 rate 次/秒，允许 burst 次突发；acquire 阻塞到拿到令牌为止（所有线程共享）"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.waited_seconds = 0.0
+
+    def acquire(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # 先扣令牌再睡：排在后面的线程看到的是负余额，各自睡到自己的时间片，不会同时醒来
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            self.waited_seconds += wait
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class SharedRateLimiter:
+    """与 RateLimiter 相同的令牌桶，状态放在共享存储中：多个 worker 进程的请求合计受同一个速率限制"""
+
+    def __init__(self, store: SharedStore, name: str, rate: float, burst: int = 1):
+        self.store = store
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.waited_seconds = 0.0
+
+    def acquire(self) -> float:
+        wait = self.store.take_token(f"rate:{self.name}", self.rate, self.burst)
+        self.waited_seconds += wait
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class ExternalCallCache:
+    """
+    外部调用（高德地理编码 / 路径规划、航班、高铁、企业推荐与地理编码）的进程内共享缓存，所有会话共用：
+    - 按 (服务, 参数键) 缓存成功结果，TTL 按服务配置；失败结果（None / 空列表）不缓存，下次仍会重试
+    - single-flight：相同参数的调用正在进行时，后来者等待同一个结果，不重复请求（批量规划多个同城行程时尤其常见）
+    - 每个外部服务一个共享令牌桶（throttle），多个会话并发时总 QPS 仍受控
+    - 多 worker 部署（store.shared）时：进程内缓存未命中再查共享存储，新结果同时写回；令牌桶状态也放在共享存储中。
+      single-flight 只在进程内生效，不同 worker 同时发起的相同调用各自请求一次
+    - 统计 requested（调用次数，即逐个独立运行时的外部请求数）/ executed（实际请求数）/ cache_hits / coalesced
+    """
+
+    def __init__(self, ttl_seconds: Dict[str, float] = EXTERNAL_CACHE_TTL_SECONDS,
+                 rate_limits: Dict[str, Tuple[float, int]] = EXTERNAL_RATE_LIMITS,
+                 max_entries: int = EXTERNAL_CACHE_MAX_ENTRIES, enabled: bool = EXTERNAL_CACHE_ENABLED,
+                 store: Optional[SharedStore] = None):
+        self.ttl_seconds = dict(ttl_seconds)
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.store = store if store is not None and store.shared else None
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[Any, float]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str], Future] = {}
+        self._limiters = {
+            name: SharedRateLimiter(self.store, name, rate, burst) if self.store is not None else RateLimiter(rate, burst)
+            for name, (rate, burst) in rate_limits.items()
+        }
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, service: str, counter: str) -> None:
+        bucket = self._stats.setdefault(service, dict.fromkeys(_COUNTERS, 0))
+        bucket[counter] += 1
+
+    def throttle(self, provider: str) -> None:
+        """发出一次外部 HTTP 请求前调用（含重试），按服务商的共享令牌桶限速"""
+        limiter = self._limiters.get(provider)
+        if limiter is not None:
+            limiter.acquire()
+
+    def call(self, service: str, key: Optional[str], fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """执行 fn(*args, **kwargs)；key 为 None 或缓存关闭时直接执行（只计数）"""
+        if key is None or not self.enabled:
+            with self._lock:
+                self._count(service, "requested")
+                self._count(service, "executed")
+            return fn(*args, **kwargs)
+
+        entry_key = (service, key)
+        with self._lock:
+            self._count(service, "requested")
+            entry = self._entries.get(entry_key)
+            if entry is not None and time.monotonic() - entry[1] <= self.ttl_seconds.get(service, 0):
+                self._entries.move_to_end(entry_key)
+                self._count(service, "cache_hits")
+                return copy.deepcopy(entry[0])
+            future = self._inflight.get(entry_key)
+            owner = future is None
+            if owner:
+                future = self._inflight[entry_key] = Future()
+            else:
+                self._count(service, "coalesced")
+
+        if not owner:
+            return copy.deepcopy(future.result())
+
+        try:
+            result = self.store.get("external_calls", f"{service}|{key}") if self.store is not None else None
+            fresh = result is None
+            with self._lock:
+                self._count(service, "executed" if fresh else "cache_hits")
+            if fresh:
+                result = fn(*args, **kwargs)
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(entry_key, None)
+                self._count(service, "failed")
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._inflight.pop(entry_key, None)
+            if result:
+                self._entries[entry_key] = (copy.deepcopy(result), time.monotonic())
+                self._entries.move_to_end(entry_key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            else:
+                self._count(service, "failed")
+        if fresh and result and self.store is not None:
+            self.store.set("external_calls", f"{service}|{key}", result, ttl_seconds=self.ttl_seconds.get(service, 0))
+        future.set_result(result)
+        return result
+
+    def cached(self, service: str, key: Callable[..., Optional[str]]):
+        """装饰器：key(*args, **kwargs) 给出参数键（返回 None 表示不缓存本次调用）"""
+        def decorator(fn: Callable[..., Any]) -> Callable[..., Any]:
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                return self.call(service, key(*args, **kwargs), fn, *args, **kwargs)
+            return wrapper
+        return decorator
+
+    def counters(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {service: dict(bucket) for service, bucket in self._stats.items()}
+
+    def report(self, since: Optional[Dict[str, Dict[str, int]]] = None) -> Dict[str, Any]:
+        """
+        各服务的调用统计；传入此前 counters() 的快照时只统计这之后的增量（如一次批量规划）
+        saved = requested - executed：与每个调用都单独请求外部服务相比省下的请求数
+        """
+        since = since or {}
+        by_service = {}
+        for service, bucket in self.counters().items():
+            base = since.get(service, {})
+            delta = {k: bucket[k] - base.get(k, 0) for k in _COUNTERS}
+            if delta["requested"]:
+                by_service[service] = {**delta, "saved": delta["requested"] - delta["executed"]}
+        total = {k: sum(s[k] for s in by_service.values()) for k in (*_COUNTERS, "saved")}
+        with self._lock:
+            waited = {name: round(limiter.waited_seconds, 3) for name, limiter in self._limiters.items()}
+            entries = len(self._entries)
+        return {"by_service": by_service, "total": total, "rate_limit_wait_seconds": waited, "entries": entries}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# 进程内全局单例（多 worker 部署时经共享存储与其它 worker 共用缓存和令牌桶）
+external_calls = ExternalCallCache(store=shared_store)
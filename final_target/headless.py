@@ -0,0 +1,58 @@
+#headless.py
+from typing import Any, Dict, Optional, Tuple
+
+from data_models import HeadlessPolicy
+
+_UNDECIDED = (False, None)
+
+
+def policy_input(graph_input: Optional[Dict[str, Any]], policy: Optional[HeadlessPolicy]) -> Optional[Dict[str, Any]]:
+    """把策略写入新运行的初始状态（state["policy"]，随检查点保存，之后每次恢复都生效）"""
+    if policy is None or graph_input is None:
+        return graph_input
+    return {**graph_input, "policy": policy.model_dump()}
+
+
+def policy_picks_recommended(state: Dict[str, Any]) -> bool:
+    """策略是否会按推荐列表决定 company_selection（此时推荐列表需完整、可复现）"""
+    if not state.get("policy"):
+        return False
+    policy = HeadlessPolicy.model_validate(state["policy"])
+    return not policy.companies and policy.max_companies is not None
+
+
+def policy_decision(state: Dict[str, Any], point: str, payload: Dict[str, Any]) -> Tuple[bool, Any]:
+    """
+    中断节点在调用 interrupt 前先查询策略，返回 (是否已由策略决定, 决策值)；决策值与该节点解析的用户输入格式一致
+    point：approval / select_transport / research_mode / company_selection / refine
+    """
+    if not state.get("policy"):
+        return _UNDECIDED
+    policy = HeadlessPolicy.model_validate(state["policy"])
+
+    if point == "approval":
+        value = policy.approve_transport
+    elif point == "select_transport":
+        value = policy.transport_index
+    elif point == "research_mode":
+        value = policy.research_mode
+    elif point == "company_selection":
+        if policy.companies:
+            value = policy.companies
+        elif policy.max_companies is None:
+            value = None
+        else:
+            # 推荐列表只在筛选看过足够多的候选企业时采用，否则按候选顺序取前几家（不因部分结果只选出一两家）
+            screened = sum(1 for a in payload.get("annotations") or [] if a.get("fits") is not None)
+            recommended = payload.get("recommended") or []
+            pool = recommended if recommended and screened >= policy.max_companies else payload.get("options") or []
+            value = pool[:policy.max_companies]
+    elif point == "refine":
+        value = policy.refinement
+    else:
+        raise ValueError(f"未知的中断点: {point}")
+
+    if value is None:
+        return _UNDECIDED
+    print(f"🤖 无人值守策略决定 [{point}]: {value}")
+    return True, value
@@ -0,0 +1,249 @@
+#itinerary_editor.py
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from data_models import ItineraryEditOp, ItineraryEditPlan
+from llm_agent import geocode_company_by_name, to_compact_json
+from model_router import model_router
+from prompts import REFINEMENT_CLASSIFY_PROMPT
+from state import DayPlan, Location
+from tools.commute_matrix import CommuteMatrix, LazyMatrix
+from tools.route_solver import Stop, insert_companies, route_to_items, simulate_day, visit_times
+
+EPS = 1e-6
+
+
+def _stops_summary(day_indexes: List[int], day_dates: List[Any], routes: List[List[Stop]], matrix: LazyMatrix) -> str:
+    """给意图识别用的精简停靠点列表（只含名称、类型与时间）"""
+    summary = []
+    for day_index, day, route in zip(day_indexes, day_dates, routes):
+        times = visit_times(day, route, matrix)
+        for stop in route:
+            begin, finish = times.get(stop.name, (None, None))
+            summary.append({
+                "day": day_index,
+                "name": stop.name,
+                "kind": "固定事务" if stop.kind == "event" else "企业调研",
+                "time": f"{begin:%H:%M}-{finish:%H:%M}" if begin else None,
+            })
+    return to_compact_json(summary)
+
+
+def classify_refinement(instruction: str, stops_summary: str) -> Optional[List[ItineraryEditOp]]:
+    """把用户修改要求识别为结构化操作；识别失败或包含 unsupported 时返回 None"""
+    try:
+        plan = model_router.invoke(
+            "classify_refinement",
+            lambda model: REFINEMENT_CLASSIFY_PROMPT | model.with_structured_output(ItineraryEditPlan),
+            {"stops": stops_summary, "refine_instruction": instruction},
+            validate=lambda result: result is not None
+        )
+    except Exception as e:
+        print(f"⚠️ 修改意图识别失败: {e}")
+        return None
+
+    if not plan.ops or any(op.op == "unsupported" for op in plan.ops):
+        return None
+    return plan.ops
+
+
+class _EditSession:
+    """在缓存的停靠点快照上逐条执行修改操作，并记录哪些天发生了变化"""
+
+    def __init__(self, days: List[DayPlan], hotel_loc: Location, commute_cache: CommuteMatrix):
+        self.hotel_loc = hotel_loc
+        self.commute_cache = commute_cache
+        # 各天快照中的下标是各自的单日矩阵下标，这里统一重排到所有天共用的地点列表上
+        self.locations: List[Location] = []
+        self._index: Dict[str, int] = {}
+        self.add_location(hotel_loc)
+        self.matrix = commute_cache.lazy(self.locations)
+
+        self.day_indexes: List[int] = [day["day_index"] for day in days]
+        self.day_dates = [day["date"] for day in days]
+        self.routes: List[List[Stop]] = []
+        for day in days:
+            route = [Stop.from_dict(stop) for stop in day["stops"]]
+            for stop in route:
+                stop.loc_index = self.add_location(stop.location)
+            self.routes.append(route)
+        self.changed: set = set()
+
+    def add_location(self, location: Location) -> int:
+        key = CommuteMatrix.key(location)
+        if key is None:
+            # 无坐标、地址与名称的地点无法与其它地点区分，单独占一个下标
+            self.locations.append(location)
+            return len(self.locations) - 1
+        if key not in self._index:
+            self._index[key] = len(self.locations)
+            self.locations.append(location)
+        return self._index[key]
+
+    def find(self, name: Optional[str]) -> Optional[Tuple[int, int]]:
+        """按名称定位停靠点：先精确匹配，再互相包含匹配"""
+        if not name:
+            return None
+        name = name.strip()
+        for exact in (True, False):
+            for d_idx, route in enumerate(self.routes):
+                for pos, stop in enumerate(route):
+                    if stop.name == name if exact else (name in stop.name or stop.name in name):
+                        return d_idx, pos
+        return None
+
+    def find_company(self, name: Optional[str]) -> Optional[Tuple[int, int]]:
+        found = self.find(name)
+        if found is None or self.routes[found[0]][found[1]].kind != "company":
+            print(f"⚠️ 未找到可修改的企业调研: {name}")
+            return None
+        return found
+
+    def remove(self, op: ItineraryEditOp) -> bool:
+        found = self.find_company(op.target)
+        if found is None:
+            return False
+        d_idx, pos = found
+        self.routes[d_idx].pop(pos)
+        self.changed.add(d_idx)
+        return True
+
+    def swap(self, op: ItineraryEditOp) -> bool:
+        first, second = self.find_company(op.target), self.find_company(op.other)
+        if first is None or second is None or first == second:
+            return False
+        (d1, p1), (d2, p2) = first, second
+        self.routes[d1][p1], self.routes[d2][p2] = self.routes[d2][p2], self.routes[d1][p1]
+        if d1 != d2:
+            # 跨天交换后，原来那天的“最早开始时间”约束不再适用
+            self.routes[d1][p1].earliest = self.routes[d2][p2].earliest = None
+        self.changed.update({d1, d2})
+        return True
+
+    def shift(self, op: ItineraryEditOp) -> bool:
+        found = self.find_company(op.target)
+        if found is None or not op.minutes:
+            return False
+        d_idx, pos = found
+        stop = self.routes[d_idx][pos]
+        begin = visit_times(self.day_dates[d_idx], self.routes[d_idx], self.matrix).get(stop.name, (None,))[0]
+        if begin is None:
+            return False
+        if op.minutes > 0:
+            stop.earliest = begin + timedelta(minutes=op.minutes)
+            self.changed.add(d_idx)
+            return True
+        return self._move_earlier(d_idx, pos, begin, begin + timedelta(minutes=op.minutes))
+
+    def _move_earlier(self, d_idx: int, pos: int, begin: datetime, target: datetime) -> bool:
+        """
+        提前：earliest 只是下限，单独调小不会让拜访提前。先把下限放宽到目标时间（仍不行时去掉下限），
+        再依次把它排到前一个停靠点之前，直到模拟出的开始时间确实早于原来的时间；
+        都做不到时还原并返回 False（由 LLM 整体修改处理）
+        """
+        route = self.routes[d_idx]
+        original_route, stop = list(route), route[pos]
+        original_earliest = stop.earliest
+        others = original_route[:pos] + original_route[pos + 1:]
+        for earliest in (target, None):
+            stop.earliest = earliest
+            for new_pos in range(pos, -1, -1):
+                route[:] = others[:new_pos] + [stop] + others[new_pos:]
+                new_begin = visit_times(self.day_dates[d_idx], route, self.matrix).get(stop.name, (None,))[0]
+                if new_begin is not None and new_begin < begin:
+                    self.changed.add(d_idx)
+                    return True
+        route[:] = original_route
+        stop.earliest = original_earliest
+        return False
+
+    def add_visit(self, op: ItineraryEditOp) -> bool:
+        if not op.target or self.find(op.target) is not None:
+            return False
+        geo = geocode_company_by_name(company_name=op.target, city=self.hotel_loc["city"])
+        if geo is None:
+            print(f"⚠️ 新增企业地理编码失败: {op.target}")
+            return False
+
+        location: Location = {
+            "city": self.hotel_loc["city"],
+            "address": geo["address"],
+            "name": op.target,
+            "lat": geo["lat"],
+            "lon": geo["lon"],
+        }
+        # 新地点追加到共用地点列表，求解器只会按需查询它与现有停靠点之间的点对（经 CommuteMatrix 缓存）
+        stop = Stop("company", op.target, self.add_location(location), location)
+
+        if op.day is not None:
+            if op.day not in self.day_indexes:
+                return False
+            indexes = [self.day_indexes.index(op.day)]
+        else:
+            indexes = list(range(len(self.day_indexes)))
+
+        routes = [self.routes[i] for i in indexes]
+        before = [len(route) for route in routes]
+        leftovers = insert_companies(routes, [stop], [self.day_dates[i] for i in indexes], self.matrix)
+        if leftovers:
+            print(f"⚠️ 新增企业无法在时间窗内安排: {op.target}")
+            return False
+        self.changed.update(i for i, route, n in zip(indexes, routes, before) if len(route) != n)
+        return True
+
+
+_HANDLERS = {
+    "remove": _EditSession.remove,
+    "swap": _EditSession.swap,
+    "shift": _EditSession.shift,
+    "add_visit": _EditSession.add_visit,
+}
+
+
+def refine_itinerary_incrementally(days: List[DayPlan], instruction: str, hotel_loc: Location,
+                                   commute_cache: Optional[CommuteMatrix] = None) -> Optional[Dict[str, Any]]:
+    """
+    增量修改调研日行程：
+    - 把修改要求识别为 shift / swap / remove / add_visit 操作
+    - 在各天缓存的停靠点快照上执行，只重算受影响的那几天（commute_cache 按需补算新增地点的点对）
+    - 只有求解器规划、带停靠点快照的天可以增量修改
+    - 修改后不可行、固定事务迟到增加、或存在无法识别的要求时返回 None（由调用方回退到 LLM 整体修改）
+    返回 {"days": [变动的 DayPlan], "changed_days": [day_index, ...]}
+    """
+    editable = [day for day in days if day.get("stops") is not None]
+    if not editable:
+        return None
+
+    session = _EditSession(editable, hotel_loc, commute_cache if commute_cache is not None else CommuteMatrix())
+    late_before = [
+        (simulate_day(day, route, session.matrix) or {}).get("late", 0.0)
+        for day, route in zip(session.day_dates, session.routes)
+    ]
+
+    ops = classify_refinement(
+        instruction,
+        _stops_summary(session.day_indexes, session.day_dates, session.routes, session.matrix)
+    )
+    if ops is None:
+        return None
+
+    for op in ops:
+        print(f"   -> 执行修改操作: {op.op} {op.target or ''} {op.other or ''}".rstrip())
+        if not _HANDLERS[op.op](session, op):
+            return None
+
+    updated: List[DayPlan] = []
+    for d_idx in sorted(session.changed):
+        day, route = session.day_dates[d_idx], session.routes[d_idx]
+        sim = simulate_day(day, route, session.matrix)
+        if sim is None or sim["late"] > late_before[d_idx] + EPS:
+            print(f"⚠️ 修改后 Day {session.day_indexes[d_idx]} 不可行，回退到整体修改")
+            return None
+        updated.append({
+            **editable[d_idx],
+            "items": route_to_items(day, route, session.matrix, hotel_loc),
+            "assigned_companies": [stop.name for stop in route if stop.kind == "company"],
+            "stops": [stop.to_dict() for stop in route],
+        })
+
+    return {"days": updated, "changed_days": [day["day_index"] for day in updated]}
@@ -0,0 +1,238 @@
+#itinerary_parser.py
+import json
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from pydantic import ValidationError
+
+from data_models import ItineraryItemModel
+from model_router import model_router
+from prompts import ITINERARY_ITEM_REPAIR_PROMPT
+from state import ItineraryItem
+
+# Python 风格字面量（LLM 常输出 None / True / False）在字符串外部时替换为 JSON 字面量
+_PY_LITERALS = {"None": "null", "True": "true", "False": "false"}
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+
+class BrokenFragment:
+    """解析或校验失败的单个片段，保留其在数组中的位置以便修复后原位回填"""
+
+    def __init__(self, index: int, text: str, error: str):
+        self.index = index
+        self.text = text
+        self.error = error
+
+
+class IncrementalItineraryParser:
+    """
+    增量 ItineraryItem 解析器：
+    - 可逐块 feed LLM 输出（流式 token 或完整文本），每凑齐一个顶层对象就立即解析、校验
+    - 自动跳过 Markdown 代码块标记、前后解释文字，遇到数组结束符后忽略尾部内容
+    - 单个对象损坏只影响该对象，记入 broken 列表，其余对象照常产出
+    """
+
+    def __init__(self):
+        self.items: List[Optional[ItineraryItem]] = []      # 与原数组位置一一对应，损坏位置为 None
+        self.broken: List[BrokenFragment] = []
+        self._buffer: List[str] = []
+        self._depth = 0
+        self._in_array = False
+        self._finished = False
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> List[ItineraryItem]:
+        """喂入一段文本，返回本次新解析出的合法条目"""
+        new_items: List[ItineraryItem] = []
+        if self._finished:
+            return new_items
+
+        for ch in chunk:
+            if self._depth > 0:
+                self._buffer.append(ch)
+                if self._in_string:
+                    if self._escape:
+                        self._escape = False
+                    elif ch == "\\":
+                        self._escape = True
+                    elif ch == '"':
+                        self._in_string = False
+                    continue
+                if ch == '"':
+                    self._in_string = True
+                elif ch in "{[":
+                    self._depth += 1
+                elif ch in "}]":
+                    self._depth -= 1
+                    if self._depth == 0:
+                        item = self._emit("".join(self._buffer))
+                        if item is not None:
+                            new_items.append(item)
+                        self._buffer = []
+                continue
+
+            # depth == 0：位于对象之外
+            if ch == "{":
+                self._depth = 1
+                self._buffer = [ch]
+            elif ch == "[" and not self._in_array:
+                self._in_array = True
+            elif ch == "]" and self._in_array:
+                if self.items:
+                    self._finished = True
+                    break
+                # 数组开始前的说明文字里出现的 [ ]，不是真正的行程数组
+                self._in_array = False
+
+        return new_items
+
+    def close(self) -> List[ItineraryItem]:
+        """输入结束：未闭合的对象记为损坏片段"""
+        if self._depth > 0 and self._buffer:
+            self._record_broken("".join(self._buffer), "输出被截断，对象未闭合")
+        self._buffer = []
+        self._depth = 0
+        self._finished = True
+        return [item for item in self.items if item is not None]
+
+    def _emit(self, fragment: str) -> Optional[ItineraryItem]:
+        try:
+            item = validate_itinerary_item(_loads_lenient(fragment))
+        except (ValueError, ValidationError) as e:
+            self._record_broken(fragment, str(e))
+            return None
+        self.items.append(item)
+        return item
+
+    def _record_broken(self, fragment: str, error: str) -> None:
+        self.broken.append(BrokenFragment(len(self.items), fragment, error))
+        self.items.append(None)
+
+
+def _loads_lenient(fragment: str) -> Any:
+    """先按标准 JSON 解析，失败后做本地低成本修正（Python 字面量、尾逗号）再试一次"""
+    try:
+        return json.loads(fragment)
+    except json.JSONDecodeError:
+        pass
+
+    out: List[str] = []
+    in_string = escape = False
+    i = 0
+    while i < len(fragment):
+        ch = fragment[i]
+        if in_string:
+            out.append(ch)
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            i += 1
+            continue
+        if ch == '"':
+            in_string = True
+            out.append(ch)
+            i += 1
+            continue
+        for literal, replacement in _PY_LITERALS.items():
+            if fragment.startswith(literal, i) and not fragment[i + len(literal):i + len(literal) + 1].isalnum():
+                out.append(replacement)
+                i += len(literal)
+                break
+        else:
+            out.append(ch)
+            i += 1
+
+    return json.loads(_TRAILING_COMMA.sub(r"\1", "".join(out)))
+
+
+def validate_itinerary_item(data: Any) -> ItineraryItem:
+    """按 ItineraryItemModel 校验并转换为 state.ItineraryItem（时间为 datetime）"""
+    if not isinstance(data, dict):
+        raise ValueError(f"期望 JSON 对象，实际为 {type(data).__name__}")
+    return ItineraryItemModel.model_validate(data).model_dump()
+
+
+def repair_fragment(fragment: BrokenFragment) -> Optional[ItineraryItem]:
+    """只把损坏的单个片段交给 LLM 修复，修复后仍不合法则放弃该条"""
+    try:
+        repaired = model_router.invoke(
+            "repair_itinerary_item",
+            lambda model: ITINERARY_ITEM_REPAIR_PROMPT | model,
+            {"fragment": fragment.text, "error": fragment.error},
+        ).content
+        parser = IncrementalItineraryParser()
+        parser.feed(repaired)
+        items = parser.close()
+        return items[0] if items else None
+    except Exception as e:
+        print(f"⚠️ 行程片段修复失败，已丢弃: {e}")
+        return None
+
+
+def parse_itinerary_output(raw_output: str, parser: Optional[IncrementalItineraryParser] = None) -> List[ItineraryItem]:
+    """
+    解析 LLM 返回的行程数组：
+    - 容忍代码块、前后缀文字、Python 字面量、尾逗号、截断
+    - 只对损坏的片段单独调用 LLM 修复，修复结果按原位置回填
+    parser 可传入流式阶段已经喂过数据的解析器，避免重复解析
+    """
+    if parser is None:
+        parser = IncrementalItineraryParser()
+        parser.feed(raw_output)
+    parser.close()
+
+    if parser.broken:
+        print(f"🔧 行程输出中有 {len(parser.broken)} 个片段损坏，逐个修复")
+        for fragment in parser.broken:
+            parser.items[fragment.index] = repair_fragment(fragment)
+
+    return [item for item in parser.items if item is not None]
+
+
+class ItineraryStreamHandler(BaseCallbackHandler):
+    """
+    流式回调：LLM 每产出一个 token 就喂给对应请求的增量解析器，
+    每解析出一个完整 ItineraryItem 即调用 on_item（用于进度展示）。
+    按 run_id 隔离解析器，对冲请求并发流式输出时互不干扰。
+    """
+
+    def __init__(self, on_item: Optional[Callable[[ItineraryItem], None]] = None):
+        self.on_item = on_item
+        self._lock = threading.Lock()
+        self._parsers: Dict[UUID, IncrementalItineraryParser] = {}
+        self._completed: Dict[str, IncrementalItineraryParser] = {}
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            parser = self._parsers.setdefault(run_id, IncrementalItineraryParser())
+        for item in parser.feed(token):
+            if self.on_item is not None:
+                self.on_item(item)
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs: Any) -> None:
+        text = "".join(
+            generation.text for generations in response.generations for generation in generations
+        )
+        with self._lock:
+            parser = self._parsers.pop(run_id, None)
+            if parser is not None:
+                self._completed[text] = parser
+
+    def parser_for(self, raw_output: str) -> Optional[IncrementalItineraryParser]:
+        """取回产出该文本的那个请求的解析器（对冲时即胜出的那一路）"""
+        with self._lock:
+            return self._completed.get(raw_output)
+
+
+def streaming_model(model: Any) -> Any:
+    """返回开启流式输出的模型副本，invoke 时内部按 token 触发 on_llm_new_token"""
+    if "streaming" in type(model).model_fields:
+        return model.model_copy(update={"streaming": True})
+    return model
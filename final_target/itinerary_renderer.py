@@ -0,0 +1,68 @@
+#itinerary_renderer.py
+from typing import Dict, List, Optional
+
+from state import DayPlan, ItineraryItem
+
+# 与 prompts._ITINERARY_TABLE_FORMAT 约定的表头一致
+TABLE_HEADER = [
+    "| 日期/天数 | 时间 | 类型 | 内容 | 地点 |",
+    "| :--- | :--- | :--- | :--- | :--- |",
+]
+
+
+def _cell(value: Optional[str]) -> str:
+    """Markdown 单元格转义：竖线与换行会破坏表格结构"""
+    if value is None or value == "":
+        return "None"
+    return str(value).replace("|", "\\|").replace("\n", " ")
+
+
+def render_row(day_no: int, item: ItineraryItem) -> str:
+    """单个行程项 → 一行 Markdown 表格"""
+    start, end = item["start_time"], item["end_time"]
+    location = item.get("location") or {}
+    place = location.get("name") or location.get("address")
+    return "| " + " | ".join([
+        f"Day {day_no}（{start.strftime('%Y-%m-%d')}）",
+        f"{start.strftime('%H:%M')}-{end.strftime('%H:%M')}",
+        _cell(item.get("type")),
+        _cell(item.get("description")),
+        _cell(place),
+    ]) + " |"
+
+
+def day_key(day_index: int) -> str:
+    """rows_cache 的键，形如 day_2"""
+    return f"day_{day_index}"
+
+
+def render_day_rows(day_no: int, day_items: Optional[List[ItineraryItem]]) -> List[str]:
+    """渲染某一天的全部表格行"""
+    return [render_row(day_no, item) for item in sorted(day_items or [], key=lambda x: x["start_time"])]
+
+
+def render_itinerary_table(
+    days: List[DayPlan],
+    rows_cache: Optional[Dict[str, List[str]]] = None,
+    changed_days: Optional[List[int]] = None,
+) -> Dict[str, object]:
+    """
+    本地渲染最终 Markdown 行程表：
+    - days 为按 day_index 排序的逐天行程
+    - rows_cache 为上一次按天缓存的表格行；changed_days 为本次有变动的天（day_index）
+    - 只重渲染变动（或缓存缺失）的天，其余天直接复用缓存行
+    返回 {"table": Markdown 表格, "rows": 新的按天缓存}
+    """
+    previous = rows_cache or {}
+    rows_cache = {}
+
+    lines = list(TABLE_HEADER)
+    for day in days:
+        key = day_key(day["day_index"])
+        if changed_days is None or day["day_index"] in changed_days or key not in previous:
+            rows_cache[key] = render_day_rows(day["day_index"], day.get("items"))
+        else:
+            rows_cache[key] = previous[key]
+        lines.extend(rows_cache[key])
+
+    return {"table": "\n".join(lines), "rows": rows_cache}
@@ -0,0 +1,146 @@
+#itinerary_validator.py
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from config import PRE_MEETING_BUFFER_MINUTES, VALIDATOR_COMMUTE_TOLERANCE_MINUTES
+from state import FixedEvent, ItineraryItem
+from tools.commute_matrix import CommuteMatrix
+
+COMMUTE_TYPES = {"🚗"}
+LONG_DISTANCE_TYPES = {"✈️", "🚄", "transport"}
+
+
+def _violation(code: str, severity: str, index: int, item: Optional[ItineraryItem], message: str) -> Dict[str, Any]:
+    return {
+        "code": code,
+        "severity": severity,                 # error：行程不可执行；warning：可执行但不理想
+        "index": index,                       # 在按开始时间排序后的行程中的位置
+        "description": item.get("description") if item else None,
+        "message": message,
+    }
+
+
+def _to_minutes(values: List[Any]) -> np.ndarray:
+    return np.array(values, dtype="datetime64[m]").astype(np.int64)
+
+
+def _fmt(item: ItineraryItem) -> str:
+    return f"{item['start_time']:%m-%d %H:%M}-{item['end_time']:%H:%M} {item.get('description')}"
+
+
+def validate_itinerary(
+    items: List[ItineraryItem],
+    fixed_events: Optional[List[FixedEvent]] = None,
+    commute_cache: Optional[CommuteMatrix] = None,
+) -> List[Dict[str, Any]]:
+    """
+    行程可行性校验（向量化，一次遍历所有约束）：
+    - end_before_start：结束时间早于开始时间
+    - overlap：与前面任一行程项时间重叠（按开始时间排序后，与此前最晚结束时间比较）
+    - commute_too_short：通勤段时长短于通勤矩阵（只读缓存，不触发 API 调用）
+    - fixed_event_moved / fixed_event_missing：固定事务被改动时间或遗漏
+    - late_for_fixed_event：到达固定事务的时间晚于 开始时间 - PRE_MEETING_BUFFER_MINUTES（warning）
+    只校验 items 覆盖到的日期上的固定事务
+    """
+    if not items:
+        return []
+
+    order = sorted(range(len(items)), key=lambda i: items[i]["start_time"])
+    items = [items[i] for i in order]
+    n = len(items)
+
+    start = _to_minutes([item["start_time"] for item in items])
+    end = _to_minutes([item["end_time"] for item in items])
+    types = np.array([item.get("type") or "" for item in items], dtype=object)
+    duration = end - start
+
+    violations: List[Dict[str, Any]] = []
+
+    # ===== 1️⃣ 结束早于开始 =====
+    for i in np.flatnonzero(duration < 0):
+        violations.append(_violation("end_before_start", "error", int(i), items[i], f"结束时间早于开始时间: {_fmt(items[i])}"))
+
+    # ===== 2️⃣ 时间重叠（跨城大交通与其到达后的首段通勤允许首尾相接） =====
+    if n > 1:
+        latest_end = np.maximum.accumulate(end)[:-1]
+        overlap = (start[1:] < latest_end) & (duration[1:] > 0)
+        for i in np.flatnonzero(overlap) + 1:
+            prev = int(np.flatnonzero(end[:i] > start[i])[-1])
+            violations.append(_violation(
+                "overlap", "error", int(i), items[i],
+                f"与【{items[prev].get('description')}】时间重叠: {_fmt(items[i])}"
+            ))
+
+    # ===== 3️⃣ 通勤段短于通勤矩阵 =====
+    if commute_cache is not None and n > 2:
+        is_commute = np.isin(types, list(COMMUTE_TYPES))
+        # 只检查前后都是非通勤项的单段通勤：起点为前一项地点，终点为后一项地点
+        candidates = np.flatnonzero(is_commute[1:-1] & ~is_commute[:-2] & ~is_commute[2:]) + 1
+        if candidates.size:
+            keys = [CommuteMatrix.key(item.get("location") or {}) for item in items]
+            expected = np.array([
+                commute_cache.peek(keys[i - 1], keys[i + 1]) for i in candidates
+            ], dtype=float)
+            shortfall = expected - duration[candidates]
+            too_short = ~np.isnan(expected) & (shortfall > VALIDATOR_COMMUTE_TOLERANCE_MINUTES)
+            for i, exp in zip(candidates[too_short], expected[too_short]):
+                violations.append(_violation(
+                    "commute_too_short", "error", int(i), items[i],
+                    f"通勤仅 {int(duration[i])} 分钟，通勤矩阵为 {exp:.0f} 分钟: {_fmt(items[i])}"
+                ))
+
+    # ===== 4️⃣ 固定事务：时间不得改动，且需提前到达 =====
+    days = {item["start_time"].date() for item in items}
+    events = [e for e in (fixed_events or []) if e["start_time"].date() in days]
+    if events:
+        descriptions = [item.get("description") or "" for item in items]
+        matched = np.array([
+            next((i for i, desc in enumerate(descriptions)
+                  if e["name"] in desc and types[i] not in COMMUTE_TYPES), -1)
+            for e in events
+        ])
+        expected_start = _to_minutes([e["start_time"] for e in events])
+        expected_end = _to_minutes([e["end_time"] for e in events])
+
+        for k in np.flatnonzero(matched < 0):
+            violations.append(_violation(
+                "fixed_event_missing", "error", -1, None, f"固定事务【{events[k]['name']}】未出现在行程中"
+            ))
+
+        found = np.flatnonzero(matched >= 0)
+        idx = matched[found]
+        moved = (start[idx] != expected_start[found]) | (end[idx] != expected_end[found])
+        for k, i in zip(found[moved], idx[moved]):
+            violations.append(_violation(
+                "fixed_event_moved", "error", int(i), items[i],
+                f"固定事务【{events[k]['name']}】应为 {events[k]['start_time']:%m-%d %H:%M}-{events[k]['end_time']:%H:%M}，"
+                f"实际为 {_fmt(items[i])}"
+            ))
+
+        # 到达时间：事务之前最后一项的结束时间
+        has_prev = idx > 0
+        arrive = np.where(has_prev, end[np.maximum(idx - 1, 0)], start[idx])
+        late = has_prev & (arrive > expected_start[found] - PRE_MEETING_BUFFER_MINUTES)
+        for k, i, a in zip(found[late], idx[late], arrive[late]):
+            minutes_late = int(a - (expected_start[k] - PRE_MEETING_BUFFER_MINUTES))
+            violations.append(_violation(
+                "late_for_fixed_event", "warning", int(i), items[i],
+                f"到达固定事务【{events[k]['name']}】晚于提前 {PRE_MEETING_BUFFER_MINUTES} 分钟的要求 {minutes_late} 分钟"
+            ))
+
+    return violations
+
+
+def run_validation(stage: str, items: List[ItineraryItem], fixed_events: Optional[List[FixedEvent]],
+                   commute_cache: Optional[Dict[str, Dict[str, float]]]) -> List[Dict[str, Any]]:
+    """节点中调用：校验并打印摘要，返回违规列表（写入 itinerary.violations[stage]）"""
+    violations = validate_itinerary(items, fixed_events, CommuteMatrix.from_dict(commute_cache))
+    errors = sum(1 for v in violations if v["severity"] == "error")
+    if violations:
+        print(f"⚠️ 行程校验[{stage}]: {errors} 个错误，{len(violations) - errors} 个提醒")
+        for v in violations:
+            print(f"   - [{v['code']}] {v['message']}")
+    else:
+        print(f"✅ 行程校验[{stage}]: 通过")
+    return violations
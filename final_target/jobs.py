@@ -0,0 +1,133 @@
+#jobs.py
+import hashlib
+import hmac
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+import requests
+from fastapi.encoders import jsonable_encoder
+
+from config import JOB_RECORD_TTL_SECONDS, WEBHOOK_MAX_ATTEMPTS, WEBHOOK_SECRET, WEBHOOK_TIMEOUT_SECONDS
+from run_pool import RunCancelled, RunPool, snapshot_result
+from shared_store import SharedStore, shared_store
+
+_FINISHED = ("NEED_INTERACTION", "COMPLETED", "FAILED", "CANCELLED")
+
+
+def _sign(body: bytes) -> Optional[str]:
+    if not WEBHOOK_SECRET:
+        return None
+    return "sha256=" + hmac.new(WEBHOOK_SECRET.encode("utf-8"), body, hashlib.sha256).hexdigest()
+
+
+class JobManager:
+    """
+    异步任务：每次启动 / 恢复都是一个 job，提交后立即返回 job_id，运行经 RunPool 在后台执行
+    - 状态：QUEUED → RUNNING → NEED_INTERACTION（停在 interrupt，等待下一次恢复 job）/ COMPLETED / FAILED / CANCELLED
+    - 客户端轮询 get(job_id)，或提交时给出 webhook_url，运行到达 interrupt 或结束时回调（失败指数退避重试）
+    - 记录保存在共享存储中（保留 JOB_RECORD_TTL_SECONDS）：多 worker 部署时任一 worker 都能查询、取消其它 worker 上的任务；
+      记录只由执行该任务的 worker 写入
+    """
+
+    def __init__(self, run_pool: RunPool, store: SharedStore = shared_store, ttl_seconds: float = JOB_RECORD_TTL_SECONDS):
+        self.run_pool = run_pool
+        self.store = store
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._webhook_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="webhook")
+
+    def submit(self, thread_id: str, graph_input: Any, webhook_url: Optional[str] = None) -> Dict[str, Any]:
+        """提交运行（RunPool 拒绝时 RunRejected 原样抛出），返回任务记录"""
+        job_id = f"job-{uuid.uuid4().hex[:12]}"
+        now = time.time()
+        job = {
+            "job_id": job_id,
+            "thread_id": thread_id,
+            "status": "QUEUED",
+            "created_at": now,
+            "updated_at": now,
+            "result": None,
+            "error": None,
+            "webhook_url": webhook_url,
+            "webhook": None,
+        }
+        self.store.set("jobs", job_id, job, ttl_seconds=self.ttl_seconds)
+        try:
+            future = self.run_pool.submit(thread_id, graph_input, listener=self._running_listener(job_id))
+        except Exception:
+            self.store.delete("jobs", job_id)
+            raise
+        future.add_done_callback(lambda f: self._on_done(job_id, f))
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.get("jobs", job_id)
+
+    def cancel(self, job_id: str) -> Optional[str]:
+        """取消任务对应的运行：返回 RunPool.cancel 的结果，任务不存在或已结束时返回 None"""
+        job = self.get(job_id)
+        if job is None or job["status"] in _FINISHED:
+            return None
+        return self.run_pool.cancel(job["thread_id"])
+
+    def _update(self, job_id: str, **fields) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self.store.get("jobs", job_id)
+            if job is None:
+                return None
+            job.update(fields, updated_at=time.time())
+            self.store.set("jobs", job_id, job, ttl_seconds=self.ttl_seconds)
+            return job
+
+    def _running_listener(self, job_id: str):
+        """运行的第一个进度事件到达时把任务标记为 RUNNING"""
+        started = threading.Event()
+
+        def listener(event: Dict[str, Any]) -> None:
+            if not started.is_set():
+                started.set()
+                self._update(job_id, status="RUNNING")
+        return listener
+
+    def _on_done(self, job_id: str, future: Future) -> None:
+        update: Dict[str, Any] = {}
+        if future.cancelled() or isinstance(future.exception(), RunCancelled):
+            update["status"] = "CANCELLED"
+        elif future.exception() is not None:
+            update.update(status="FAILED", error=str(future.exception()))
+        else:
+            result = snapshot_result(future.result())
+            update.update(status=result.pop("status"), result=jsonable_encoder(result))
+
+        payload = self._update(job_id, **update)
+        if payload is not None and payload["webhook_url"]:
+            self._webhook_executor.submit(self._deliver, job_id, payload)
+
+    def _deliver(self, job_id: str, payload: Dict[str, Any]) -> None:
+        body = json.dumps(jsonable_encoder({k: v for k, v in payload.items() if k != "webhook"}),
+                          ensure_ascii=False).encode("utf-8")
+        headers = {"Content-Type": "application/json", "X-Job-Id": job_id}
+        if signature := _sign(body):
+            headers["X-Webhook-Signature"] = signature
+
+        delivery = {"attempts": 0, "delivered": False, "last_error": None}
+        for attempt in range(WEBHOOK_MAX_ATTEMPTS):
+            delivery["attempts"] = attempt + 1
+            try:
+                response = requests.post(payload["webhook_url"], data=body, headers=headers, timeout=WEBHOOK_TIMEOUT_SECONDS)
+                if response.status_code < 300:
+                    delivery["delivered"] = True
+                    break
+                delivery["last_error"] = f"HTTP {response.status_code}"
+            except requests.RequestException as e:
+                delivery["last_error"] = str(e)
+            if attempt + 1 < WEBHOOK_MAX_ATTEMPTS:
+                time.sleep(0.5 * 2 ** attempt)
+        if not delivery["delivered"]:
+            print(f"⚠️ 任务 {job_id} 的 webhook 回调失败: {delivery['last_error']}")
+
+        self._update(job_id, webhook=delivery)
@@ -1,13 +1,15 @@
 #llm_agent.py
 from datetime import timedelta, datetime
 import json
-from langchain_core.messages import SystemMessage, HumanMessage
 from langchain_core.output_parsers import JsonOutputParser
-from langchain_core.prompts import ChatPromptTemplate
 from typing import Union, List, Dict, Optional, Any
-from config import deepseek_chat, PRE_MEETING_BUFFER_MINUTES, qwen_max
+from config import PRE_MEETING_BUFFER_MINUTES
 from data_models import UserInputParams, SelectedTransport, CompanyRecommendations
-from prompts import INPUT_EXTRACTION_PROMPT, TRANSPORT_DECISION_PROMPT, day_1_plan_prompt, ENSURE_ADDRESS_PROMPT
+from external_calls import external_calls
+from itinerary_parser import ItineraryStreamHandler, parse_itinerary_output, streaming_model
+from model_router import model_router
+from prompts import INPUT_EXTRACTION_PROMPT, TRANSPORT_DECISION_PROMPT, DAY_1_PLAN_PROMPT, ENSURE_ADDRESS_PROMPT, \
+    COMPANY_RECOMMENDATION_PROMPT
 from state import ItineraryItem, FixedEvent
 from tools.travel_api import amap_geocode
 
@@ -17,19 +19,14 @@ def parse_user_input(user_input: str) -> Union[UserInputParams, dict]:
     使用 LLM 将非结构化文本解析为结构化输入参数 (支持多固定事务 fixed_events)。
     返回 UserInputParams 实例的字典形式，解析失败时返回错误信息。
     """
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            ("system", INPUT_EXTRACTION_PROMPT),
-            ("user", user_input),
-        ]
-    )
-
-    # 构建结构化输出链
-    extraction_chain = prompt | deepseek_chat.with_structured_output(UserInputParams)
-
     try:
-        # 执行解析
-        result_model = extraction_chain.invoke({"user_input": user_input})
+        # 构建结构化输出链（system 为静态前缀，用户原文只出现在 human 段），由路由器选择模型执行
+        result_model = model_router.invoke(
+            "parse_user_input",
+            lambda model: INPUT_EXTRACTION_PROMPT | model.with_structured_output(UserInputParams),
+            {"user_input": user_input},
+            validate=lambda result: result is not None
+        )
 
         # 返回字典形式，方便后续 LangGraph 状态合并
         return result_model.model_dump()
@@ -51,11 +48,12 @@ def llm_choose_transport(
     """
     使用 LLM 在候选交通方案中选择最优班次
     """
-    chain = (
-        TRANSPORT_DECISION_PROMPT
-        | qwen_max
-        | JsonOutputParser(pydantic_object=SelectedTransport)
-    )
+    def build_chain(model):
+        return (
+            TRANSPORT_DECISION_PROMPT
+            | model
+            | JsonOutputParser(pydantic_object=SelectedTransport)
+        )
 
     try:
         total_buffer_minutes = PRE_MEETING_BUFFER_MINUTES + arrival_commute_minutes
@@ -64,18 +62,19 @@ def llm_choose_transport(
         )
 
         llm_input = {
-            "transport_options": json.dumps(
-                transport_options,
-                ensure_ascii=False,
-                indent=2
-            ),
+            "transport_options": to_compact_json(transport_options),
             "departure_date": user_params["departure_date"],
             "meeting_start_dt": anchor_event_start.strftime("%Y-%m-%d %H:%M"),
             "latest_hub_arrival": latest_hub_arrival.strftime("%Y-%m-%d %H:%M"),
             "arrival_commute_minutes": arrival_commute_minutes,
         }
 
-        raw_output = chain.invoke(llm_input)
+        raw_output = model_router.invoke(
+            "llm_choose_transport",
+            build_chain,
+            llm_input,
+            validate=lambda result: isinstance(result, dict) and bool(result.get("id"))
+        )
 
         if isinstance(raw_output, dict):
             selected_id = raw_output.get("id")
@@ -102,6 +101,13 @@ def to_json_serializable(obj):
         return obj.strftime("%Y-%m-%d %H:%M")
     raise TypeError(f"Type {type(obj)} not serializable")
 
+
+def to_compact_json(obj: Any) -> str:
+    """
+    Prompt 动态段使用的紧凑 JSON（无缩进、无多余空格），减少 token 数
+    """
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=to_json_serializable)
+
 def generate_day1_tasks_for_llm(
     transport_item: ItineraryItem,
     fixed_events: List[FixedEvent],
@@ -116,20 +122,25 @@ def generate_day1_tasks_for_llm(
     # 1️⃣ 构造 LLM 输入
     # =====================
 
-    prompt = day_1_plan_prompt.format(
-        arrival_transport=json.dumps(transport_item, ensure_ascii=False, indent=2, default=to_json_serializable),
-        day1_fixed_events=json.dumps(fixed_events, ensure_ascii=False, indent=2, default=to_json_serializable),
-        user_params=json.dumps(user_params, ensure_ascii=False, indent=2, default=to_json_serializable),
-        day1_commute_matrix=json.dumps(day1_commute_matrix, ensure_ascii=False, indent=2)
+    messages = DAY_1_PLAN_PROMPT.format_messages(
+        arrival_transport=to_compact_json(transport_item),
+        day1_fixed_events=to_compact_json(fixed_events),
+        user_params=to_compact_json(user_params),
+        day1_commute_matrix=to_compact_json(day1_commute_matrix)
     )
 
     # =====================
     # 2️⃣ 调用 LLM
     # =====================
+    # 流式输出：每生成一个完整 ItineraryItem 就在回调里完成解析与校验
+    stream_handler = ItineraryStreamHandler()
     try:
-        raw_message = deepseek_chat.invoke(prompt)
-        print(raw_message)
-        print(type(raw_message))
+        raw_message = model_router.invoke(
+            "generate_day1_tasks",
+            streaming_model,
+            messages,
+            callbacks=[stream_handler]
+        )
 
         raw_output = raw_message.content
 
@@ -138,13 +149,14 @@ def generate_day1_tasks_for_llm(
         return []
 
     # =====================
-    # 3️⃣ 解析 JSON 输出
+    # 3️⃣ 解析 JSON 输出（容错解析，仅对损坏片段单独修复）
     # =====================
-    try:
-        day_1_itinerary: List[ItineraryItem] = json.loads(raw_output)
-    except Exception as e:
-        print(f"❌ Day 1 行程 JSON 解析失败: {e}")
-        return []
+    day_1_itinerary: List[ItineraryItem] = parse_itinerary_output(
+        raw_output,
+        stream_handler.parser_for(raw_output)
+    )
+    if not day_1_itinerary:
+        print("❌ Day 1 行程解析结果为空")
 
     return day_1_itinerary
 
@@ -188,40 +200,48 @@ def generate_day1_tasks_for_llm(
 #         # 在异常情况下，返回三个空列表，而不是依赖函数末尾的 return
 #         return [[], [], []]
 
+@external_calls.cached("company_recommendations", key=lambda city: city)
+def _recommend_companies(city: str) -> List[str]:
+    # 城市只出现在 human 段，system 段可跨城市命中前缀缓存
+    messages = COMPANY_RECOMMENDATION_PROMPT.format_messages(city=city)
+    result = model_router.invoke(
+        "generate_company_recommendations",
+        lambda model: model,
+        messages
+    ).content
+
+    # 简单的解析逻辑（按行或逗号分割）
+    companies = [c.strip() for c in result.replace("、", ",").replace("\n", ",").split(",") if c.strip()]
+    return companies[:15]  # 确保数量适中
+
+
 def generate_company_recommendations_by_llm(city: str) -> List[str]:
     """
     根据城市推荐知名企业供用户自由勾选。
+    同城推荐结果在会话间共享（失败时的兜底列表不缓存）。
     """
     try:
-        # 修改提示词，要求生成一个长列表
-        system_prompt = (
-            f"你是一名专业的商务调研分析师。请为城市【{city}】推荐 15 家有价值的知名科技或核心企业。"
-            "这些企业应适合商务访问或调研。请仅输出企业名称，不要包含其他解释，企业必须真实存在。"
-        )
-
-        # 假设你已经定义了相应的 Pydantic 模型来接收 List[str]
-        # 如果没有，可以使用简单的字符串解析
-        messages = [SystemMessage(content=system_prompt)]
-        result = qwen_max.invoke(messages).content
-
-        # 简单的解析逻辑（按行或逗号分割）
-        companies = [c.strip() for c in result.replace("、", ",").replace("\n", ",").split(",") if c.strip()]
-        return companies[:15]  # 确保数量适中
+        return _recommend_companies(city)
 
     except Exception as e:
         print(f"LLM 推荐失败: {e}")
         return ["腾讯", "华为", "大疆", "比亚迪", "平安科技"]
 
 
+@external_calls.cached("company_geocode", key=lambda company_name, city: f"{city}|{company_name}")
 def geocode_company_by_name(company_name: str, city: str) -> Dict[str, Any] | None:
 
-    prompt = ENSURE_ADDRESS_PROMPT.format(
+    messages = ENSURE_ADDRESS_PROMPT.format_messages(
         company_name=company_name,
         city=city
     )
 
     try:
-        address = qwen_max.invoke(prompt).content.strip()
+        address = model_router.invoke(
+            "geocode_company_by_name",
+            lambda model: model,
+            messages
+        ).content.strip()
         if not address:
             return None
 
@@ -0,0 +1,257 @@
+#llm_metrics.py
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.runnables.config import ensure_config, merge_configs
+
+from config import LLM_PRICING, LLM_USAGE_MAX_THREADS
+
+# 每次 LLM 调用输出一行 JSON 结构化日志
+logger = logging.getLogger("llm_usage")
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+def extract_token_usage(response: LLMResult) -> Dict[str, int]:
+    """
+    从一次 LLM 响应中提取 token 用量：
+    - 优先读取 AIMessage.usage_metadata（langchain 统一口径，cache_read 即缓存命中 token）
+    - 兜底读取 llm_output.token_usage 中的厂商原始字段：
+      DeepSeek: prompt_cache_hit_tokens / DashScope(OpenAI 兼容): prompt_tokens_details.cached_tokens
+    """
+    usage = {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+
+    for generations in response.generations:
+        for generation in generations:
+            message = getattr(generation, "message", None)
+            usage_metadata = getattr(message, "usage_metadata", None) or {}
+            if not usage_metadata:
+                continue
+            usage["prompt_tokens"] += usage_metadata.get("input_tokens", 0) or 0
+            usage["completion_tokens"] += usage_metadata.get("output_tokens", 0) or 0
+            details = usage_metadata.get("input_token_details") or {}
+            usage["cached_tokens"] += details.get("cache_read", 0) or 0
+
+    if usage["prompt_tokens"]:
+        return usage
+
+    token_usage = (response.llm_output or {}).get("token_usage") or {}
+    usage["prompt_tokens"] = token_usage.get("prompt_tokens", 0) or 0
+    usage["completion_tokens"] = token_usage.get("completion_tokens", 0) or 0
+    usage["cached_tokens"] = (
+        token_usage.get("prompt_cache_hit_tokens")
+        or (token_usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+        or 0
+    )
+    return usage
+
+
+def estimate_cost(model: Optional[str], usage: Dict[str, int]) -> float:
+    """按 config.LLM_PRICING 估算单次调用费用（元），未配置价格的模型记 0"""
+    pricing = LLM_PRICING.get(model or "")
+    if not pricing:
+        return 0.0
+    cache_miss = max(usage["prompt_tokens"] - usage["cached_tokens"], 0)
+    return (
+        usage["cached_tokens"] * pricing["input_cache_hit"]
+        + cache_miss * pricing["input_cache_miss"]
+        + usage["completion_tokens"] * pricing["output"]
+    ) / 1_000_000
+
+
+def _empty_bucket() -> Dict[str, Any]:
+    return {
+        "calls": 0,
+        "errors": 0,
+        "prompt_tokens": 0,
+        "cached_tokens": 0,
+        "completion_tokens": 0,
+        "latency_s": 0.0,
+        "ttft_s": 0.0,
+        "ttft_samples": 0,
+        "cost": 0.0,
+    }
+
+
+def _finalize_bucket(bucket: Dict[str, Any]) -> Dict[str, Any]:
+    """累计值 → 对外展示的汇总（含平均延迟、平均首 token 延迟、缓存命中率）"""
+    calls = bucket["calls"]
+    return {
+        "calls": calls,
+        "errors": bucket["errors"],
+        "prompt_tokens": bucket["prompt_tokens"],
+        "cached_tokens": bucket["cached_tokens"],
+        "completion_tokens": bucket["completion_tokens"],
+        "cache_hit_rate": round(bucket["cached_tokens"] / bucket["prompt_tokens"], 4) if bucket["prompt_tokens"] else 0.0,
+        "total_latency_s": round(bucket["latency_s"], 3),
+        "avg_latency_s": round(bucket["latency_s"] / calls, 3) if calls else None,
+        "avg_ttft_s": round(bucket["ttft_s"] / bucket["ttft_samples"], 3) if bucket["ttft_samples"] else None,
+        "cost": round(bucket["cost"], 6),
+    }
+
+
+class LLMUsageMeter(BaseCallbackHandler):
+    """
+    LLM 调用计量：记录每次调用的 prompt / completion / 缓存命中 token、首 token 延迟、总耗时、模型与费用，
+    并按调用点（call_site）、图节点（langgraph_node）、会话（thread_id）、模型四个维度聚合。
+    - 调用点名称通过 llm_call_config(call_site) 写入 metadata
+    - 节点名与 thread_id 由 LangGraph 自动注入 metadata
+    - 首 token 延迟仅在流式调用时可得（非流式调用为 null）
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._runs: Dict[UUID, Dict[str, Any]] = {}
+        self._by_call_site: Dict[str, Dict[str, Any]] = {}
+        self._by_node: Dict[str, Dict[str, Any]] = {}
+        self._by_model: Dict[str, Dict[str, Any]] = {}
+        self._by_thread: "OrderedDict[str, Dict[str, Dict[str, Any]]]" = OrderedDict()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID,
+                            metadata: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        metadata = metadata or {}
+        invocation_params = kwargs.get("invocation_params") or {}
+        with self._lock:
+            self._runs[run_id] = {
+                "call_site": metadata.get("call_site"),
+                "node": metadata.get("langgraph_node"),
+                "thread_id": metadata.get("thread_id"),
+                "model": metadata.get("ls_model_name") or invocation_params.get("model")
+                         or invocation_params.get("model_name"),
+                "started": time.monotonic(),
+                "first_token": None,
+            }
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            run = self._runs.get(run_id)
+            if run is not None and run["first_token"] is None:
+                run["first_token"] = time.monotonic()
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        self._record(run, extract_token_usage(response), error=None)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        self._record(run, {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}, error=error)
+
+    def _record(self, run: Dict[str, Any], usage: Dict[str, int], error: Optional[BaseException]) -> None:
+        latency = time.monotonic() - run["started"]
+        ttft = run["first_token"] - run["started"] if run["first_token"] is not None else None
+        cost = estimate_cost(run["model"], usage)
+
+        record = {
+            "event": "llm_call",
+            "call_site": run["call_site"],
+            "node": run["node"],
+            "thread_id": run["thread_id"],
+            "model": run["model"],
+            **usage,
+            "ttft_s": round(ttft, 3) if ttft is not None else None,
+            "latency_s": round(latency, 3),
+            "cost": round(cost, 6),
+            "error": str(error) if error is not None else None,
+        }
+        logger.info(json.dumps(record, ensure_ascii=False))
+
+        with self._lock:
+            buckets = [
+                self._by_call_site.setdefault(run["call_site"] or "unknown", _empty_bucket()),
+                self._by_node.setdefault(run["node"] or "outside_graph", _empty_bucket()),
+                self._by_model.setdefault(run["model"] or "unknown", _empty_bucket()),
+            ]
+            if run["thread_id"]:
+                thread_buckets = self._by_thread.setdefault(run["thread_id"], {})
+                self._by_thread.move_to_end(run["thread_id"])
+                while len(self._by_thread) > LLM_USAGE_MAX_THREADS:
+                    self._by_thread.popitem(last=False)
+                buckets.append(thread_buckets.setdefault("total", _empty_bucket()))
+                buckets.append(thread_buckets.setdefault(run["node"] or "outside_graph", _empty_bucket()))
+
+            for bucket in buckets:
+                bucket["calls"] += 1
+                bucket["errors"] += 1 if error is not None else 0
+                bucket["prompt_tokens"] += usage["prompt_tokens"]
+                bucket["cached_tokens"] += usage["cached_tokens"]
+                bucket["completion_tokens"] += usage["completion_tokens"]
+                bucket["latency_s"] += latency
+                bucket["cost"] += cost
+                if ttft is not None:
+                    bucket["ttft_s"] += ttft
+                    bucket["ttft_samples"] += 1
+
+    def report(self) -> Dict[str, Any]:
+        """进程级汇总：按调用点 / 节点 / 模型"""
+        with self._lock:
+            return {
+                "by_call_site": {k: _finalize_bucket(v) for k, v in self._by_call_site.items()},
+                "by_node": {k: _finalize_bucket(v) for k, v in self._by_node.items()},
+                "by_model": {k: _finalize_bucket(v) for k, v in self._by_model.items()},
+            }
+
+    def report_thread(self, thread_id: str) -> Optional[Dict[str, Any]]:
+        """单个会话的汇总：total + 按节点，未找到返回 None"""
+        with self._lock:
+            thread_buckets = self._by_thread.get(thread_id)
+            if thread_buckets is None:
+                return None
+            by_node = {k: _finalize_bucket(v) for k, v in thread_buckets.items() if k != "total"}
+            return {"total": _finalize_bucket(thread_buckets["total"]), "by_node": by_node}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._runs.clear()
+            self._by_call_site.clear()
+            self._by_node.clear()
+            self._by_model.clear()
+            self._by_thread.clear()
+
+
+class TokenCounter(BaseCallbackHandler):
+    """
+    统计单次请求（及其子调用）消耗的 token，用于计算对冲请求的额外成本
+    """
+
+    def __init__(self):
+        self.usage = {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        for key, value in extract_token_usage(response).items():
+            self.usage[key] += value
+
+
+# 进程内全局单例
+llm_usage_meter = LLMUsageMeter()
+
+
+def llm_call_config(call_site: str, extra_callbacks: Optional[List[BaseCallbackHandler]] = None) -> Dict[str, Any]:
+    """
+    生成带调用点标识的 RunnableConfig，传给 invoke(..., config=...) 即可被计量。
+    基于当前上下文配置合并，保留 LangGraph 节点注入的 callbacks / metadata（langgraph_node、thread_id 等）。
+    """
+    return merge_configs(
+        ensure_config(),
+        {
+            "callbacks": [llm_usage_meter, *(extra_callbacks or [])],
+            "metadata": {"call_site": call_site},
+            "run_name": call_site,
+        }
+    )
@@ -0,0 +1,350 @@
+#model_router.py
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables import Runnable
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+
+from config import LLM_MODELS, MODEL_QUALITY_TIERS, LLM_ROUTES, ROUTER_WINDOW_SIZE, ROUTER_MAX_ERROR_RATE, \
+    ROUTER_MIN_SAMPLES, ROUTER_COOLDOWN_SECONDS, ROUTER_MAX_CONSECUTIVE_FAILURES, HEDGE_QUANTILE, \
+    HEDGE_MAX_EXTRA_RATIO, HEDGE_BUDGET_BURST, HEDGE_MAX_WORKERS
+from llm_metrics import llm_call_config, TokenCounter
+from tracing import record_retry, tracer
+
+
+class ModelHealth:
+    """
+    单个模型的滚动延迟 / 错误率统计（最近 ROUTER_WINDOW_SIZE 次调用）
+    """
+
+    def __init__(self, window_size: int = ROUTER_WINDOW_SIZE):
+        self._lock = threading.Lock()
+        self._calls: Deque[Tuple[float, bool]] = deque(maxlen=window_size)   # (耗时秒, 是否成功)
+        self._consecutive_failures = 0
+        self._cooldown_until = 0.0
+
+    def record(self, latency: float, ok: bool) -> None:
+        with self._lock:
+            self._calls.append((latency, ok))
+            if ok:
+                self._consecutive_failures = 0
+                return
+            self._consecutive_failures += 1
+            if self._consecutive_failures >= ROUTER_MAX_CONSECUTIVE_FAILURES:
+                self._cooldown_until = time.monotonic() + ROUTER_COOLDOWN_SECONDS
+
+    def percentile(self, q: float) -> Optional[float]:
+        """成功调用耗时的分位数，样本不足返回 None"""
+        with self._lock:
+            latencies = sorted(latency for latency, ok in self._calls if ok)
+        if len(latencies) < ROUTER_MIN_SAMPLES:
+            return None
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+    def error_rate(self) -> float:
+        with self._lock:
+            if not self._calls:
+                return 0.0
+            return sum(1 for _, ok in self._calls if not ok) / len(self._calls)
+
+    def is_healthy(self) -> bool:
+        with self._lock:
+            if time.monotonic() < self._cooldown_until:
+                return False
+            sample_count = len(self._calls)
+        if sample_count < ROUTER_MIN_SAMPLES:
+            return True
+        return self.error_rate() <= ROUTER_MAX_ERROR_RATE
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            sample_count = len(self._calls)
+        return {
+            "samples": sample_count,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "error_rate": round(self.error_rate(), 4),
+            "healthy": self.is_healthy(),
+        }
+
+
+class HedgeStats:
+    """
+    单个调用点的对冲统计：触发次数、胜率（次选模型先返回有效结果）、额外 token 成本
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hedges_fired = 0
+        self.hedge_wins = 0
+        self.budget_skips = 0
+        self.extra_prompt_tokens = 0
+        self.extra_completion_tokens = 0
+
+    def record_call(self) -> None:
+        with self._lock:
+            self.calls += 1
+
+    def record_win(self) -> None:
+        with self._lock:
+            self.hedge_wins += 1
+
+    def try_acquire_budget(self) -> bool:
+        """额外请求比例不超过 HEDGE_MAX_EXTRA_RATIO（外加少量突发额度）时允许对冲"""
+        with self._lock:
+            if self.hedges_fired + 1 <= HEDGE_MAX_EXTRA_RATIO * self.calls + HEDGE_BUDGET_BURST:
+                self.hedges_fired += 1
+                return True
+            self.budget_skips += 1
+            return False
+
+    def add_wasted_tokens(self, usage: Dict[str, int]) -> None:
+        """被放弃的那一路请求所消耗的 token 计为对冲成本"""
+        with self._lock:
+            self.extra_prompt_tokens += usage["prompt_tokens"]
+            self.extra_completion_tokens += usage["completion_tokens"]
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "hedges_fired": self.hedges_fired,
+                "hedge_wins": self.hedge_wins,
+                "win_rate": round(self.hedge_wins / self.hedges_fired, 4) if self.hedges_fired else 0.0,
+                "extra_request_ratio": round(self.hedges_fired / self.calls, 4) if self.calls else 0.0,
+                "budget_skips": self.budget_skips,
+                "extra_prompt_tokens": self.extra_prompt_tokens,
+                "extra_completion_tokens": self.extra_completion_tokens,
+            }
+
+
+class ModelRouter:
+    """
+    按调用点路由 LLM：
+    - 每个调用点在 config.LLM_ROUTES 中声明偏好模型列表、延迟目标、最低质量等级
+    - 过滤掉质量等级不足的模型
+    - 健康且 p95 满足延迟目标（或样本不足）的模型按偏好顺序优先
+    - 其余健康模型按 p50 由快到慢排列，不健康模型放在最后兜底
+    - 调用失败时依次回退到下一个模型
+    - 路由声明 "hedge": True 的调用点启用对冲请求（见 _hedged_invoke）
+    """
+
+    def __init__(self, models: Dict[str, BaseChatModel], tiers: Dict[str, int], routes: Dict[str, Dict[str, Any]]):
+        self.models = models
+        self.tiers = tiers
+        self.routes = routes
+        self._health: Dict[str, ModelHealth] = {name: ModelHealth() for name in models}
+        self._hedge_stats: Dict[str, HedgeStats] = {
+            call_site: HedgeStats() for call_site, route in routes.items() if route.get("hedge")
+        }
+        self._executor: Optional[ContextThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    def health(self, model_name: str) -> ModelHealth:
+        return self._health[model_name]
+
+    def candidates(self, call_site: str) -> List[str]:
+        """返回该调用点本次应尝试的模型顺序"""
+        route = self.routes.get(call_site)
+        if route is None:
+            raise KeyError(f"未配置的 LLM 调用点: {call_site}")
+
+        min_tier = route.get("min_tier", 0)
+        latency_target = route.get("latency_target")
+        eligible = [
+            name for name in route["preferences"]
+            if name in self.models and self.tiers.get(name, 0) >= min_tier
+        ]
+
+        on_target, slow, unhealthy = [], [], []
+        for name in eligible:
+            health = self._health[name]
+            if not health.is_healthy():
+                unhealthy.append(name)
+                continue
+            p95 = health.percentile(0.95)
+            if latency_target is None or p95 is None or p95 <= latency_target:
+                on_target.append(name)
+            else:
+                slow.append(name)
+
+        slow.sort(key=lambda n: self._health[n].percentile(0.5) or float("inf"))
+        return on_target + slow + unhealthy
+
+    def invoke(
+        self,
+        call_site: str,
+        build_chain: Callable[[BaseChatModel], Runnable],
+        inputs: Any,
+        validate: Optional[Callable[[Any], bool]] = None,
+        callbacks: Optional[List[BaseCallbackHandler]] = None,
+    ) -> Any:
+        """
+        按路由顺序调用 build_chain(model).invoke(inputs)，失败（异常或 validate 不通过）则回退。
+        callbacks 会附加到每一次实际请求上（如流式解析回调）。
+        全部失败时抛出最后一个异常。
+        每次调用记一个以调用点命名的 llm span（含对冲与回退，回退次数计入 retries）。
+        """
+        if not tracer.enabled:
+            return self._invoke_routed(call_site, build_chain, inputs, validate, callbacks)
+        with tracer.span(call_site, "llm"):
+            return self._invoke_routed(call_site, build_chain, inputs, validate, callbacks)
+
+    def _invoke_routed(
+        self,
+        call_site: str,
+        build_chain: Callable[[BaseChatModel], Runnable],
+        inputs: Any,
+        validate: Optional[Callable[[Any], bool]],
+        callbacks: Optional[List[BaseCallbackHandler]],
+    ) -> Any:
+        last_error: Optional[BaseException] = None
+        candidates = self.candidates(call_site)
+
+        if call_site in self._hedge_stats and len(candidates) >= 2:
+            result, last_error = self._hedged_invoke(
+                call_site, candidates[0], candidates[1], build_chain, inputs, validate, callbacks
+            )
+            if last_error is None:
+                return result
+            candidates = candidates[2:]
+
+        for model_name in candidates:
+            result, error = self._invoke_one(call_site, model_name, build_chain, inputs, validate, callbacks=callbacks)
+            if error is None:
+                return result
+            last_error = error
+            record_retry()
+            print(f"⚠️ [{call_site}] 模型 {model_name} 调用失败，尝试回退: {error}")
+
+        raise RuntimeError(f"[{call_site}] 所有候选模型均调用失败") from last_error
+
+    def _invoke_one(
+        self,
+        call_site: str,
+        model_name: str,
+        build_chain: Callable[[BaseChatModel], Runnable],
+        inputs: Any,
+        validate: Optional[Callable[[Any], bool]],
+        token_counter: Optional[TokenCounter] = None,
+        callbacks: Optional[List[BaseCallbackHandler]] = None,
+    ) -> Tuple[Any, Optional[BaseException]]:
+        """调用单个模型并记录耗时 / 成败，返回 (结果, 异常)"""
+        chain = build_chain(self.models[model_name])
+        extra_callbacks = list(callbacks or [])
+        if token_counter is not None:
+            extra_callbacks.append(token_counter)
+        started = time.monotonic()
+        try:
+            result = chain.invoke(inputs, config=llm_call_config(call_site, extra_callbacks))
+            if validate is not None and not validate(result):
+                raise ValueError("模型输出未通过校验")
+        except Exception as e:
+            self._health[model_name].record(time.monotonic() - started, ok=False)
+            return None, e
+
+        self._health[model_name].record(time.monotonic() - started, ok=True)
+        return result, None
+
+    def _hedged_invoke(
+        self,
+        call_site: str,
+        primary: str,
+        secondary: str,
+        build_chain: Callable[[BaseChatModel], Runnable],
+        inputs: Any,
+        validate: Optional[Callable[[Any], bool]],
+        callbacks: Optional[List[BaseCallbackHandler]] = None,
+    ) -> Tuple[Any, Optional[BaseException]]:
+        """
+        对冲请求：
+        1. 先向主模型发出请求
+        2. 主模型请求开始执行后（不含在线程池中排队的时间）超过其滚动 p90（样本不足时取 latency_target）仍未返回，
+           且额外请求预算允许时，向次选模型发出同样的请求
+        3. 取先返回的有效结果，另一路被放弃（未开始则取消；已在执行的请求无法中断，其结果与 token 计入对冲成本）
+        主模型在对冲前就已失败（或预算不足时最终失败）则直接顺序回退到次选模型。
+        两路都失败时返回最后一个异常，由调用方继续回退到其余模型。
+        """
+        stats = self._hedge_stats[call_site]
+        stats.record_call()
+
+        hedge_delay = self._health[primary].percentile(HEDGE_QUANTILE) or self.routes[call_site].get("latency_target")
+        executor = self._get_executor()
+
+        counters: Dict[Future, TokenCounter] = {}
+
+        def submit(model_name: str, started: Optional[threading.Event] = None) -> Future:
+            counter = TokenCounter()
+
+            def run() -> Tuple[Any, Optional[BaseException]]:
+                if started is not None:
+                    started.set()
+                return self._invoke_one(call_site, model_name, build_chain, inputs, validate, counter, callbacks)
+
+            future = executor.submit(run)
+            counters[future] = counter
+            return future
+
+        # 对冲计时从主请求真正开始执行时算起
+        primary_started = threading.Event()
+        primary_future = submit(primary, primary_started)
+        primary_started.wait()
+        done, _ = wait([primary_future], timeout=hedge_delay)
+
+        if done or not stats.try_acquire_budget():
+            result, error = primary_future.result()
+            if error is None:
+                return result, None
+            print(f"⚠️ [{call_site}] 模型 {primary} 调用失败，尝试回退: {error}")
+            record_retry()
+            return self._invoke_one(call_site, secondary, build_chain, inputs, validate, callbacks=callbacks)
+
+        print(f"⏱️ [{call_site}] {primary} 超过 {hedge_delay:.1f}s 未返回，对冲请求 {secondary}")
+        secondary_future = submit(secondary)
+        futures = {primary_future: primary, secondary_future: secondary}
+        pending = set(futures)
+        last_error: Optional[BaseException] = None
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                result, error = future.result()
+                if error is not None:
+                    last_error = error
+                    stats.add_wasted_tokens(counters[future].usage)
+                    continue
+
+                if futures[future] == secondary:
+                    stats.record_win()
+
+                for loser in pending:
+                    if not loser.cancel():
+                        loser.add_done_callback(lambda f: stats.add_wasted_tokens(counters[f].usage))
+                return result, None
+
+        return None, last_error
+
+    def _get_executor(self) -> ContextThreadPoolExecutor:
+        # ContextThreadPoolExecutor 会把当前上下文（LangGraph 节点的 callbacks / metadata）带入工作线程
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ContextThreadPoolExecutor(max_workers=HEDGE_MAX_WORKERS)
+            return self._executor
+
+    def report(self) -> Dict[str, Any]:
+        """各模型健康度、各调用点当前路由顺序与对冲统计"""
+        return {
+            "models": {name: health.snapshot() for name, health in self._health.items()},
+            "routes": {call_site: self.candidates(call_site) for call_site in self.routes},
+            "hedging": {call_site: stats.snapshot() for call_site, stats in self._hedge_stats.items()},
+        }
+
+
+# 进程内全局单例
+model_router = ModelRouter(LLM_MODELS, MODEL_QUALITY_TIERS, LLM_ROUTES)
@@ -1,14 +1,20 @@
 #approval_gate.py
+from langchain_core.runnables import RunnableConfig
+from headless import policy_decision
+from llm_agent import generate_company_recommendations_by_llm
+from nodes.final_report import day1_speculation_key, prepare_day_1
+from speculation import speculation_engine
 from state import TravelPlanState
 from langgraph.types import interrupt, Command
 from typing import Literal
 from langgraph.graph import END
 
 
-def transport_approval_gate(state: TravelPlanState) -> Command[Literal["plan_day_1_by_llm", "user_select_transport"]]:
+def transport_approval_gate(state: TravelPlanState, config: RunnableConfig) -> Command[Literal["plan_day_1_by_llm", "user_select_transport"]]:
     """
     节点 4.5: 交通方案人工审批门。
     检查用户是否已审批。如果未审批，则暂停流程。
+    等待审批期间，后台按推荐方案推测执行 Day 1 规划。
     """
     selected_transport = state.get("transport", {}).get("selected_option_raw")
 
@@ -27,7 +33,14 @@ def transport_approval_gate(state: TravelPlanState) -> Command[Literal["plan_day
         )
     }
 
-    decision_raw = interrupt(payload)
+    decided, decision_raw = policy_decision(state, "approval", payload)
+    if not decided:
+        speculation_engine.start(
+            config, "day1", day1_speculation_key(selected_transport),
+            prepare_day_1, selected_transport, state["user"]["parsed_params"], state["locations"]["hotel"],
+            state.get("commute_cache")
+        )
+        decision_raw = interrupt(payload)
 
     # 🚨 修复开始：直接检查布尔值或匹配相应的字符串
     is_approved = False
@@ -57,9 +70,10 @@ def transport_approval_gate(state: TravelPlanState) -> Command[Literal["plan_day
 
 
 
-def user_select_research_mode(state: TravelPlanState) -> Command[Literal["custom_research", "auto_research", "skip_research"]]:
+def user_select_research_mode(state: TravelPlanState, config: RunnableConfig) -> Command[Literal["custom_research", "auto_research", "skip_research"]]:
     """
     节点 4.8: 用户选择调研模式：自定义调研、自动推荐调研还是跳过。
+    等待选择期间，后台推测执行智能推荐企业（auto_research 的第一步）。
     """
     print("\n--- ⏱️ 节点 4.8: 用户选择调研模式 ---")
 
@@ -74,7 +88,11 @@ def user_select_research_mode(state: TravelPlanState) -> Command[Literal["custom
         )
     }
 
-    decision = interrupt(payload)
+    decided, decision = policy_decision(state, "research_mode", payload)
+    if not decided:
+        city = state["locations"]["hotel"]["city"]
+        speculation_engine.start(config, "company_recommendations", city, generate_company_recommendations_by_llm, city)
+        decision = interrupt(payload)
     decision_str = str(decision).strip().replace("：", ":")
 
     # =========================
@@ -119,6 +137,8 @@ def user_select_research_mode(state: TravelPlanState) -> Command[Literal["custom
     # =========================
     # 2️⃣ 自动调研
     # =========================
+    if decision_str != "2":
+        speculation_engine.discard(config, "company_recommendations")
     if decision_str == "2":
         print("🤖 用户选择智能自动调研")
         return Command(goto="auto_research")
@@ -149,11 +169,15 @@ def user_refine_itinerary(state: TravelPlanState) -> Command[Literal["build_fina
 
     final_report = itinerary.get("final_report", "")
 
-    user_input = interrupt({
+    payload = {
         "type": "refine_itinerary",
         "final_report": final_report,
+        "violations": (itinerary.get("violations") or {}).get("final", []),
         "message": "是否需要修改行程？如果需要，请输入修改要求；不需要请直接确认。"
-    })
+    }
+    decided, user_input = policy_decision(state, "refine", payload)
+    if not decided:
+        user_input = interrupt(payload)
 
     # ===== 用户确认：不需要修改 =====
     if not user_input or not user_input.strip():
@@ -165,10 +189,12 @@ def user_refine_itinerary(state: TravelPlanState) -> Command[Literal["build_fina
     instruction = user_input.strip()
     print(f"✏️ 用户修改要求: {instruction}")
     control["refinement_instruction"] = instruction
+    update = {"control": control}
+    if decided:
+        # 策略中的修改要求只执行一次，否则重新生成报告后回到本节点会再次修改
+        update["policy"] = {**state["policy"], "refinement": ""}
 
     return Command(
         goto="build_final_itinerary_and_report",
-        update={
-            "control":control
-        }
+        update=update
     )
@@ -0,0 +1,217 @@
+#day_plan.py
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Union
+
+from langgraph.types import Send
+
+from config import DAY_SPLIT_MODE, DEFAULT_TRIP_DAYS, RESEARCH_DAY_PLANNER_MODE
+from data_models import CompanyInfo
+from itinerary_parser import ItineraryStreamHandler, parse_itinerary_output, streaming_model
+from itinerary_validator import run_validation
+from llm_agent import to_compact_json
+from model_router import model_router
+from progress import emit_progress
+from prompts import RESEARCH_DAY_PLAN_PROMPT
+from state import DayPlan, FixedEvent, ItineraryItem, TravelPlanState
+from tools.clustering import cluster_companies_to_days
+from tools.commute_matrix import CommuteMatrix
+from tools.route_solver import assign_companies_to_days, company_location, plan_days_with_solver
+from tools.travel_api import generate_research_day_commute_matrix
+
+
+def events_on(fixed_events: List[FixedEvent], day: date) -> List[FixedEvent]:
+    return sorted([e for e in fixed_events if e["start_time"].date() == day], key=lambda e: e["start_time"])
+
+
+def research_day_dates(user_params: Dict[str, Any]) -> List[date]:
+    """调研日日期：Day 2 ~ Day N（N = parsed_params.trip_days）"""
+    trip_days = user_params.get("trip_days") or DEFAULT_TRIP_DAYS
+    day_1_date = datetime.strptime(user_params.get("departure_date"), "%Y-%m-%d").date()
+    return [day_1_date + timedelta(days=k) for k in range(1, trip_days)]
+
+
+def split_research_days(state: TravelPlanState) -> Dict[str, Any]:
+    """
+    企业分天（geocode_companies / skip_research 之后）：
+    - DAY_SPLIT_MODE == "cluster"：按地理位置聚类，以各天固定事务为锚点，每天的企业彼此相近
+    - DAY_SPLIT_MODE == "solver"：在粗估通勤矩阵上求解一次，只取每家企业排在哪一天
+    - 两种方式都不调用地图 API
+    - 写入每个调研日的 DayPlan 骨架，由 fan_out_research_days 分发到各天并行规划
+    """
+    print("\n--- 🗓️ 节点: split_research_days ---")
+
+    user_params = state["user"]["parsed_params"]
+    fixed_events: List[FixedEvent] = state["itinerary"]["fixed_events"]
+    hotel_loc = state["locations"]["hotel"]
+    companies_ctx = state.get("companies", {})
+    companies: List[CompanyInfo] = companies_ctx.get("candidates", [])
+
+    day_dates = research_day_dates(user_params)
+    events_by_day = [events_on(fixed_events, day) for day in day_dates]
+
+    if day_dates and DAY_SPLIT_MODE == "cluster":
+        companies_by_day, unscheduled = cluster_companies_to_days(events_by_day, companies, hotel_loc)
+    elif day_dates:
+        companies_by_day, unscheduled = assign_companies_to_days(day_dates, events_by_day, companies, hotel_loc)
+    else:
+        companies_by_day, unscheduled = [], [company.name for company in companies]
+
+    days: List[DayPlan] = []
+    for offset, (day, names) in enumerate(zip(day_dates, companies_by_day), start=2):
+        days.append({
+            "day_index": offset,
+            "date": day,
+            "items": [],
+            "assigned_companies": names,
+            "stops": None,
+            "unscheduled": [],
+            "violations": [],
+        })
+        print(f"   -> Day {offset}（{day}）: {', '.join(names) or '无企业调研'}")
+        emit_progress("day_assigned", day_index=offset, date=day, companies=names,
+                      message=f"Day {offset}（{day}）: {', '.join(names) or '无企业调研'}")
+    if unscheduled:
+        print(f"⚠️ 以下企业无法分配到任何调研日: {', '.join(unscheduled)}")
+
+    return {
+        "days": days,
+        "companies": {
+            **companies_ctx,
+            "unscheduled": unscheduled
+        },
+        "control": {
+            "error_message": None
+        }
+    }
+
+
+def fan_out_research_days(state: TravelPlanState) -> Union[List[Send], str]:
+    """
+    条件边：每个有事务的调研日各发一个 Send，在同一超步中并行执行 plan_research_day
+    无任何调研日需要规划时直接进入最终行程生成
+    """
+    user_params = state["user"]["parsed_params"]
+    fixed_events: List[FixedEvent] = state["itinerary"]["fixed_events"]
+    candidates = {company.name: company for company in state.get("companies", {}).get("candidates", [])}
+
+    sends = []
+    for day in state.get("days") or []:
+        if day["day_index"] == 1:
+            continue
+        events = events_on(fixed_events, day["date"])
+        if not events and not day["assigned_companies"]:
+            continue
+        sends.append(Send("plan_research_day", {
+            "day_index": day["day_index"],
+            "date": day["date"],
+            "events": events,
+            "companies": [candidates[name] for name in day["assigned_companies"] if name in candidates],
+            "fixed_events": fixed_events,
+            "hotel": state["locations"]["hotel"],
+            "user_params": user_params,
+            "commute_cache": state.get("commute_cache"),
+        }))
+
+    return sends or "build_final_itinerary_and_report"
+
+
+def plan_research_day(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    单个调研日的规划（由 Send 并行调用，输入为 fan_out_research_days 构造的 payload 而非完整 state）：
+    - RESEARCH_DAY_PLANNER_MODE == "solver"：确定性路径求解器，通勤时间经缓存按需查询
+    - RESEARCH_DAY_PLANNER_MODE == "llm"：交由 LLM 生成当天行程
+    只写回带 reducer 的 days / commute_cache，避免多个并行分支同时写同一个普通键
+    """
+    day_index: int = payload["day_index"]
+    day_date: date = payload["date"]
+    events: List[FixedEvent] = payload["events"]
+    companies: List[CompanyInfo] = payload["companies"]
+    hotel_loc = payload["hotel"]
+    print(f"\n--- ⏱️ 节点: plan_research_day [Day {day_index}] ---")
+
+    day_plan: DayPlan = {
+        "day_index": day_index,
+        "date": day_date,
+        "items": [],
+        "assigned_companies": [company.name for company in companies],
+        "stops": None,
+        "unscheduled": [],
+        "violations": [],
+    }
+    commute_cache = CommuteMatrix.from_dict(payload.get("commute_cache"))
+
+    # ========= 确定性求解器 =========
+    if RESEARCH_DAY_PLANNER_MODE == "solver":
+        locations = [hotel_loc] + [e["location"] for e in events] + [company_location(c, hotel_loc) for c in companies]
+        (day_items,), unscheduled, (stops,) = plan_days_with_solver(
+            day_dates=[day_date],
+            events_by_day=[events],
+            companies=companies,
+            commute_matrix=commute_cache.lazy(locations),
+            hotel_loc=hotel_loc
+        )
+        if unscheduled:
+            print(f"⚠️ Day {day_index} 以下企业无法在时间窗内安排: {', '.join(unscheduled)}")
+        day_plan.update({"items": day_items or [], "stops": stops, "unscheduled": unscheduled})
+        print(f"✅ Day {day_index} 求解完成，共 {len(day_plan['items'])} 项"
+              f"（通勤 API 调用 {commute_cache.api_calls} 次，复用 {commute_cache.reused} 对）")
+
+    # ========= LLM =========
+    else:
+        day_plan["items"] = _plan_research_day_by_llm(payload, commute_cache)
+        if not day_plan["items"]:
+            day_plan["unscheduled"] = list(day_plan["assigned_companies"])
+
+    day_plan["violations"] = run_validation(
+        f"day_{day_index}", day_plan["items"], payload["fixed_events"], commute_cache.to_dict()
+    )
+    emit_progress("day_planned", day_index=day_index, items=len(day_plan["items"]),
+                  unscheduled=day_plan["unscheduled"], violations=len(day_plan["violations"]),
+                  message=f"Day {day_index} 规划完成，共 {len(day_plan['items'])} 项")
+    return {"days": [day_plan], "commute_cache": commute_cache.delta()}
+
+
+def _plan_research_day_by_llm(payload: Dict[str, Any], commute_cache: CommuteMatrix) -> List[ItineraryItem]:
+    """LLM 生成单日行程；失败时返回空列表（并行分支中不写 control.error_message）"""
+    day_index, day_date = payload["day_index"], payload["date"]
+
+    commute_matrix = generate_research_day_commute_matrix(
+        day_events=payload["events"],
+        companies_to_plan=payload["companies"],
+        hotel_loc=payload["hotel"],
+        commute_cache=commute_cache
+    )
+    messages = RESEARCH_DAY_PLAN_PROMPT.format_messages(
+        day_date=day_date.isoformat(),
+        day_events=to_compact_json(payload["events"]),
+        companies_to_plan=to_compact_json([company.model_dump() for company in payload["companies"]]),
+        user_params=to_compact_json(payload["user_params"]),
+        hotel=to_compact_json(payload["hotel"]),
+        commute_matrix=to_compact_json(commute_matrix)
+    )
+
+    # 调用 LLM（流式输出，逐条解析校验）
+    stream_handler = ItineraryStreamHandler()
+    try:
+        raw_message = model_router.invoke(
+            "plan_research_day",
+            streaming_model,
+            messages,
+            callbacks=[stream_handler]
+        )
+        raw_output = raw_message.content
+    except Exception as e:
+        print(f"❌ LLM 生成 Day {day_index} 行程失败: {e}")
+        return []
+
+    itinerary_items: List[ItineraryItem] = parse_itinerary_output(
+        raw_output,
+        stream_handler.parser_for(raw_output)
+    )
+    if not itinerary_items and "{" in raw_output:
+        print(f"❌ Day {day_index} 行程 JSON 解析失败: 未解析出任何有效行程项")
+        return []
+
+    day_items = [i for i in itinerary_items if i["start_time"].date() == day_date]
+    print(f"✅ Day {day_index} 共 {len(day_items)} 项")
+    return day_items
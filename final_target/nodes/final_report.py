@@ -1,38 +1,37 @@
 #final_report.py
-from config import deepseek_chat
-from llm_agent import generate_day1_tasks_for_llm, to_json_serializable
-from prompts import DAY_2_3_PLAN_PROMPT, FINAL_ITINERARY_TABLE_PROMPT, FINAL_ITINERARY_REFINE_PROMPT
-from state import TravelPlanState, ItineraryItem, FixedEvent
+from config import DAY1_PLANNER_MODE, FINAL_REPORT_MODE
+from llm_agent import generate_day1_tasks_for_llm, to_compact_json
+from itinerary_editor import refine_itinerary_incrementally
+from itinerary_renderer import render_itinerary_table
+from itinerary_validator import run_validation
+from model_router import model_router
+from speculation import speculation_engine
+from prompts import FINAL_ITINERARY_TABLE_PROMPT, FINAL_ITINERARY_REFINE_PROMPT
+from state import TravelPlanState, ItineraryItem, DayPlan, merge_commute_cache, merge_day_plans
 from typing import Dict, Any
-from datetime import datetime, timedelta
-from typing import List
-import json
-from tools.travel_api import amap_geocode, generate_day1_commute_matrix, generate_day23_commute_matrix
+from langchain_core.runnables import RunnableConfig
+from datetime import datetime
+from typing import List, Optional
+from tools.travel_api import amap_geocode, generate_day1_commute_matrix
+from tools.commute_matrix import CommuteMatrix
+from tools.route_solver import build_day1_timeline
 
 
-def plan_day_1_by_llm(state: TravelPlanState) -> Dict[str, Any]:
+def day1_speculation_key(selected_raw: Dict[str, Any]) -> str:
+    """Day 1 推测结果的决策键：同一班次（类型 + 编号 + 日期）即可复用"""
+    return f"{selected_raw.get('type')}:{selected_raw.get('id')}:{selected_raw.get('departure_date')}"
+
+
+def prepare_day_1(selected_raw: Dict[str, Any], user_params: Dict[str, Any], hotel_loc: Dict[str, Any],
+                  commute_cache: Optional[Dict[str, Dict[str, float]]] = None) -> Dict[str, Any]:
     """
-    节点 5（Day 1 LLM 行程规划）：
+    Day 1 规划的计算部分（不读写 state，可在审批中断期间后台推测执行）：
     - 将已选交通方案 selected_option_raw 转换为 ItineraryItem
     - 判断 Day 1 是否存在固定事务
-    - 调用 generate_day1_tasks_for_llm 生成 Day 1 完整行程
+    - 默认用 build_day1_timeline 规则化生成 Day 1 完整行程；DAY1_PLANNER_MODE == "llm" 时调用 generate_day1_tasks_for_llm
+    commute_cache 为 state 中的通勤缓存，在副本上补算，新增的点对随返回值写回
+    返回 {"transport_item": ..., "day_1": [...], "commute_cache": 新增点对}，失败返回 {"error_message": ...}
     """
-
-    print("\n--- ⏱️ 节点 5: Day 1 LLM 行程规划 ---")
-
-    transport_ctx = state["transport"]
-    user_ctx = state["user"]
-    hotel_loc = state["locations"]["hotel"]
-
-    selected_raw = transport_ctx.get("selected_option_raw")
-    if not selected_raw:
-        return {
-            "control": {
-                "error_message": "未选定交通方案，无法进行 Day 1 行程规划"
-            }
-        }
-
-    user_params = user_ctx["parsed_params"]
     fixed_events = user_params.get("fixed_events", [])
 
     # ========= 1️⃣ 解析交通时间 =========
@@ -50,11 +49,7 @@ def plan_day_1_by_llm(state: TravelPlanState) -> Dict[str, Any]:
         )
 
     except Exception as e:
-        return {
-            "control": {
-                "error_message": f"交通时间解析失败: {e}"
-            }
-        }
+        return {"error_message": f"交通时间解析失败: {e}"}
 
     # ========= 2️⃣ 构造主交通 ItineraryItem =========
     arr_hub_name = selected_raw.get("arrival_hub_name")
@@ -63,10 +58,7 @@ def plan_day_1_by_llm(state: TravelPlanState) -> Dict[str, Any]:
     if not arr_hub_coords and not arr_hub_name.endswith('站'):   # 防止出现 上海 （api自动忽略站这个字）的情况
         arr_hub_coords = amap_geocode(f"{arr_hub_name}站", arr_hub_city)
     if not arr_hub_coords:
-        return {
-            "control": {
-                "error_message": "交通精确计算失败：无法对选定班次的枢纽进行地理编码。"
-        }}
+        return {"error_message": "交通精确计算失败：无法对选定班次的枢纽进行地理编码。"}
 
     transport_item: ItineraryItem = {
         "type": "transport",
@@ -106,187 +98,149 @@ def plan_day_1_by_llm(state: TravelPlanState) -> Dict[str, Any]:
         f"   -> Day 1 是否存在固定事务: {'是' if earliest_day1_event else '否'}"
     )
 
+    cache = CommuteMatrix.from_dict(commute_cache)
     day1_commute_matrix = generate_day1_commute_matrix(
         transport_item=transport_item,
         day1_events=day1_events,
-        hotel_loc=hotel_loc
+        hotel_loc=hotel_loc,
+        commute_cache=cache
     )
+    print(f"   -> Day 1 通勤矩阵: 新增 API 调用 {cache.api_calls} 次，复用 {cache.reused} 对")
+
+    # ========= 4️⃣ 生成 Day 1 行程（默认规则化构建，可切换为 LLM） =========
+    if DAY1_PLANNER_MODE == "llm":
+        day_1_itinerary: List[ItineraryItem] = generate_day1_tasks_for_llm(
+            transport_item=transport_item,
+            fixed_events=day1_events,
+            user_params=user_params,
+            day1_commute_matrix=day1_commute_matrix,
+        )
+        print(f"   -> Day 1 LLM 行程生成完成，共 {len(day_1_itinerary)} 条任务")
+    else:
+        day_1_itinerary = build_day1_timeline(
+            transport_item=transport_item,
+            day1_events=day1_events,
+            day1_commute_matrix=day1_commute_matrix,
+            hotel_loc=hotel_loc,
+        )
+        print(f"   -> Day 1 规则化行程生成完成，共 {len(day_1_itinerary)} 条任务")
 
-    # ========= 4️⃣ 调用 LLM 生成 Day 1 行程 =========
-    day_1_itinerary: List[ItineraryItem] = generate_day1_tasks_for_llm(
-        transport_item=transport_item,
-        fixed_events=day1_events,
-        user_params=user_params,
-        day1_commute_matrix=day1_commute_matrix,
-    )
-
-    print(f"   -> Day 1 LLM 行程生成完成，共 {len(day_1_itinerary)} 条任务")
-
-
-    # ========= 5️⃣ 写回 state =========
-    return {
-        "transport": {
-            **transport_ctx,
-            "selected_transport": transport_item
-        },
-        "itinerary": {
-            "fixed_events": fixed_events,
-            "day_1": day_1_itinerary
-        },
-        "control": {
-            "error_message": None
-        }
-    }
-
+    return {"transport_item": transport_item, "day_1": day_1_itinerary, "commute_cache": cache.delta()}
 
 
-def plan_day_2_3_by_llm(state: TravelPlanState) -> Dict[str, Any]:
+def plan_day_1_by_llm(state: TravelPlanState, config: RunnableConfig) -> Dict[str, Any]:
     """
-    根据待调研企业和固定事件，使用 LLM 生成 Day 2 和 Day 3 完整行程
+    节点 5（Day 1 行程规划）：
+    - 优先复用审批中断期间推测执行的结果（同一班次）
+    - 否则同步执行 prepare_day_1
     """
-    print("\n--- ⏱️ 节点: plan_day_2_3_by_llm ---")
-
-    origin_itinerary_ctx = state["itinerary"]
-    user_params = state["user"]["parsed_params"]
-    hotel_loc = state["locations"]["hotel"]
-    fixed_events: List[FixedEvent] = state["itinerary"]["fixed_events"]
-    companies_ctx = state.get("companies", {})
-    companies_to_plan = companies_ctx.get("candidates", [])
 
-    # Day2 / Day3 日期
-    day_1_date = datetime.strptime(user_params.get("departure_date"), "%Y-%m-%d").date()
-    day_2_date = day_1_date + timedelta(days=1)
-    day_3_date = day_1_date + timedelta(days=2)
-
-    # 筛选固定事件
-    day_2_events = [
-        e for e in fixed_events if e["start_time"].date() == day_2_date
-    ]
-    day_3_events = [
-        e for e in fixed_events if e["start_time"].date() == day_3_date
-    ]
+    print("\n--- ⏱️ 节点 5: Day 1 行程规划 ---")
 
+    transport_ctx = state["transport"]
+    user_ctx = state["user"]
+    hotel_loc = state["locations"]["hotel"]
 
-    try:
-        day_2_3_commute_matrix = generate_day23_commute_matrix(
-                day2_events=day_2_events,
-                day3_events=day_3_events,
-                companies_to_plan=companies_to_plan,
-                hotel_loc=hotel_loc
-        )
-    except Exception as e:
-        msg = f"❌ 计算 day_2_3_commute_matrix 失败: {e}"
-        print(msg)
+    selected_raw = transport_ctx.get("selected_option_raw")
+    if not selected_raw:
         return {
-            "itinerary": {
-                **origin_itinerary_ctx,
-                "day_2": [],
-                "day_3": []
-            },
             "control": {
-                "error_message": msg
+                "error_message": "未选定交通方案，无法进行 Day 1 行程规划"
             }
         }
 
-    # 准备 LLM 输入 prompt
-    serializable_companies = [
-        company.model_dump()  # Pydantic v2 方法
-        for company in companies_to_plan
-    ]
-    prompt = DAY_2_3_PLAN_PROMPT.format(
-        day_2_events=json.dumps(day_2_events, ensure_ascii=False, indent=2, default=to_json_serializable),
-        day_3_events=json.dumps(day_3_events, ensure_ascii=False, indent=2, default=to_json_serializable),
-        companies_to_plan=json.dumps(serializable_companies,ensure_ascii=False,indent=2),
-        user_params=json.dumps(user_params, ensure_ascii=False, indent=2, default=to_json_serializable),
-        hotel=json.dumps(hotel_loc, ensure_ascii=False, indent=2, default=to_json_serializable),
-        day_2_3_commute_matrix=json.dumps(day_2_3_commute_matrix, ensure_ascii=False)
-    )
+    user_params = user_ctx["parsed_params"]
+    fixed_events = user_params.get("fixed_events", [])
 
-    # 调用 LLM
-    try:
-        raw_message = deepseek_chat.invoke(prompt)
-        raw_output = raw_message.content
-    except Exception as e:
-        msg = f"❌ LLM 生成 Day 2/3 行程失败: {e}"
-        print(msg)
-        return {
-            "itinerary": {
-                **origin_itinerary_ctx,
-                "day_2": [],
-                "day_3": []
-            },
-            "control": {
-                "error_message": msg
-            }
-        }
+    hit, prepared = speculation_engine.take(config, "day1", day1_speculation_key(selected_raw))
+    speculation_engine.discard(config, "day1")
+    if not hit:
+        prepared = prepare_day_1(selected_raw, user_params, hotel_loc, state.get("commute_cache"))
 
-    # 解析 JSON 输出
-    try:
-        itinerary_items: List[ItineraryItem] = json.loads(raw_output)
-    except Exception as e:
-        msg = f"❌ Day 2/3 行程 JSON 解析失败: {e}"
-        print(msg)
+    if prepared.get("error_message"):
         return {
-            "itinerary": {
-                **origin_itinerary_ctx,
-                "day_2": [],
-                "day_3": []
-            },
             "control": {
-                "error_message": msg
+                "error_message": prepared["error_message"]
             }
         }
 
-    # 分 Day2 / Day3
-    for item in itinerary_items:
-        if isinstance(item.get("start_time"), str):
-            item["start_time"] = datetime.strptime(item["start_time"], "%Y-%m-%d %H:%M")
-        if isinstance(item.get("end_time"), str):
-            item["end_time"] = datetime.strptime(item["end_time"], "%Y-%m-%d %H:%M")
-    day_2_itinerary = [i for i in itinerary_items if i["start_time"].date() == day_2_date]
-    day_3_itinerary = [i for i in itinerary_items if i["start_time"].date() == day_3_date]
-
-    # 更新状态
-    state["itinerary"]["day_2"] = day_2_itinerary
-    state["itinerary"]["day_3"] = day_3_itinerary
-
-    print(f"✅ Day 2 共 {len(day_2_itinerary)} 项, Day 3 共 {len(day_3_itinerary)} 项")
+    violations = run_validation(
+        "day_1", prepared["day_1"], fixed_events,
+        merge_commute_cache(state.get("commute_cache"), prepared["commute_cache"])
+    )
 
+    # ========= 5️⃣ 写回 state =========
+    day_1: DayPlan = {
+        "day_index": 1,
+        "date": prepared["transport_item"]["end_time"].date(),
+        "items": prepared["day_1"],
+        "assigned_companies": [],
+        "stops": None,
+        "unscheduled": [],
+        "violations": violations,
+    }
     return {
+        "commute_cache": prepared["commute_cache"],
+        "days": [day_1],
+        "transport": {
+            **transport_ctx,
+            "selected_transport": prepared["transport_item"]
+        },
         "itinerary": {
-            **origin_itinerary_ctx,
-            "day_2": day_2_itinerary,
-            "day_3": day_3_itinerary
+            "fixed_events": fixed_events
         },
         "control": {
-                "error_message": None
-            }
+            "error_message": None
+        }
     }
 
 
 
-
 def build_final_itinerary_and_report(state: TravelPlanState) -> Dict[str, Any]:
     """
-    合并 Day1 / Day2 / Day3 行程，
-    根据是否存在用户修改意见，生成或重生成最终 Markdown 行程表
+    按 day_index 合并逐天行程（到达日 + 各调研日），
+    根据是否存在用户修改意见，生成或重生成最终 Markdown 行程表：
+    - 修改意见优先识别为增量操作，只重算、重渲染受影响的天
+    - 无法增量处理时回退到 LLM 整体修改
     """
     print("\n--- 📋 节点: build_final_itinerary_and_report ---")
 
     itinerary = state["itinerary"]
+    days: List[DayPlan] = state.get("days") or []
     control = state.setdefault("control", {})
     refine_instruction = control.get("refinement_instruction")
-
-    # ========= 1️⃣ 合并前三天 =========
+    commute_cache_dict = state.get("commute_cache")
+
+    # ========= 0️⃣ 修改意见：尝试增量修改 =========
+    changed_days = None
+    extra_update: Dict[str, Any] = {}
+    if refine_instruction and FINAL_REPORT_MODE == "template":
+        commute_cache = CommuteMatrix.from_dict(commute_cache_dict)
+        incremental = refine_itinerary_incrementally(
+            days, refine_instruction, state["locations"]["hotel"], commute_cache
+        )
+        if incremental is not None:
+            changed_days = incremental["changed_days"]
+            print(f"⚡ 增量修改完成，变动: {', '.join(f'Day {i}' for i in changed_days) or '无'}")
+            commute_cache_dict = commute_cache.to_dict()
+            for day in incremental["days"]:
+                day["violations"] = run_validation(
+                    f"day_{day['day_index']}", day["items"], itinerary.get("fixed_events"), commute_cache_dict
+                )
+            days = merge_day_plans(days, incremental["days"])
+            extra_update = {"days": incremental["days"], "commute_cache": commute_cache.delta()}
+        else:
+            print("↩️ 修改要求无法增量处理，回退到整体修改")
+
+    # ========= 1️⃣ 合并各天 =========
     all_items: List[ItineraryItem] = []
 
-    for day_key in ("day_1", "day_2", "day_3"):
-        day_items = itinerary.get(day_key)
-        if day_items:
-            all_items.extend(day_items)
+    for day in days:
+        if day.get("items"):
+            all_items.extend(day["items"])
 
     if not all_items:
-        msg = "前三天行程为空，无法生成最终行程"
+        msg = "逐天行程为空，无法生成最终行程"
         print(f"❌ {msg}")
         return {
             "control": {
@@ -308,33 +262,50 @@ def build_final_itinerary_and_report(state: TravelPlanState) -> Dict[str, Any]:
 
     all_items.sort(key=lambda x: x["start_time"])
     itinerary["final_itinerary"] = all_items
+    itinerary["violations"] = {
+        **(itinerary.get("violations") or {}),
+        "final": run_validation(
+            "final", all_items, itinerary.get("fixed_events"), commute_cache_dict
+        )
+    }
+
+    # ========= 3️⃣ 本地渲染（首次生成 / 增量修改） =========
+    if FINAL_REPORT_MODE == "template" and (not refine_instruction or changed_days is not None):
+        rendered = render_itinerary_table(
+            days,
+            rows_cache=itinerary.get("report_rows") if changed_days is not None else None,
+            changed_days=changed_days
+        )
+        itinerary["final_report"] = rendered["table"]
+        itinerary["report_rows"] = rendered["rows"]
 
-    # ========= 3️⃣ 构造 Prompt =========
+        control["refinement_instruction"] = None
+        control["error_message"] = None
+        print("✅ 最终行程表生成完成")
+        return {
+            "itinerary": itinerary,
+            "control": control,
+            **extra_update
+        }
+
+    # ========= 4️⃣ 构造 Prompt =========
     if refine_instruction:
         print("✏️ 检测到用户修改意见，进行二次生成")
-        prompt = FINAL_ITINERARY_REFINE_PROMPT.format(
-            final_itinerary=json.dumps(
-                all_items,
-                ensure_ascii=False,
-                indent=2,
-                default=to_json_serializable
-            ),
+        call_site = "refine_final_itinerary"
+        messages = FINAL_ITINERARY_REFINE_PROMPT.format_messages(
+            final_itinerary=to_compact_json(all_items),
             refine_instruction=refine_instruction
         )
     else:
         print("🆕 首次生成最终行程表")
-        prompt = FINAL_ITINERARY_TABLE_PROMPT.format(
-            final_itinerary=json.dumps(
-                all_items,
-                ensure_ascii=False,
-                indent=2,
-                default=to_json_serializable
-            )
+        call_site = "build_final_report"
+        messages = FINAL_ITINERARY_TABLE_PROMPT.format_messages(
+            final_itinerary=to_compact_json(all_items)
         )
 
-    # ========= 4️⃣ 调用 LLM =========
+    # ========= 5️⃣ 调用 LLM =========
     try:
-        resp = deepseek_chat.invoke(prompt)
+        resp = model_router.invoke(call_site, lambda model: model, messages)
         table_md = resp.content.strip()
     except Exception as e:
         msg = f"❌ 最终行程表生成失败: {e}"
@@ -346,8 +317,10 @@ def build_final_itinerary_and_report(state: TravelPlanState) -> Dict[str, Any]:
             }
         }
 
-    # ========= 5️⃣ 写回状态 =========
+    # ========= 6️⃣ 写回状态 =========
     itinerary["final_report"] = table_md
+    # LLM 整体修改后的表格与结构化行程不再逐行对应，清空行缓存
+    itinerary["report_rows"] = None
 
     # 清空修改意见（否则会死循环）
     control["refinement_instruction"] = None
@@ -358,4 +331,4 @@ def build_final_itinerary_and_report(state: TravelPlanState) -> Dict[str, Any]:
     return {
         "itinerary": itinerary,
         "control": control
-    }
\ No newline at end of file
+    }
@@ -1,8 +1,12 @@
 #geo_process.py
 from typing import Dict, Any, List
+from langchain_core.runnables import RunnableConfig
 from data_models import CompanyInfo
 from llm_agent import geocode_company_by_name
+from progress import emit_progress
+from speculation import speculation_engine
 from state import TravelPlanState
+from tools.commute_matrix import CommuteMatrix
 from tools.travel_api import amap_geocode
 
 
@@ -37,6 +41,8 @@ def geocode_locations(state: TravelPlanState) -> Dict[str, Any]:
             print(f"   ✔ {loc['name']} -> ({loc['lat']}, {loc['lon']})")
         else:
             print(f"   ⚠ 编码失败: {loc['name']}")
+        emit_progress("location_geocoded", name=loc["name"], lat=loc.get("lat"), lon=loc.get("lon"),
+                      message=f"{loc['name']} 定位{'完成' if coords else '失败'}")
 
     # 3. 编码 fixed_events 的 location
     for idx, event in enumerate(fixed_events, start=1):
@@ -51,9 +57,18 @@ def geocode_locations(state: TravelPlanState) -> Dict[str, Any]:
             print(f"   ✔ Event {idx}: {event['name']} -> ({loc['lat']}, {loc['lon']})")
         else:
             print(f"   ⚠ Event {idx} 编码失败: {event['name']}")
+        emit_progress("location_geocoded", name=event["name"], lat=loc.get("lat"), lon=loc.get("lon"),
+                      message=f"事务「{event['name']}」定位{'完成' if coords else '失败'}")
+
+    # 4. 预先计算酒店与全部固定事务之间的通勤基础块（与调研模式无关，后续各天规划直接复用）
+    commute_cache = CommuteMatrix.from_dict(state.get("commute_cache"))
+    if locations.get("hotel"):
+        commute_cache.ensure([locations["hotel"]] + [e["location"] for e in fixed_events if e.get("location")])
+        print(f"   ✔ 通勤基础块计算完成，API 调用 {commute_cache.api_calls} 次")
 
     return {
         "locations": locations,
+        "commute_cache": commute_cache.delta(),
         "user": {
             **original_user_ctx,
             "parsed_params": {
@@ -67,11 +82,11 @@ def geocode_locations(state: TravelPlanState) -> Dict[str, Any]:
     }
 
 
-def geocode_companies(state: TravelPlanState) -> Dict[str, Any]:
+def geocode_companies(state: TravelPlanState, config: RunnableConfig) -> Dict[str, Any]:
     """
     geocode_companies：
     - 读取 companies.target_names
-    - 调用地理编码函数
+    - 调用地理编码函数（优先复用 auto_research 等待期间的推测结果）
     - 生成 CompanyInfo 列表
     - 写回 companies.candidates
     """
@@ -90,10 +105,12 @@ def geocode_companies(state: TravelPlanState) -> Dict[str, Any]:
     geocoded_companies: List[CompanyInfo] = []
 
     for name in target_names:
-        geo = geocode_company_by_name(
-            company_name=name,
-            city=state["locations"]["hotel"]["city"]
-        )
+        hit, geo = speculation_engine.take(config, "geocode_company", name)
+        if not hit:
+            geo = geocode_company_by_name(
+                company_name=name,
+                city=state["locations"]["hotel"]["city"]
+            )
 
         if geo is None:
             company_info = CompanyInfo(
@@ -120,6 +137,12 @@ def geocode_companies(state: TravelPlanState) -> Dict[str, Any]:
             f"({company_info.lat}, {company_info.lon}) | "
             f"valid={company_info.is_valid}"
         )
+        emit_progress("company_geocoded", name=name, address=company_info.address, lat=company_info.lat,
+                      lon=company_info.lon, valid=company_info.is_valid, speculated=hit,
+                      message=f"🏢 {name}：{company_info.address if company_info.is_valid else '未找到地址'}")
+
+    # 用户未选中的候选企业，其推测结果直接丢弃
+    speculation_engine.discard(config, "geocode_company")
 
     # 写回 CompanyContext
     return {
@@ -1,4 +1,5 @@
 #input_check.py
+from config import DEFAULT_TRIP_DAYS, MAX_TRIP_DAYS
 from llm_agent import parse_user_input
 from state import TravelPlanState
 from datetime import datetime
@@ -62,7 +63,15 @@ def check_constraints(state: TravelPlanState) -> Dict[str, Any]:
                 "end_time": end,
             })
 
-        # 4. 初始化 Location
+        # 4. 出差天数：未提及时取默认值；固定事务超出默认天数时自动延长，并限制上限
+        trip_days = user_data.get("trip_days") or DEFAULT_TRIP_DAYS
+        if fixed_events:
+            departure = datetime.strptime(user_data["departure_date"], "%Y-%m-%d").date()
+            last_event_day = max(e["end_time"].date() for e in fixed_events)
+            trip_days = max(trip_days, (last_event_day - departure).days + 1)
+        trip_days = max(1, min(trip_days, MAX_TRIP_DAYS))
+
+        # 5. 初始化 Location
         locations = {
             "home": {
                 "city": user_data["origin_city"],
@@ -88,6 +97,7 @@ def check_constraints(state: TravelPlanState) -> Dict[str, Any]:
                     # 而其他不需要更新的顶层键，例如transport,company会被自动保留。
                     **user_data,
                     "fixed_events": fixed_events,
+                    "trip_days": trip_days,
                 }
             },
             "locations": locations,
@@ -1,8 +1,16 @@
 #research_mode.py
+import time
 from typing import Dict, Any, List
+from langchain_core.runnables import RunnableConfig
 from langgraph.types import interrupt
-from llm_agent import generate_company_recommendations_by_llm
+from config import COMPANY_SHORTLIST_ENABLED
+from headless import policy_decision, policy_picks_recommended
+from llm_agent import generate_company_recommendations_by_llm, geocode_company_by_name
+from nodes.day_plan import events_on, research_day_dates
+from progress import emit_progress
+from speculation import speculation_engine
 from state import TravelPlanState
+from tools.shortlist import shortlist_companies
 
 
 def custom_research(state: TravelPlanState) -> Dict[str, Any]:
@@ -101,22 +109,39 @@ def custom_research(state: TravelPlanState) -> Dict[str, Any]:
 #     }
 
 
-def auto_research(state: TravelPlanState) -> Dict[str, Any]:
+def auto_research(state: TravelPlanState, config: RunnableConfig) -> Dict[str, Any]:
     print("\n--- 🤖 节点: auto_research ---")
 
     city = state["locations"]["hotel"]["city"]
 
-    # 2. 获取候选列表
-    all_candidates = generate_company_recommendations_by_llm(city=city)
+    # 2. 获取候选列表（优先复用选择调研模式期间的推测结果；用 get 保留，恢复执行重跑本节点时候选列表保持一致）
+    hit, all_candidates = speculation_engine.get(config, "company_recommendations", city)
+    if not hit:
+        all_candidates = generate_company_recommendations_by_llm(city=city)
 
-    # 3. 触发中断
-    # 在 CLI 环境下，执行到这里会挂起，等待外部输入 resume 值
-    selected_names = interrupt({
+    # 等待用户勾选期间，后台推测执行所有候选企业的地理编码（筛选推荐子集也要用到，无人值守时同样并发执行）
+    for name in all_candidates:
+        speculation_engine.start(config, "geocode_company", name, geocode_company_by_name, name, city)
+
+    # 筛选：按调研日空闲时间窗与粗估通勤，给出能排下最多企业的推荐子集，并标注每家的额外通勤分钟
+    shortlist = {"selected": [], "annotations": []}
+    if COMPANY_SHORTLIST_ENABLED:
+        shortlist = _shortlist_candidates(state, config, all_candidates, wait=policy_picks_recommended(state))
+
+    payload = {
         "type": "company_multi_selection",
         "title": f"""请从候选企业中选择，输入一个名称列表 (例如：["华为", "腾讯", "深信服"])""",
         #"message": all_candidates 由于封装成api时，message的类型要确定，所以这里先去掉
-        "options": all_candidates
-    })
+        "options": all_candidates,
+        "recommended": shortlist["selected"],
+        "annotations": shortlist["annotations"]
+    }
+    decided, selected_names = policy_decision(state, "company_selection", payload)
+
+    # 3. 触发中断
+    # 在 CLI 环境下，执行到这里会挂起，等待外部输入 resume 值
+    if not decided:
+        selected_names = interrupt(payload)
 
     if not selected_names:
         return {"control": {"error_message": "未收到有效的企业选择"}}
@@ -126,6 +151,7 @@ def auto_research(state: TravelPlanState) -> Dict[str, Any]:
         selected_names = [n.strip() for n in selected_names.replace("，", ",").split(",")]
 
     print(f"✅ 节点收到用户输入: {selected_names}")
+    speculation_engine.discard(config, "company_recommendations")
 
     # 5. 写入状态
     return {
@@ -136,6 +162,46 @@ def auto_research(state: TravelPlanState) -> Dict[str, Any]:
     }
 
 
+def _shortlist_candidates(state: TravelPlanState, config: RunnableConfig, names: List[str],
+                          wait: bool = False) -> Dict[str, Any]:
+    """
+    读取候选企业的推测地理编码（用 get 读取并保留结果，geocode_companies 仍可直接取用），再在各调研日上按粗估通勤做定向越野筛选
+    - wait=False（交互模式）：不等待，只用已完成编码的企业筛选；其余标注为 fits: None，编码在用户勾选期间继续进行
+    - wait=True（由策略取推荐列表）：等待全部编码完成（未启用推测或推测失败时同步编码），结果不随时序变化
+    """
+    hotel_loc = state["locations"]["hotel"]
+    ready, waiting = [], set()
+    for name in names:
+        hit, geo = speculation_engine.get(config, "geocode_company", name, timeout=None if wait else 0)
+        if not hit and wait:
+            hit, geo = True, geocode_company_by_name(company_name=name, city=hotel_loc["city"])
+        if not hit:
+            waiting.add(name)
+            continue
+        location = None
+        if geo is not None:
+            location = {"city": hotel_loc["city"], "address": geo["address"], "name": name,
+                        "lat": geo["lat"], "lon": geo["lon"]}
+        ready.append((name, location))
+
+    user_params = state["user"]["parsed_params"]
+    fixed_events = state["itinerary"]["fixed_events"]
+    events_by_day = [events_on(fixed_events, day) for day in research_day_dates(user_params)]
+
+    start = time.perf_counter()
+    shortlist = shortlist_companies(events_by_day, ready, hotel_loc)
+    annotation_of = {annotation["name"]: annotation for annotation in shortlist["annotations"]}
+    shortlist["annotations"] = [
+        annotation_of.get(name) or {"name": name, "fits": None, "extra_minutes": None} for name in names
+    ]
+    if waiting:
+        print(f"⏳ {len(waiting)} 家企业的地理编码尚未完成，暂不参与推荐")
+    print(f"📌 推荐调研组合（{(time.perf_counter() - start) * 1000:.1f} ms）: {', '.join(shortlist['selected']) or '无'}")
+    emit_progress("companies_shortlisted", selected=shortlist["selected"],
+                  message=f"推荐调研组合：{', '.join(shortlist['selected']) or '无'}")
+    return shortlist
+
+
 def skip_research(state: TravelPlanState) -> Dict[str, Any]:
     print("\n--- 🤖 节点: skip_research ---")
     print("用户选择不进行企业调研")
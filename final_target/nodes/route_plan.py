@@ -7,6 +7,8 @@ from tools.travel_api import query_flight_api, query_train_api, amap_geocode, ge
 import requests
 from state import Location
 from langgraph.types import interrupt
+from headless import policy_decision
+from progress import emit_progress
 
 def traffic_query(state: TravelPlanState) -> Dict[str, Any]:
     """
@@ -60,6 +62,8 @@ def traffic_query(state: TravelPlanState) -> Dict[str, Any]:
         }
 
     print(f"✅ 交通查询完成：航班 {len(flight_options)} 个，高铁 {len(train_options)} 个")
+    emit_progress("transport_found", flights=len(flight_options), trains=len(train_options),
+                  message=f"查询到航班 {len(flight_options)} 个，高铁 {len(train_options)} 个")
 
     return {
         "transport": {
@@ -201,11 +205,14 @@ def user_select_transport(state: TravelPlanState) -> Dict[str, Any]:
         )
 
     # 3️⃣ 触发中断：明确把“方案列表”传出去
-    user_response = interrupt({
+    payload = {
         "type": "select_transport",
         "message": "请选择一个交通方案，可输入该方案对应的数字：",
         "options": option_summaries
-    })
+    }
+    decided, user_response = policy_decision(state, "select_transport", payload)
+    if not decided:
+        user_response = interrupt(payload)
 
     print(f"DEBUG: 用户返回的数据: {user_response}")
 
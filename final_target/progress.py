@@ -0,0 +1,59 @@
+#progress.py
+import json
+import time
+from typing import Any, Dict, Iterator
+
+from fastapi.encoders import jsonable_encoder
+from langgraph.config import get_config, get_stream_writer
+
+# graph.stream 同时订阅的流：tasks（节点开始 / 结束）、custom（节点内 emit_progress 上报的中间结果）、updates（interrupt）
+_STREAM_MODES = ["tasks", "custom", "updates"]
+
+
+def emit_progress(kind: str, **data: Any) -> None:
+    """
+    节点内上报中间结果（如查到几个航班、每家企业的地理编码结果），经 custom 流推送给前端
+    不在图中运行、或调用方没有订阅 custom 流时为空操作
+    """
+    try:
+        writer = get_stream_writer()
+        node = get_config().get("metadata", {}).get("langgraph_node")
+    except RuntimeError:
+        return
+    writer({"kind": kind, "node": node, **data})
+
+
+def stream_progress(graph, graph_input: Any, config: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """
+    以进度事件的形式运行一次图（直到结束或遇到 interrupt）：
+    - node_start / node_end：节点开始与结束（含耗时、异常、是否中断），并行分支各自一对
+    - progress：节点通过 emit_progress 上报的中间结果
+    - interrupt：图停在 interrupt，data 为中断内容
+    运行结束后的最终结果由调用方读取 graph.get_state(config)
+    """
+    started: Dict[str, float] = {}
+    for mode, chunk in graph.stream(graph_input, config=config, stream_mode=_STREAM_MODES):
+        if mode == "tasks" and "input" in chunk:
+            started[chunk["id"]] = time.perf_counter()
+            yield {"event": "node_start", "node": chunk["name"], "task_id": chunk["id"]}
+        elif mode == "tasks":
+            start = started.pop(chunk["id"], None)
+            yield {
+                "event": "node_end",
+                "node": chunk["name"],
+                "task_id": chunk["id"],
+                "duration_ms": round((time.perf_counter() - start) * 1000, 1) if start is not None else None,
+                "error": str(chunk["error"]) if chunk.get("error") else None,
+                "interrupted": bool(chunk.get("interrupts")),
+            }
+        elif mode == "custom":
+            yield {"event": "progress", **chunk}
+        elif mode == "updates" and "__interrupt__" in chunk:
+            for item in chunk["__interrupt__"]:
+                yield {"event": "interrupt", "data": item.value}
+
+
+def to_sse(event: Dict[str, Any]) -> str:
+    """Server-Sent Events 格式：事件名取 event 字段，data 为整条事件的 JSON"""
+    data = json.dumps(jsonable_encoder(event), ensure_ascii=False)
+    return f"event: {event['event']}\ndata: {data}\n\n"
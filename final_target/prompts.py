@@ -3,18 +3,65 @@ from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 from data_models import SelectedTransport
 
-# 提取用户输入信息
-INPUT_EXTRACTION_PROMPT = """
-你是一个严谨的行程规划助手，你的任务是从用户提供的原始文本中，精确地提取所有关键的行程参数。
-如果用户没有明确提供某些信息，请尽力根据上下文推断或将其保留为 None。
+# ===============================
+# 前缀缓存约定
+# ===============================
+# DeepSeek / DashScope 会对「完全相同的请求前缀」命中上下文缓存（更低的首 token 延迟与价格）。
+# 因此所有规划类 Prompt 统一拆分为两段：
+#   - system：长且完全静态的规则 / Schema / 输出格式（不得包含任何 {占位符} 以外的请求数据）
+#   - human ：紧凑的动态数据（日期、事件、通勤矩阵等，使用紧凑 JSON）
+# 修改 system 段会让所有历史缓存失效，请尽量只在 human 段增减字段。
+
+# Day 1 / 调研日规划共用的 ItineraryItem 输出规范，放在 system 段最前面以便跨调用点共享缓存前缀
+_ITINERARY_ITEM_SCHEMA = """你是一个出差行程规划助手，只输出 JSON 数组，数组中每个元素是一个 ItineraryItem：
+  - type: 行程中的每个项目必须包含 type 字段，该字段**仅限输出以下对应的图案符号**：
+        ✈️ (用于跨城航班) 或 🚄 (用于跨城高铁)：对应 大交通
+        🚗：对应 市内通勤（如：前往酒店、前往公司、公司间往返）
+        🏢：对应 企业调研/访问
+        🤝：对应 商务会议
+        🏨：对应 酒店入住/休息/出发
+        📍：对应 其他行动（如：取行李、用餐、集合）
+  - description: 描述
+  - start_time: 'YYYY-MM-DD HH:MM' 格式
+  - end_time: 'YYYY-MM-DD HH:MM' 格式
+  - location: {{ "city": "...", "address": "...", "name": "...", "lat": "...", "lon": "..." }}
+    - 如果某个字段没有值，请填 null（JSON 空值）
+  - details: 自由字段，可包含 price、duration、notes 等信息
+- 顺序必须按照实际发生顺序
+- **新生成的交通任务（transport type）必须使用【通勤矩阵】中的时间来确定 end_time**，以确保最短和最准确的路径
+- 通勤矩阵的键为地点ID（LOC_i），值为地点ID到地点ID的驾车时间，单位：分钟
+- 不要输出多余文字，只返回 JSON 数组
+"""
 
-原始用户输入文本:
----
-{user_input}
----
+# Markdown 行程表的固定格式，最终报告与修改共用
+_ITINERARY_TABLE_FORMAT = """表格格式必须严格如下（不允许新增或删除列）：
+
+| 日期/天数 | 时间 | 类型 | 内容 | 地点 |
+| :--- | :--- | :--- | :--- | :--- |
+
+通用规则：
+1. 一行对应一个行程项
+2. 日期/天数只能是：Day N（写具体日期），N 为行程中的第几天
+3. 时间格式必须是：HH:MM-HH:MM
+4. 地点字段优先使用 location.name，其次 location.address，都没有则填 None
+5. 不要添加任何解释、总结、标题或多余文字
+6. 只输出 Markdown 表格本身
+"""
 
+
+# 提取用户输入信息
+INPUT_EXTRACTION_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            """你是一个严谨的行程规划助手，你的任务是从用户提供的原始文本中，精确地提取所有关键的行程参数。
+如果用户没有明确提供某些信息，请尽力根据上下文推断或将其保留为 None。
 请严格按照提供的 JSON Schema 格式输出提取结果。所有字段都是必需的。
 """
+        ),
+        ("human", "原始用户输入文本:\n---\n{user_input}\n---"),
+    ]
+)
 
 # 交通方案选择
 TRANSPORT_DECISION_PROMPT = ChatPromptTemplate.from_messages(
@@ -24,7 +71,7 @@ TRANSPORT_DECISION_PROMPT = ChatPromptTemplate.from_messages(
             """你是一个专业的商务出差行程规划 AI。
 
 --- 🎯 决策模式判断 ---
-你必须根据【出发日期 {departure_date}】与【会议时间 {meeting_start_dt}】是否为同一天，判断决策模式：
+你必须根据【出发日期】与【会议时间】是否为同一天，判断决策模式：
 
 1️⃣ 若为同一天：
 - 采用【准时到达模式】
@@ -39,24 +86,26 @@ TRANSPORT_DECISION_PROMPT = ChatPromptTemplate.from_messages(
 - 避免选择过早或过晚到达的班次
 
 --- ⏱️ 硬性时间约束 ---
-- 会议开始时间：{meeting_start_dt}
-- 枢纽 → 会议地通勤时间：{arrival_commute_minutes} 分钟
-- 最晚允许到达枢纽时间（已含缓冲）：{latest_hub_arrival}
-
-⚠️ **任何到达枢纽时间晚于该时间的班次，必须直接排除**
-
---- 🚆 候选交通方案 ---
-{transport_options}
+⚠️ **任何到达枢纽时间晚于【最晚允许到达枢纽时间】的班次，必须直接排除**
 
 --- 📝 输出要求 ---
 - 首先过滤掉不满足“最晚到达枢纽时间”的方案
-- 再根据当前模式选择最优方案
+- 再根据当前模式选择最优方案，并说明理由
 - 仅输出 JSON，不要包含额外文本
 - 输出格式必须严格符合以下 Pydantic 结构：
 {format_instructions}
 """
         ),
-        ("human", "请选择最优交通方案并说明理由。"),
+        (
+            "human",
+            """出发日期：{departure_date}
+会议开始时间：{meeting_start_dt}
+枢纽 → 会议地通勤时间：{arrival_commute_minutes} 分钟
+最晚允许到达枢纽时间（已含缓冲）：{latest_hub_arrival}
+
+候选交通方案：
+{transport_options}"""
+        ),
     ]
 ).partial(
     format_instructions=JsonOutputParser(
@@ -65,43 +114,34 @@ TRANSPORT_DECISION_PROMPT = ChatPromptTemplate.from_messages(
 )
 
 
-day_1_plan_prompt = """
-你是一个行程规划助手。请根据以下信息，生成 Day 1 的完整行程：
-
-1. 到达交通段:
+DAY_1_PLAN_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            _ITINERARY_ITEM_SCHEMA + """
+--- Day 1 规划规则 ---
+- 你需要根据【到达交通段】【Day 1 固定事务】【用户出差信息】【通勤矩阵】生成 Day 1 的完整行程
+- **规划必须从【到达交通段】的到达时间开始计算，并包含到达交通段和所有 Day 1 固定事务**
+- **只生成**连接固定事务和交通所**必需**的中间步骤，且要符合正常差旅逻辑，一天的行程**一定是以回酒店作为结束**
+- **严禁**生成任何发散的、非必需、非本日的活动（如：午餐、自由活动、休息等）。各项行程的时间不需要绝对连贯，合理即可
+"""
+        ),
+        (
+            "human",
+            """到达交通段:
 {arrival_transport}
 
-2. Day 1 固定事务:
+Day 1 固定事务:
 {day1_fixed_events}
 
-3. 用户出差信息:
+用户出差信息:
 {user_params}
 
-4. 通勤矩阵：（地点ID到地点ID的驾车时间，单位：分钟）：
-{day1_commute_matrix}
-
-要求：
-- 输出 JSON 数组，每个元素是 ItineraryItem:
-  - type: 行程中的每个项目必须包含 type 字段，该字段**仅限输出以下对应的图案符号**：
-        ✈️ (用于跨城航班) 或 🚄 (用于跨城高铁)：对应 大交通
-        🚗：对应 市内通勤（如：前往酒店、前往公司、公司间往返）
-        🏢：对应 企业调研/访问
-        🤝：对应 商务会议
-        🏨：对应 酒店入住/休息/出发
-        📍：对应 其他行动（如：取行李、用餐、集合）
-  - description: 描述
-  - start_time: 'YYYY-MM-DD HH:MM' 格式
-  - end_time: 'YYYY-MM-DD HH:MM' 格式
-  - location: {{ "city": "...", "address": "...", "name": "...", "lat": "...", "lon": "..." }}
-    - 如果某个字段没有值，请填 None
-  - details: 自由字段，可包含 price、duration 等信息
-- 顺序必须按照实际发生顺序
-- **规划必须从** `{arrival_transport}` **的到达时间开始计算，并包含** `arrival_transport` **和所有** `day1_fixed_events`。
-- **核心约束：** **新生成的交通任务（transport type）必须使用 通勤矩阵 中的时间来确定 end_time**，以确保最短和最准确的路径。
-- **只生成**连接固定事务和交通所**必需**的中间步骤，且要符合正常差旅逻辑，一天的行程**一定是以回酒店作为结束**。
-- **严禁**生成任何发散的、非必需、非本日的活动（如：午餐、自由活动、休息等）。各项行程的时间不需要绝对连贯，合理即可。
-- 不要输出多余文字，只返回 JSON 数组。
-"""
+通勤矩阵:
+{day1_commute_matrix}"""
+        ),
+    ]
+)
 
 
 company_disambiguation_prompt = """
@@ -158,8 +198,11 @@ company_disambiguation_prompt = """
 """
 
 
-ENSURE_ADDRESS_PROMPT = """
-你是一个地理信息助手。
+ENSURE_ADDRESS_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            """你是一个地理信息助手。
 请根据【公司名称】和【城市】给出一个【适合高德地图地理编码的精确中文地址】。
 
 要求：
@@ -168,101 +211,83 @@ ENSURE_ADDRESS_PROMPT = """
 - 不要 JSON
 - 地址需尽量具体（区 / 街道 / 园区 / 楼宇）
 - 如果无法确定，请尽量给出该公司总部或主要办公地址
-
-公司名称：{company_name}
-城市：{city}
 """
+        ),
+        ("human", "公司名称：{company_name}\n城市：{city}"),
+    ]
+)
 
 
-DAY_2_3_PLAN_PROMPT = """
-你是一个出差行程规划助手。
-
-请根据以下信息，为 Day 2 和 Day 3 生成完整行程：
-
-1. 用户固定事件（会议、培训等，已按日期区分）：
-Day 2 固定事件:
-{day_2_events}
-
-Day 3 固定事件:
-{day_3_events}
-
-2. 待调研企业（可能为空）：
-{companies_to_plan}
-
-3. 用户出差信息:
-{user_params}
-
-4. 酒店信息（每天的起点和终点）：
-{hotel}
+COMPANY_RECOMMENDATION_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            "你是一名专业的商务调研分析师。请为用户给出的城市推荐 15 家有价值的知名科技或核心企业。"
+            "这些企业应适合商务访问或调研。请仅输出企业名称，不要包含其他解释，企业必须真实存在。"
+        ),
+        ("human", "城市：{city}"),
+    ]
+)
 
-5. 通勤矩阵：（地点ID到地点ID的驾车时间，单位：分钟）：
-{day_2_3_commute_matrix}
 
-要求：
-- 输出 JSON 数组，每个元素是 ItineraryItem：
-  - type: 行程中的每个项目必须包含 type 字段，该字段**仅限输出以下对应的图案符号**：
-        ✈️ (用于跨城航班) 或 🚄 (用于跨城高铁)：对应 大交通
-        🚗：对应 市内通勤（如：前往酒店、前往公司、公司间往返）
-        🏢：对应 企业调研/访问
-        🤝：对应 商务会议
-        🏨：对应 酒店入住/休息/出发
-        📍：对应 其他行动（如：取行李、用餐、集合）
-  - description: 描述
-  - start_time: 'YYYY-MM-DD HH:MM'
-  - end_time: 'YYYY-MM-DD HH:MM'
-  - location: {{ "city": "...", "address": "...", "name": "...", "lat": "...", "lon": "..." }}
-    - 如果某个字段没有值，请填 None
-  - details: 可包含 price、duration、notes 等信息
-- 顺序必须按照实际发生顺序
-- **每一天的行程必须从酒店出发，包含所有固定事件和调研企业访问（如果有），并最终回到酒店**
+RESEARCH_DAY_PLAN_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            _ITINERARY_ITEM_SCHEMA + """
+--- 调研日规划规则 ---
+- 你需要根据【固定事件】【待调研企业】【用户出差信息】【酒店信息】【通勤矩阵】为指定的某一天生成完整行程
+- **行程必须从酒店出发，包含当天所有固定事件和调研企业访问（如果有），并最终回到酒店**
 - **调研任务尽量不安排在中午时间**
-- **新生成的交通任务（transport type）必须使用通勤矩阵中的时间来确定 end_time**
 - **只生成连接固定事务和交通所必需的中间步骤，不生成多余活动或自由安排（如：午餐），各项行程的时间不需要绝对连贯，合理即可**
-- 如果某一天没有待调研企业，仅规划固定事件。如果某一天无任何事务，该天不需要规划。
-- 不要生成任何多余文字，只返回 JSON 数组
+- 所有行程项的日期必须是给定的日期
+- 如果当天没有待调研企业，仅规划固定事件。如果当天无任何事务，输出空数组。
 """
+        ),
+        (
+            "human",
+            """日期:
+{day_date}
 
+当天固定事件:
+{day_events}
 
-FINAL_ITINERARY_TABLE_PROMPT = """
-你是一个行程信息整理助手。
-
-下面是用户已经确定好的完整行程（JSON 数组，按时间顺序）：
-{final_itinerary}
-
-你的任务是：
-- 将这些行程整理成【Markdown 表格】
-- 表格格式必须严格如下（不允许新增或删除列）：
-
-| 日期/天数 | 时间 | 类型 | 内容 | 地点 |
-| :--- | :--- | :--- | :--- | :--- |
-
-规则（非常重要）：
-1. 一行对应一个行程项
-2. 日期/天数只能是：Day 1（写具体日期）、Day 2（写具体日期） 或 Day 3（写具体日期）
-3. 时间格式必须是：HH:MM-HH:MM
-4. 地点字段优先使用 location.name，其次 location.address，都没有则填 None
-5. 不要添加任何解释、总结、标题或多余文字
-6. 只输出 Markdown 表格本身
-"""
-
-FINAL_ITINERARY_REFINE_PROMPT = """
-你是一个出差行程优化助手。
+当天待调研企业（可能为空）:
+{companies_to_plan}
 
-下面是【当前已生成的完整出差行程】（包含 Day 1 / Day 2 / Day 3）：
-{final_itinerary}
+用户出差信息:
+{user_params}
 
-用户对行程提出了如下【修改要求】：
-{refine_instruction}
+酒店信息（当天的起点和终点）:
+{hotel}
 
-你的任务是：
-- 将这些行程整理成【Markdown 表格】
-- 表格格式必须严格如下（不允许新增或删除列）：
+通勤矩阵:
+{commute_matrix}"""
+        ),
+    ]
+)
 
-| 日期/天数 | 时间 | 类型 | 内容 | 地点 |
-| :--- | :--- | :--- | :--- | :--- |
 
+FINAL_ITINERARY_TABLE_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            """你是一个行程信息整理助手。
+你的任务是将用户已经确定好的完整行程（JSON 数组，按时间顺序）整理成【Markdown 表格】。
+""" + _ITINERARY_TABLE_FORMAT
+        ),
+        ("human", "完整行程:\n{final_itinerary}"),
+    ]
+)
 
-规则（非常重要）：
+FINAL_ITINERARY_REFINE_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            """你是一个出差行程优化助手。
+你的任务是根据用户的【修改要求】调整【当前已生成的完整出差行程】（包含到达日 Day 1 及其后各调研日），并整理成【Markdown 表格】。
+""" + _ITINERARY_TABLE_FORMAT + """
+修改规则（非常重要）：
 - **在尽量少改动原行程的前提下**，根据用户的修改要求，对行程进行必要的调整
 - **未被用户明确要求修改的部分必须保持不变**
 - **禁止自行新增、删除或合并行程天数**
@@ -271,10 +296,52 @@ FINAL_ITINERARY_REFINE_PROMPT = """
 - **交通类（type = transport）的时间调整，必须符合原有通勤逻辑**
 - **固定事件（会议、培训等）不得被删除或更改其核心时间含义**
 - 若用户的修改要求存在歧义，请选择**最保守、最小改动**的方案
+"""
+        ),
+        ("human", "当前行程:\n{final_itinerary}\n\n修改要求:\n{refine_instruction}"),
+    ]
+)
+
 
-注意事项：
-1. 不要添加任何解释、总结、标题或多余文字
-2. 只输出 Markdown 表格本身
+REFINEMENT_CLASSIFY_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            """你是一个出差行程修改意图识别助手。
+你会收到各调研日当前已安排的停靠点（企业调研与固定事务）以及用户的修改要求，
+请把修改要求拆解为一组结构化操作：
+- shift：把某项企业调研推迟或提前 minutes 分钟（推迟为正，提前为负）
+- swap：交换两项企业调研（target 与 other）的时间位置
+- remove：删除某项企业调研
+- add_visit：新增一家企业调研（target 为企业名称，day 为指定天数，未指定填 null）
+- unsupported：修改要求涉及 Day 1、交通、固定事务的时间或删除、整体风格调整，或无法用以上操作准确表达
+
+规则：
+- target / other 必须使用停靠点列表中出现的名称（add_visit 除外）
+- 只要有任何一部分要求无法准确表达，就只输出一条 unsupported 操作
+- 严格按照提供的 JSON Schema 输出
 """
+        ),
+        ("human", "当前调研日停靠点:\n{stops}\n\n修改要求:\n{refine_instruction}"),
+    ]
+)
 
 
+ITINERARY_ITEM_REPAIR_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            """你是一个 JSON 修复助手。你会收到一个格式损坏或字段不合法的 ItineraryItem JSON 片段及其错误信息。
+请只修复这一个片段，输出一个合法的 JSON 对象，字段要求：
+  - type: 字符串（行程类型图案符号）
+  - description: 字符串
+  - start_time / end_time: 'YYYY-MM-DD HH:MM' 格式，end_time 不早于 start_time
+  - location: {{ "city": ..., "address": ..., "name": ..., "lat": ..., "lon": ... }}，没有值的字段填 null
+  - details: JSON 对象
+- 保持原片段的语义和时间不变，不要新增或删除行程
+- 只输出 JSON 对象本身，不要输出 Markdown 代码块或其他文字
+"""
+        ),
+        ("human", "错误信息：{error}\n\n损坏的片段：\n{fragment}"),
+    ]
+)
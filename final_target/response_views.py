@@ -0,0 +1,99 @@
+#response_views.py
+"""
+api_server 的响应裁剪与序列化：
+- view 只返回客户端需要的部分（中断内容 / 最终报告 / 摘要），fields 按点分路径挑选任意状态字段
+- OrjsonResponse 用 orjson 直接把状态序列化为 JSON（datetime / date / dataclass 原生支持，pydantic 模型转 dict），
+  不再先经 jsonable_encoder 逐个对象转换
+"""
+from typing import Any, Dict, List, Optional
+
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+# full：完整状态（默认，与旧版相同）；interrupt：只返回 interrupt_info；report：最终报告与校验结果；summary：行程摘要
+VIEWS = ("full", "interrupt", "report", "summary")
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    raise TypeError(f"无法序列化的类型: {type(obj).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+class OrjsonResponse(JSONResponse):
+    """直接返回该响应（而非 dict）时 FastAPI 不再调用 jsonable_encoder，序列化只经过一次 orjson"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def _pick(state: Dict[str, Any], path: str) -> Any:
+    value: Any = state
+    for part in path.split("."):
+        if isinstance(value, BaseModel):
+            value = getattr(value, part, None)
+        elif isinstance(value, dict):
+            value = value.get(part)
+        elif isinstance(value, list) and part.isdigit() and int(part) < len(value):
+            value = value[int(part)]
+        else:
+            return None
+    return value
+
+
+def project_fields(state: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+    """按点分路径（如 "transport.selected_transport"、"days.0.items"）挑选字段，保持原有的嵌套结构；不存在的路径为 None"""
+    projected: Dict[str, Any] = {}
+    for path in fields:
+        *parents, leaf = path.split(".")
+        node = projected
+        for part in parents:
+            node = node.setdefault(part, {})
+        node[leaf] = _pick(state, path)
+    return projected
+
+
+def summarize(state: Dict[str, Any]) -> Dict[str, Any]:
+    """行程摘要：出发 / 目的地与日期、选中的交通、调研企业、每天的活动数、校验问题数与错误信息"""
+    params = (state.get("user") or {}).get("parsed_params") or {}
+    transport = state.get("transport") or {}
+    companies = state.get("companies") or {}
+    itinerary = state.get("itinerary") or {}
+    selected = transport.get("selected_transport") or {}
+    return {
+        "origin": params.get("origin_city"),
+        "destination": params.get("destination_city"),
+        "departure_date": params.get("departure_date"),
+        "trip_days": params.get("trip_days"),
+        "transport": selected.get("description"),
+        "approved": transport.get("approved"),
+        "companies": companies.get("target_names") or [],
+        "unscheduled": companies.get("unscheduled") or [],
+        "days": [{"day_index": day["day_index"], "date": day.get("date"), "items": len(day.get("items") or [])}
+                 for day in state.get("days") or []],
+        "violations": len((itinerary.get("violations") or {}).get("final") or []),
+        "has_report": bool(itinerary.get("final_report")),
+        "error": (state.get("control") or {}).get("error_message"),
+    }
+
+
+def project_state(state: Dict[str, Any], view: str = "full", fields: Optional[List[str]] = None) -> Any:
+    """给出 view / fields 对应的 data；同时给出时以 fields 为准"""
+    if fields:
+        return project_fields(state, fields)
+    if view == "interrupt":
+        return None
+    if view == "report":
+        itinerary = state.get("itinerary") or {}
+        return {"final_report": itinerary.get("final_report"),
+                "violations": (itinerary.get("violations") or {}).get("final") or []}
+    if view == "summary":
+        return summarize(state)
+    return state
@@ -0,0 +1,183 @@
+#run_pool.py
+import asyncio
+import math
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from langgraph.types import StateSnapshot
+
+from config import RUN_LEASE_TTL_SECONDS, RUN_POOL_WORKERS, RUN_QUEUE_MAX_DEPTH, RUN_RETRY_AFTER_DEFAULT_SECONDS
+from progress import stream_progress
+from shared_store import SharedStore, shared_store
+
+
+class RunRejected(Exception):
+    """准入控制拒绝：status_code 为 429（排队已满）或 409（该会话已有运行），retry_after 为建议重试秒数"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class RunCancelled(Exception):
+    """运行被取消（排队中直接移除，执行中在当前超步结束后停止，已完成的超步仍保存在检查点中）"""
+
+
+def snapshot_result(snapshot: StateSnapshot) -> Dict[str, Any]:
+    """运行结束时的对外结果：停在 interrupt 时返回中断内容，否则返回最终报告"""
+    if snapshot.next:
+        # 获取中断的详细信息（就是节点里 interrupt() 抛出的 payload）
+        interrupt_content = next((task.interrupts[0].value for task in snapshot.tasks if task.interrupts), None)
+        return {"status": "NEED_INTERACTION", "interrupt_data": interrupt_content}
+    return {"status": "COMPLETED", "final_result": snapshot.values.get("itinerary", {}).get("final_report", "规划完成")}
+
+
+class _Run:
+    def __init__(self, thread_id: str):
+        self.thread_id = thread_id
+        self.cancel_event = threading.Event()
+        self.future: Optional[Future] = None
+        self.submitted_at = time.monotonic()
+        self.started_at: Optional[float] = None
+
+
+class RunPool:
+    """
+    图运行的有界线程池（api_bridge 使用）：
+    - 同步的 graph.stream 在线程池中执行，事件循环只负责收发请求，一次长时间的规划不会阻塞其它请求和健康检查
+    - 准入控制：排队数超过 max_queue 返回 429，同一会话同时只允许一个运行（409），Retry-After 按平均运行耗时估算
+    - 取消：排队中的运行直接移除；执行中的运行在每个进度事件（节点开始 / 结束）之后检查取消标记，停在最近一次检查点上，之后可照常恢复
+    - 多 worker 部署（store.shared）：会话运行租约与取消标记放在共享存储中，同一会话在所有 worker 中同时只有一个运行，
+      任一 worker 都能取消其它 worker 上的运行；运行结束时立即把检查点落盘，下一次恢复可以落到任意 worker
+    """
+
+    def __init__(self, graph, workers: int = RUN_POOL_WORKERS, max_queue: int = RUN_QUEUE_MAX_DEPTH,
+                 store: SharedStore = shared_store):
+        self.graph = graph
+        self.workers = workers
+        self.max_queue = max_queue
+        self.store = store if store.shared else None
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="graph-run")
+        self._lock = threading.Lock()
+        self._runs: Dict[str, _Run] = {}
+        self._running = 0
+        self._avg_seconds: Optional[float] = None     # 运行耗时的指数滑动平均
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "cancelled": 0, "rejected": 0}
+
+    def _retry_after(self, queued: int) -> int:
+        avg = self._avg_seconds or RUN_RETRY_AFTER_DEFAULT_SECONDS
+        return max(1, math.ceil(avg * (queued + 1) / self.workers))
+
+    def submit(self, thread_id: str, graph_input: Any,
+               listener: Optional[Callable[[Dict[str, Any]], None]] = None) -> Future:
+        """
+        提交一次运行（新输入或 Command(resume=...)），返回结果为运行结束时 StateSnapshot 的 Future
+        listener 在工作线程中逐条收到 stream_progress 的进度事件（供 SSE 推送）
+        """
+        with self._lock:
+            queued = len(self._runs) - self._running
+            if thread_id in self._runs:
+                self._stats["rejected"] += 1
+                raise RunRejected(409, f"会话 {thread_id} 已有运行在执行或排队", self._retry_after(0))
+            if queued >= self.max_queue:
+                self._stats["rejected"] += 1
+                raise RunRejected(429, f"排队中的运行已达上限（{self.max_queue}），请稍后重试", self._retry_after(queued))
+            if self.store is not None:
+                if not self.store.add("run_lease", thread_id, {"pid": os.getpid()}, ttl_seconds=RUN_LEASE_TTL_SECONDS):
+                    self._stats["rejected"] += 1
+                    raise RunRejected(409, f"会话 {thread_id} 已有运行在其它 worker 上执行或排队", self._retry_after(0))
+                self.store.delete("run_cancel", thread_id)
+
+            run = _Run(thread_id)
+            self._runs[thread_id] = run
+            self._stats["submitted"] += 1
+            run.future = self._executor.submit(self._execute, run, graph_input, listener)
+        run.future.add_done_callback(lambda _: self._finish(run))
+        return run.future
+
+    async def run(self, thread_id: str, graph_input: Any) -> StateSnapshot:
+        future = self.submit(thread_id, graph_input)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # 排队中被 cancel() 移除的运行：转换为 RunCancelled；其它情况（请求本身被取消）照常向上抛出
+            if future.cancelled():
+                raise RunCancelled(thread_id) from None
+            raise
+
+    def _execute(self, run: _Run, graph_input: Any,
+                 listener: Optional[Callable[[Dict[str, Any]], None]]) -> StateSnapshot:
+        with self._lock:
+            self._running += 1
+            run.started_at = time.monotonic()
+        config = {"configurable": {"thread_id": run.thread_id}}
+        try:
+            if self._cancel_requested(run):
+                raise RunCancelled(run.thread_id)
+            for event in stream_progress(self.graph, graph_input, config):
+                if listener is not None:
+                    listener(event)
+                if self._cancel_requested(run):
+                    raise RunCancelled(run.thread_id)
+            return self.graph.get_state(config)
+        finally:
+            # 检查点存储缓冲写入时（SQLiteCheckpointSaver），运行结束立即落盘，其它 worker 恢复该会话时能读到最新状态
+            flush = getattr(self.graph.checkpointer, "flush", None)
+            if flush is not None:
+                flush()
+
+    def _cancel_requested(self, run: _Run) -> bool:
+        if run.cancel_event.is_set():
+            return True
+        return self.store is not None and self.store.get("run_cancel", run.thread_id) is not None
+
+    def _finish(self, run: _Run) -> None:
+        future = run.future
+        if self.store is not None:
+            self.store.delete("run_lease", run.thread_id)
+        with self._lock:
+            self._runs.pop(run.thread_id, None)
+            if run.started_at is not None:
+                self._running -= 1
+                elapsed = time.monotonic() - run.started_at
+                self._avg_seconds = elapsed if self._avg_seconds is None else 0.8 * self._avg_seconds + 0.2 * elapsed
+            if future.cancelled() or isinstance(future.exception(), RunCancelled):
+                self._stats["cancelled"] += 1
+            elif future.exception() is not None:
+                self._stats["failed"] += 1
+            else:
+                self._stats["completed"] += 1
+
+    def cancel(self, thread_id: str) -> Optional[str]:
+        """
+        取消该会话的运行：返回 "cancelled"（排队中，已移除）、"cancelling"（执行中，当前超步后停止）或 None（无运行）
+        运行在其它 worker 上时写入共享取消标记，由该 worker 在下一个进度事件处停止（返回 "cancelling"）
+        """
+        with self._lock:
+            run = self._runs.get(thread_id)
+        if run is None:
+            if self.store is not None and self.store.get("run_lease", thread_id) is not None:
+                self.store.set("run_cancel", thread_id, True, ttl_seconds=RUN_LEASE_TTL_SECONDS)
+                return "cancelling"
+            return None
+        run.cancel_event.set()
+        if run.future.cancel():
+            return "cancelled"
+        return "cancelling"
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._stats,
+                "pid": os.getpid(),
+                "workers": self.workers,
+                "running": self._running,
+                "queued": len(self._runs) - self._running,
+                "max_queue": self.max_queue,
+                "avg_run_seconds": round(self._avg_seconds, 3) if self._avg_seconds is not None else None,
+            }
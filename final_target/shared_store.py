@@ -0,0 +1,215 @@
+#shared_store.py
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from config import SHARED_STORE_BACKEND, SHARED_STORE_MEMORY_MAX_ENTRIES, SHARED_STORE_PATH
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    ns TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    expires_at REAL,
+    PRIMARY KEY (ns, key)
+);
+CREATE INDEX IF NOT EXISTS kv_expires ON kv (expires_at);
+CREATE TABLE IF NOT EXISTS buckets (
+    name TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+);
+"""
+
+
+class SharedStore:
+    """
+    多个 worker 进程共享的键值存储：外部调用缓存、令牌桶、任务记录、会话运行租约与取消标记都经由它读写
+    值为可 JSON 序列化的对象，按命名空间 (ns) 隔离，可带过期时间
+    这组接口对应一个网络 KV（Redis 一类）的最小能力：get / set / set-if-absent / delete / 原子令牌桶，
+    接入网络存储时实现本类即可；单机部署用 SQLiteSharedStore 代替（同一主机上的多个 worker 共用一个文件）
+    """
+
+    # 是否跨进程共享：为 False 时调用方在进程内另有一份等价状态，无需再读写本存储
+    shared = False
+
+    def get(self, ns: str, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    def set(self, ns: str, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    def add(self, ns: str, key: str, value: Any, ttl_seconds: Optional[float] = None) -> bool:
+        """键不存在（或已过期）时写入并返回 True，否则返回 False（用作租约 / 锁）"""
+        raise NotImplementedError
+
+    def delete(self, ns: str, key: str) -> None:
+        raise NotImplementedError
+
+    def take_token(self, bucket: str, rate: float, burst: int = 1) -> float:
+        """从令牌桶取一个令牌（先扣后等，余额可为负），返回调用方需要等待的秒数"""
+        raise NotImplementedError
+
+    def report(self) -> Dict[str, Any]:
+        return {"backend": type(self).__name__}
+
+
+def _refill(tokens: float, updated: float, now: float, rate: float, burst: int) -> float:
+    return min(burst, tokens + (now - updated) * rate) - 1
+
+
+class MemorySharedStore(SharedStore):
+    """单进程部署（默认）：进程内字典，超过 max_entries 时淘汰最早写入的键"""
+
+    def __init__(self, max_entries: int = SHARED_STORE_MEMORY_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[Tuple[str, str], Tuple[Any, Optional[float]]]" = OrderedDict()
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+
+    def _live(self, ns: str, key: str) -> Optional[Tuple[Any, Optional[float]]]:
+        entry = self._data.get((ns, key))
+        if entry is not None and entry[1] is not None and entry[1] <= time.time():
+            del self._data[(ns, key)]
+            return None
+        return entry
+
+    def get(self, ns: str, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._live(ns, key)
+            return json.loads(entry[0]) if entry is not None else None
+
+    def _put(self, ns: str, key: str, value: Any, ttl_seconds: Optional[float]) -> None:
+        expires_at = time.time() + ttl_seconds if ttl_seconds is not None else None
+        self._data[(ns, key)] = (json.dumps(value, ensure_ascii=False), expires_at)
+        self._data.move_to_end((ns, key))
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def set(self, ns: str, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        with self._lock:
+            self._put(ns, key, value, ttl_seconds)
+
+    def add(self, ns: str, key: str, value: Any, ttl_seconds: Optional[float] = None) -> bool:
+        with self._lock:
+            if self._live(ns, key) is not None:
+                return False
+            self._put(ns, key, value, ttl_seconds)
+            return True
+
+    def delete(self, ns: str, key: str) -> None:
+        with self._lock:
+            self._data.pop((ns, key), None)
+
+    def take_token(self, bucket: str, rate: float, burst: int = 1) -> float:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(bucket, (float(burst), now))
+            tokens = _refill(tokens, updated, now, rate, burst)
+            self._buckets[bucket] = (tokens, now)
+        return -tokens / rate if tokens < 0 else 0.0
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"backend": "memory", "entries": len(self._data)}
+
+
+class SQLiteSharedStore(SharedStore):
+    """
+    单机多 worker 部署：所有 worker 共用一个 SQLite 文件（WAL 模式），每个线程一个连接
+    set-if-absent 与令牌桶在 BEGIN IMMEDIATE 事务中完成，跨进程原子；过期键在读取时忽略，写入时顺带清理
+    """
+
+    shared = True
+
+    def __init__(self, path: str = SHARED_STORE_PATH):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=30.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, ns: str, key: str) -> Optional[Any]:
+        row = self._conn().execute(
+            "SELECT value FROM kv WHERE ns = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (ns, key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, ns: str, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        now = time.time()
+        expires_at = now + ttl_seconds if ttl_seconds is not None else None
+        conn = self._conn()
+        conn.execute("INSERT OR REPLACE INTO kv VALUES (?, ?, ?, ?)",
+                     (ns, key, json.dumps(value, ensure_ascii=False), expires_at))
+        self._writes += 1
+        if self._writes % 1000 == 0:
+            conn.execute("DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+
+    def add(self, ns: str, key: str, value: Any, ttl_seconds: Optional[float] = None) -> bool:
+        now = time.time()
+        expires_at = now + ttl_seconds if ttl_seconds is not None else None
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM kv WHERE ns = ? AND key = ? AND expires_at IS NOT NULL AND expires_at <= ?",
+                         (ns, key, now))
+            inserted = conn.execute("INSERT OR IGNORE INTO kv VALUES (?, ?, ?, ?)",
+                                    (ns, key, json.dumps(value, ensure_ascii=False), expires_at)).rowcount
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return inserted == 1
+
+    def delete(self, ns: str, key: str) -> None:
+        self._conn().execute("DELETE FROM kv WHERE ns = ? AND key = ?", (ns, key))
+
+    def take_token(self, bucket: str, rate: float, burst: int = 1) -> float:
+        # 跨进程共用的时钟只能用墙钟
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE name = ?", (bucket,)).fetchone()
+            tokens = _refill(*(row or (float(burst), now)), now, rate, burst)
+            conn.execute("INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)", (bucket, tokens, now))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return -tokens / rate if tokens < 0 else 0.0
+
+    def report(self) -> Dict[str, Any]:
+        count = self._conn().execute("SELECT COUNT(*) FROM kv").fetchone()[0]
+        return {"backend": "sqlite", "path": self.path, "entries": count}
+
+
+def create_shared_store(backend: str = SHARED_STORE_BACKEND, **kwargs) -> SharedStore:
+    """
+    - "memory"（默认）：单进程部署，状态都在进程内
+    - "sqlite"：单机多 worker 部署（uvicorn --workers N），所有 worker 共用 SHARED_STORE_PATH
+    """
+    if backend == "memory":
+        return MemorySharedStore(**kwargs)
+    if backend == "sqlite":
+        return SQLiteSharedStore(**kwargs)
+    raise ValueError(f"未知的共享存储类型: {backend}")
+
+
+# 进程内全局单例
+shared_store = create_shared_store()
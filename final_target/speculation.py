@@ -0,0 +1,143 @@
+#speculation.py
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+from langchain_core.runnables import RunnableConfig
+
+from config import SPECULATION_ENABLED, SPECULATION_MAX_WORKERS, SPECULATION_TTL_SECONDS
+from tracing import tracer
+
+_MISS = (False, None)
+
+
+def thread_id_of(config: Optional[RunnableConfig]) -> Optional[str]:
+    """从节点收到的 RunnableConfig 中取出 thread_id（不在图中运行时为 None）"""
+    if not config:
+        return None
+    return (config.get("configurable") or {}).get("thread_id")
+
+
+class SpeculationEngine:
+    """
+    中断期间的推测执行：
+    - 图在 interrupt 处等待用户时，后台提前执行用户“最可能”选择之后的步骤
+    - 结果按 (thread_id, 任务名, 决策键) 存放；恢复执行时键一致则直接复用，不一致则丢弃
+    - 同一个键只会启动一次（节点在恢复时会从头重跑，重复调用 start 是安全的）
+    - 推测任务运行在普通线程池中，不继承中断节点的 callbacks，异常只记为未命中
+    """
+
+    def __init__(self, max_workers: int = SPECULATION_MAX_WORKERS, ttl_seconds: float = SPECULATION_TTL_SECONDS):
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="speculation")
+        self._ttl = ttl_seconds
+        self._entries: Dict[Tuple[str, str, str], Tuple[Future, float]] = {}
+        self._hit_keys: Set[Tuple[str, str, str]] = set()     # 已计过命中的条目（get 可多次读取同一条目，只计一次）
+        self._stats = {"started": 0, "hits": 0, "misses": 0, "timeouts": 0, "discarded": 0, "failed": 0}
+
+    def start(self, config: Optional[RunnableConfig], task: str, key: str, fn: Callable[..., Any], *args, **kwargs) -> None:
+        thread_id = thread_id_of(config)
+        if not SPECULATION_ENABLED or thread_id is None:
+            return
+        entry_key = (thread_id, task, key)
+        with self._lock:
+            self._evict_expired()
+            if entry_key in self._entries:
+                return
+            # tracer.bind：推测任务中的外部调用仍记在发起推测的节点 span 下
+            self._entries[entry_key] = (self._executor.submit(tracer.bind(fn), *args, **kwargs), time.monotonic())
+            self._stats["started"] += 1
+        print(f"🔮 推测执行已启动: {task} [{key}]")
+
+    def get(self, config: Optional[RunnableConfig], task: str, key: str,
+            timeout: Optional[float] = None) -> Tuple[bool, Any]:
+        """
+        取回推测结果但保留条目（供恢复时会重跑的中断节点多次读取），返回 (是否命中, 结果)
+        给出 timeout 时最多等待该秒数，仍在运行则按未命中返回并计入 timeouts（条目保留，之后仍可取用）
+        """
+        return self._resolve(config, task, key, pop=False, timeout=timeout)
+
+    def take(self, config: Optional[RunnableConfig], task: str, key: str) -> Tuple[bool, Any]:
+        """取回推测结果并移除条目，返回 (是否命中, 结果)；仍在运行时等待其完成"""
+        return self._resolve(config, task, key, pop=True)
+
+    def discard(self, config: Optional[RunnableConfig], task: str) -> None:
+        """丢弃该会话某任务下剩余的推测结果（用户做出了与推测不同的决策）"""
+        thread_id = thread_id_of(config)
+        if thread_id is None:
+            return
+        with self._lock:
+            stale = [k for k in self._entries if k[0] == thread_id and k[1] == task]
+            for entry_key in stale:
+                future, _ = self._entries.pop(entry_key)
+                self._hit_keys.discard(entry_key)
+                future.cancel()
+            self._stats["discarded"] += len(stale)
+
+    def _resolve(self, config: Optional[RunnableConfig], task: str, key: str, pop: bool,
+                 timeout: Optional[float] = None) -> Tuple[bool, Any]:
+        thread_id = thread_id_of(config)
+        if thread_id is None:
+            return _MISS
+        entry_key = (thread_id, task, key)
+        with self._lock:
+            entry = self._entries.pop(entry_key, None) if pop else self._entries.get(entry_key)
+        if entry is None:
+            with self._lock:
+                self._stats["misses"] += 1
+            return _MISS
+
+        try:
+            result = entry[0].result(timeout=timeout)
+        except FutureTimeoutError:
+            with self._lock:
+                self._stats["timeouts"] += 1
+            return _MISS
+        except Exception as e:
+            print(f"⚠️ 推测任务失败，改为同步执行: {task} [{key}] {e}")
+            with self._lock:
+                self._entries.pop(entry_key, None)
+                self._hit_keys.discard(entry_key)
+                self._stats["failed"] += 1
+            return _MISS
+
+        # 每个条目只计一次命中：首次 get 或 take 时计入，之后的重复读取不再计数
+        with self._lock:
+            first_hit = entry_key not in self._hit_keys
+            if pop:
+                self._hit_keys.discard(entry_key)
+            elif first_hit:
+                self._hit_keys.add(entry_key)
+            if first_hit:
+                self._stats["hits"] += 1
+                print(f"⚡ 命中推测结果: {task} [{key}]")
+        return True, result
+
+    def _evict_expired(self) -> None:
+        now = time.monotonic()
+        expired = [k for k, (_, created) in self._entries.items() if now - created > self._ttl]
+        for entry_key in expired:
+            future, _ = self._entries.pop(entry_key)
+            self._hit_keys.discard(entry_key)
+            future.cancel()
+        self._stats["discarded"] += len(expired)
+
+    def wait_idle(self, timeout: Optional[float] = None) -> None:
+        """等待当前登记的推测任务全部结束（离线基准测试在停止模拟服务前调用）"""
+        with self._lock:
+            futures = [future for future, _ in self._entries.values()]
+        wait(futures, timeout=timeout)
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"] + self._stats["timeouts"]
+            return {
+                **self._stats,
+                "pending": len(self._entries),
+                "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else None,
+            }
+
+
+# 进程内全局单例
+speculation_engine = SpeculationEngine()
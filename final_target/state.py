@@ -1,7 +1,7 @@
 # state.py
 from typing import List, Dict, Optional, Any
-from typing_extensions import TypedDict
-from datetime import datetime
+from typing_extensions import Annotated, TypedDict
+from datetime import date, datetime
 from data_models import CompanyInfo
 
 
@@ -34,16 +34,43 @@ class ItineraryItem(TypedDict):
     details: Dict[str, Any]
 
 
+class DayPlan(TypedDict):
+    """单日行程（Day 1 为到达日，其余为调研日），各天可并行规划后按 day_index 合并"""
+    day_index: int                                   # 从 1 开始
+    date: date
+    items: List[ItineraryItem]
+    assigned_companies: List[str]                    # 分天结果：分配到该天的企业名
+    stops: Optional[List[Dict[str, Any]]]            # 求解器停靠点快照（增量修改行程用），非求解器规划的天为 None
+    unscheduled: List[str]                           # 分配到该天但无法排入时间窗的企业名
+    violations: List[Dict[str, Any]]                 # 该天的可行性校验结果
+
+
+def merge_day_plans(left: Optional[List[DayPlan]], right: Optional[List[DayPlan]]) -> List[DayPlan]:
+    """days 的 reducer：按 day_index 覆盖 / 合并（同一超步中多个单日规划节点并发写入）"""
+    merged = {day["day_index"]: day for day in (left or [])}
+    for day in right or []:
+        merged[day["day_index"]] = {**merged.get(day["day_index"], {}), **day}
+    return [merged[k] for k in sorted(merged)]
+
+
+def merge_commute_cache(left: Optional[Dict[str, Dict[str, float]]],
+                        right: Optional[Dict[str, Dict[str, float]]]) -> Dict[str, Dict[str, float]]:
+    """commute_cache 的 reducer：各节点只写回新增的点对，按起点合并"""
+    merged = {k: dict(v) for k, v in (left or {}).items()}
+    for origin, row in (right or {}).items():
+        merged.setdefault(origin, {}).update(row)
+    return merged
+
+
 class ItineraryContext(TypedDict):
     fixed_events: List[FixedEvent]
 
-    day_1: Optional[List[ItineraryItem]]
-    day_2: Optional[List[ItineraryItem]]
-    day_3: Optional[List[ItineraryItem]]
-
     final_itinerary: List[ItineraryItem]
     final_report: str
 
+    report_rows: Optional[Dict[str, List[str]]]      # 按天缓存的 Markdown 表格行（增量修改时只重渲染变动的天）
+    violations: Dict[str, List[Dict[str, Any]]]      # 最终行程的可行性校验结果（final）
+
 
 class UserContext(TypedDict):
     """用户输入及结构化结果"""
@@ -70,6 +97,7 @@ class TransportContext(TypedDict):
 class CompanyContext(TypedDict):
     target_names: List[str]                          # 用户指定的公司名
     candidates: List[CompanyInfo]                    # 地理编码后的公司
+    unscheduled: List[str]                           # 无法排入任何调研日的公司名
 
 
 class ControlContext(TypedDict):
@@ -87,4 +115,7 @@ class TravelPlanState(TypedDict):
     companies: CompanyContext
     itinerary: ItineraryContext
     control: ControlContext
+    days: Annotated[List[DayPlan], merge_day_plans]                           # 逐天行程
+    commute_cache: Annotated[Dict[str, Dict[str, float]], merge_commute_cache]  # CommuteMatrix 缓存：地点键 → 地点键 → 驾车分钟数
+    policy: Optional[Dict[str, Any]]                                            # 无人值守策略（HeadlessPolicy.model_dump()），无则各中断点等待用户
 
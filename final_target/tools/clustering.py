@@ -0,0 +1,140 @@
+#clustering.py
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from config import PRE_MEETING_BUFFER_MINUTES, COMPANY_VISIT_MINUTES, WORKDAY_START, WORKDAY_END, MIDDAY_BREAK, \
+    CLUSTER_TRAVEL_ALLOWANCE_MINUTES, CLUSTER_MAX_ITERATIONS
+from data_models import CompanyInfo
+from state import FixedEvent, Location
+from tools.commute_matrix import estimate_minutes_np
+
+
+def _hm(value: str) -> float:
+    hours, minutes = value.split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+def _minute_of_day(value: datetime) -> float:
+    return value.hour * 60 + value.minute
+
+
+def day_capacity(events: List[FixedEvent]) -> int:
+    """
+    粗估某天还能安排几场企业调研：
+    工作时段去掉午间与固定事务（含提前到达缓冲）后，每段空闲时间按“调研时长 + 通勤余量”计数
+    （每段第一场的通勤可以在空闲开始前完成，因此分子加一份余量）
+    """
+    blocked = [(_hm(MIDDAY_BREAK[0]), _hm(MIDDAY_BREAK[1]))]
+    blocked += [(_minute_of_day(e["start_time"]) - PRE_MEETING_BUFFER_MINUTES, _minute_of_day(e["end_time"]))
+                for e in events]
+    blocked.sort()
+
+    slot = COMPANY_VISIT_MINUTES + CLUSTER_TRAVEL_ALLOWANCE_MINUTES
+    capacity = 0
+    cursor, day_end = _hm(WORKDAY_START), _hm(WORKDAY_END)
+    for start, end in blocked + [(day_end, day_end)]:
+        free = min(start, day_end) - cursor
+        if free >= COMPANY_VISIT_MINUTES:
+            capacity += int((free + CLUSTER_TRAVEL_ALLOWANCE_MINUTES) // slot)
+        cursor = max(cursor, end)
+    return capacity
+
+
+def _assign(cost: np.ndarray, capacity: np.ndarray) -> np.ndarray:
+    """带容量的指派：按“次优 - 最优”的遗憾值从大到小依次放入仍有余量的最近一天，放不下的记为 -1"""
+    m, k = cost.shape
+    labels = np.full(m, -1)
+    remaining = capacity.copy()
+    ordered = np.sort(cost, axis=1)
+    regret = ordered[:, 1] - ordered[:, 0] if k > 1 else -ordered[:, 0]
+    for i in np.argsort(-regret, kind="stable"):
+        for d in np.argsort(cost[i], kind="stable"):
+            if remaining[d] > 0:
+                labels[i] = d
+                remaining[d] -= 1
+                break
+    return labels
+
+
+def cluster_companies_to_days(
+    events_by_day: List[List[FixedEvent]],
+    companies: List[CompanyInfo],
+    hotel_loc: Location,
+) -> Tuple[List[List[str]], List[str]]:
+    """
+    企业分天（k-medoids，k = 调研日天数）：
+    - 有固定事务的天以当天事务地点为锚点（到该天的距离取到其任一事务地点的最小值），锚点不随迭代移动
+    - 无固定事务的天以一家企业为中心点，初始按最远优先选取，之后每轮取簇内总距离最小的企业；
+      这类天只在有锚点的天容量不够时才按日期顺序启用
+    - 每轮按遗憾值做带容量的指派（容量见 day_capacity），直到中心点不再变化；超出总容量的企业放到最近的一天
+    距离为经纬度粗估的驾车分钟（不调用地图 API）
+    返回 (每天分配到的企业名, 无法安排的企业名：缺少坐标的企业)，与 assign_companies_to_days 一致
+    """
+    k = len(events_by_day)
+    valid = [c for c in companies if c.is_valid and c.lat is not None and c.lon is not None]
+    unscheduled = [c.name for c in companies if c not in valid]
+    if k == 0:
+        return [], unscheduled + [c.name for c in valid]
+    if not valid:
+        return [[] for _ in range(k)], unscheduled
+
+    points = np.array([[float(c.lat), float(c.lon)] for c in valid])
+    distance = estimate_minutes_np(points, points)
+
+    # 锚点距离：每家企业到各天固定事务地点的最近距离（无事务或事务缺坐标的天为 None）
+    anchor_cost: List[Optional[np.ndarray]] = []
+    for events in events_by_day:
+        coords = [[float(e["location"]["lat"]), float(e["location"]["lon"])] for e in events
+                  if e.get("location") and e["location"].get("lat") is not None]
+        anchor_cost.append(estimate_minutes_np(points, np.array(coords)).min(axis=1) if coords else None)
+    # 无固定事务的天每启用一天就多一趟酒店往返：按日期顺序只启用容量不足时需要的天数
+    capacity = np.array([day_capacity(events) for events in events_by_day])
+    free_days = []
+    total = sum(int(capacity[d]) for d in range(k) if anchor_cost[d] is not None)
+    for d in range(k):
+        if anchor_cost[d] is None and total < len(valid):
+            free_days.append(d)
+            total += int(capacity[d])
+    closed = [d for d in range(k) if anchor_cost[d] is None and d not in free_days]
+    capacity[closed] = 0
+
+    # 最远优先初始化：离酒店与已有锚点 / 中心点都最远的企业
+    hotel = np.array([[float(hotel_loc.get("lat") or points[:, 0].mean()), float(hotel_loc.get("lon") or points[:, 1].mean())]])
+    nearest = estimate_minutes_np(points, hotel)[:, 0]
+    for cost in anchor_cost:
+        if cost is not None:
+            nearest = np.minimum(nearest, cost)
+    medoids = {}
+    for d in free_days:
+        medoids[d] = int(np.argmax(nearest))
+        nearest = np.minimum(nearest, distance[:, medoids[d]])
+
+    labels = np.full(len(valid), -1)
+    for _ in range(CLUSTER_MAX_ITERATIONS):
+        cost = np.column_stack([
+            anchor_cost[d] if anchor_cost[d] is not None
+            else distance[:, medoids[d]] if d in medoids
+            else np.full(len(valid), np.inf)
+            for d in range(k)
+        ])
+        labels = _assign(cost, capacity)
+
+        changed = False
+        for d in free_days:
+            members = np.flatnonzero(labels == d)
+            if members.size == 0:
+                continue
+            best = int(members[np.argmin(distance[np.ix_(members, members)].sum(axis=1))])
+            if best != medoids[d]:
+                medoids[d], changed = best, True
+        if not changed:
+            break
+
+    # 容量只是粗估：超出的企业仍放到最近的一天，由单日求解器判断能否排下
+    overflow = labels < 0
+    labels[overflow] = np.argmin(cost[overflow], axis=1)
+
+    companies_by_day = [[valid[i].name for i in np.flatnonzero(labels == d)] for d in range(k)]
+    return companies_by_day, unscheduled
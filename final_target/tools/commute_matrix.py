@@ -0,0 +1,154 @@
+#commute_matrix.py
+import math
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from config import ESTIMATE_SPEED_KMH, ESTIMATE_OVERHEAD_MINUTES
+from state import Location
+from tools.travel_api import get_amap_driving_time
+
+DEFAULT_MINUTES = 60.0      # 路径规划失败时的兜底值（与原矩阵生成逻辑一致，不写入缓存，下次仍会重试）
+
+
+class CommuteMatrix:
+    """
+    可增量扩展的通勤矩阵：按“地点键 → 地点键”缓存驾车分钟数，只计算尚未缓存的点对。
+    - geocode_locations 之后先算好酒店与全部固定事务之间的基础块
+    - 之后每新增一个地点（到达枢纽、企业）只需与已有 N 个地点计算 2N 次
+    - to_dict / from_dict 为普通字典；节点只需把 delta()（本次新增的点对）写回 state.commute_cache，由 reducer 合并
+    """
+
+    def __init__(self, minutes: Optional[Dict[str, Dict[str, float]]] = None):
+        self._minutes: Dict[str, Dict[str, float]] = {k: dict(v) for k, v in (minutes or {}).items()}
+        self._added: Dict[str, Dict[str, float]] = {}
+        self.api_calls = 0
+        self.reused = 0
+
+    @staticmethod
+    def key(location: Location) -> Optional[str]:
+        """
+        地点键：有经纬度时按坐标，否则按城市 + 地址/名称；
+        三者都没有时返回 None（无法区分不同地点，这类点对不缓存，否则所有此类地点会共用同一个键、互相间通勤为 0）
+        """
+        lat, lon = location.get("lat"), location.get("lon")
+        if lat is not None and lon is not None:
+            return f"{float(lat):.6f},{float(lon):.6f}"
+        label = location.get("address") or location.get("name")
+        if not label:
+            return None
+        return f"{location.get('city')}|{label}"
+
+    def _lookup(self, origin: Location, destination: Location) -> float:
+        origin_key, destination_key = self.key(origin), self.key(destination)
+        if origin_key is None or destination_key is None:
+            if origin is destination:
+                return 0.0
+            self.api_calls += 1
+            minutes = get_amap_driving_time(origin, destination)
+            return DEFAULT_MINUTES if minutes is None else minutes
+        if origin_key == destination_key:
+            return 0.0
+
+        cached = self._minutes.get(origin_key, {}).get(destination_key)
+        if cached is not None:
+            self.reused += 1
+            return cached
+
+        self.api_calls += 1
+        minutes = get_amap_driving_time(origin, destination)
+        if minutes is None:
+            return DEFAULT_MINUTES
+        self._minutes.setdefault(origin_key, {})[destination_key] = minutes
+        self._added.setdefault(origin_key, {})[destination_key] = minutes
+        return minutes
+
+    def get(self, origin: Location, destination: Location) -> float:
+        return self._lookup(origin, destination)
+
+    def peek(self, origin_key: Optional[str], destination_key: Optional[str]) -> Optional[float]:
+        """只读缓存，不触发 API 调用；未缓存（或地点无键）返回 None"""
+        if origin_key is None or destination_key is None:
+            return None
+        if origin_key == destination_key:
+            return 0.0
+        return self._minutes.get(origin_key, {}).get(destination_key)
+
+    def ensure(self, locations: List[Location]) -> None:
+        """补齐 locations 两两之间缺失的点对"""
+        for origin in locations:
+            for destination in locations:
+                self._lookup(origin, destination)
+
+    def submatrix(self, locations: List[Location]) -> Dict[str, Dict[str, float]]:
+        """按给定顺序输出 LOC_i 形式的矩阵（与 generate_*_commute_matrix 的格式一致），缺失点对按需补算"""
+        return {
+            f"LOC_{i}": {f"LOC_{j}": self._lookup(origin, destination) for j, destination in enumerate(locations)}
+            for i, origin in enumerate(locations)
+        }
+
+    def lazy(self, locations: List[Location]) -> "LazyMatrix":
+        """按下标按需取值的矩阵视图：求解器只会为真正比较到的点对触发 API 调用"""
+        return LazyMatrix(self, locations)
+
+    def to_dict(self) -> Dict[str, Dict[str, float]]:
+        return {k: dict(v) for k, v in self._minutes.items()}
+
+    def delta(self) -> Dict[str, Dict[str, float]]:
+        """自创建以来新算出的点对"""
+        return {k: dict(v) for k, v in self._added.items()}
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Dict[str, float]]]) -> "CommuteMatrix":
+        return cls(data)
+
+
+class LazyMatrix:
+    """matrix[i][j] 形式访问 CommuteMatrix；locations 可在使用过程中追加新地点"""
+
+    def __init__(self, cache: CommuteMatrix, locations: List[Location]):
+        self.cache = cache
+        self.locations = locations
+
+    def __len__(self) -> int:
+        return len(self.locations)
+
+    def __getitem__(self, i: int) -> "_LazyRow":
+        return _LazyRow(self, i)
+
+
+class _LazyRow:
+    def __init__(self, matrix: LazyMatrix, i: int):
+        self._matrix = matrix
+        self._i = i
+
+    def __getitem__(self, j: int) -> float:
+        return self._matrix.cache.get(self._matrix.locations[self._i], self._matrix.locations[j])
+
+
+def estimate_minutes(origin: Location, destination: Location) -> float:
+    """不调用地图 API 的通勤粗估：球面直线距离 / ESTIMATE_SPEED_KMH + 固定开销；缺经纬度时取 35 分钟（与 get_amap_driving_time 一致）"""
+    if origin is destination:
+        return 0.0
+    if not origin.get("lat") or not destination.get("lat"):
+        return 35.0
+    lat1, lon1, lat2, lon2 = map(math.radians, (origin["lat"], origin["lon"], destination["lat"], destination["lon"]))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    km = 2 * 6371.0 * math.asin(math.sqrt(a))
+    if km < 1e-3:
+        return 0.0
+    return round(km / ESTIMATE_SPEED_KMH * 60 + ESTIMATE_OVERHEAD_MINUTES, 1)
+
+
+def estimate_matrix(locations: List[Location]) -> List[List[float]]:
+    """locations 两两之间的粗估通勤矩阵（二维列表，下标与 locations 一致）"""
+    return [[0.0 if i == j else estimate_minutes(a, b) for j, b in enumerate(locations)] for i, a in enumerate(locations)]
+
+
+def estimate_minutes_np(origins: np.ndarray, destinations: np.ndarray) -> np.ndarray:
+    """estimate_minutes 的向量化版本：origins (n, 2)、destinations (m, 2) 为 [lat, lon]，返回 (n, m) 分钟矩阵"""
+    lat1, lon1 = np.radians(origins[:, 0])[:, None], np.radians(origins[:, 1])[:, None]
+    lat2, lon2 = np.radians(destinations[:, 0])[None, :], np.radians(destinations[:, 1])[None, :]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    km = 2 * 6371.0 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+    return np.where(km < 1e-3, 0.0, km / ESTIMATE_SPEED_KMH * 60 + ESTIMATE_OVERHEAD_MINUTES)
@@ -0,0 +1,436 @@
+#route_solver.py
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from config import PRE_MEETING_BUFFER_MINUTES, COMPANY_VISIT_MINUTES, WORKDAY_START, WORKDAY_END, MIDDAY_BREAK
+from data_models import CompanyInfo
+from state import FixedEvent, ItineraryItem, Location
+from tools.commute_matrix import estimate_matrix
+
+EPS = 1e-6
+MAX_LOCAL_SEARCH_PASSES = 50
+# 大交通班次类型（travel_api 返回的 raw_option.type）对应的行程条目符号
+TRANSPORT_TYPE_EMOJI = {"Flight": "✈️", "Train": "🚄"}
+
+
+class Stop:
+    """路线上的一个停靠点：固定事件（时间固定）或企业调研（时间灵活）"""
+
+    def __init__(self, kind: str, name: str, loc_index: int, location: Location,
+                 start: Optional[datetime] = None, end: Optional[datetime] = None,
+                 earliest: Optional[datetime] = None):
+        self.kind = kind            # "event" | "company"
+        self.name = name
+        self.loc_index = loc_index  # 在通勤矩阵中的下标
+        self.location = location
+        self.start = start
+        self.end = end
+        self.earliest = earliest    # 企业调研的最早开始时间（用户要求推迟时设置）
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "name": self.name,
+            "loc_index": self.loc_index,
+            "location": self.location,
+            "start": self.start,
+            "end": self.end,
+            "earliest": self.earliest,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Stop":
+        return cls(**data)
+
+    def __repr__(self) -> str:
+        return f"Stop({self.kind}, {self.name})"
+
+
+def matrix_to_list(matrix: Dict[str, Dict[str, float]]) -> List[List[float]]:
+    """LOC_i 字典形式的通勤矩阵 → 二维列表"""
+    n = len(matrix)
+    return [[matrix[f"LOC_{i}"][f"LOC_{j}"] for j in range(n)] for i in range(n)]
+
+
+def _at(day: date, hm: str) -> datetime:
+    return datetime.combine(day, datetime.strptime(hm, "%H:%M").time())
+
+
+def simulate_day(day: date, stops: List[Stop], matrix: List[List[float]], hotel_index: int = 0) -> Optional[Dict[str, Any]]:
+    """
+    按给定顺序模拟一天的行程：酒店 → stops → 酒店。
+    - 固定事件：需在开始前 PRE_MEETING_BUFFER_MINUTES 到达，迟到分钟数累计为 late（不判不可行，由上层比较）
+    - 企业调研：时长 COMPANY_VISIT_MINUTES，须在工作时段内完成且不与午间时段重叠，否则不可行返回 None
+    返回 {"travel": 总通勤分钟, "late": 固定事件累计迟到分钟, "timeline": [...]}
+    """
+    if not stops:
+        return {"travel": 0.0, "late": 0.0, "timeline": []}
+
+    day_start, day_end = _at(day, WORKDAY_START), _at(day, WORKDAY_END)
+    mid_start, mid_end = _at(day, MIDDAY_BREAK[0]), _at(day, MIDDAY_BREAK[1])
+    buffer = timedelta(minutes=PRE_MEETING_BUFFER_MINUTES)
+    visit = timedelta(minutes=COMPANY_VISIT_MINUTES)
+
+    timeline: List[Tuple] = []
+    travel_total = 0.0
+    late_total = 0.0
+
+    # 出发时间：第一站刚好按时到达
+    first = stops[0]
+    first_leg = matrix[hotel_index][first.loc_index]
+    if first.kind == "event":
+        current = first.start - buffer - timedelta(minutes=first_leg)
+    else:
+        current = max(day_start, first.earliest or day_start) - timedelta(minutes=first_leg)
+    current_index = hotel_index
+    timeline.append(("depart", current))
+
+    for stop in stops:
+        minutes = matrix[current_index][stop.loc_index]
+        arrive = current + timedelta(minutes=minutes)
+        travel_total += minutes
+        timeline.append(("leg", current_index, stop, current, arrive, minutes))
+
+        if stop.kind == "event":
+            latest_arrival = stop.start - buffer
+            if arrive > latest_arrival:
+                late_total += (arrive - latest_arrival).total_seconds() / 60.0
+            begin, finish = stop.start, stop.end
+        else:
+            begin = max(arrive, day_start, stop.earliest or day_start)
+            if begin < mid_end and begin + visit > mid_start:
+                begin = mid_end
+            finish = begin + visit
+            if finish > day_end:
+                return None
+
+        timeline.append(("visit", stop, begin, finish))
+        current = max(finish, arrive)
+        current_index = stop.loc_index
+
+    minutes = matrix[current_index][hotel_index]
+    travel_total += minutes
+    timeline.append(("return", current_index, current, current + timedelta(minutes=minutes), minutes))
+
+    return {"travel": travel_total, "late": late_total, "timeline": timeline}
+
+
+def _cost(routes: List[List[Stop]], days: List[date], matrix: List[List[float]]) -> Optional[Tuple[float, float]]:
+    """所有天的 (累计迟到, 累计通勤)，任一天不可行返回 None"""
+    late = travel = 0.0
+    for day, route in zip(days, routes):
+        sim = simulate_day(day, route, matrix)
+        if sim is None:
+            return None
+        late += sim["late"]
+        travel += sim["travel"]
+    return late, travel
+
+
+def _better(new: Optional[Tuple[float, float]], old: Tuple[float, float]) -> bool:
+    if new is None:
+        return False
+    if new[0] < old[0] - EPS:
+        return True
+    return new[0] <= old[0] + EPS and new[1] < old[1] - EPS
+
+
+def _cheapest_insertion(routes: List[List[Stop]], pending: List[Stop], days: List[date],
+                        matrix: List[List[float]]) -> List[Stop]:
+    """
+    最便宜插入：每轮在所有（企业, 天, 位置）组合中选通勤增量最小、且不增加固定事件迟到的插入，
+    直到没有企业能再插入，返回无法安排的企业
+    """
+    pending = list(pending)
+    day_costs = [simulate_day(day, route, matrix) for day, route in zip(days, routes)]
+
+    while pending:
+        best = None   # (delta, company_idx, day_idx, pos, sim)
+        for c_idx, company in enumerate(pending):
+            for d_idx, (day, route) in enumerate(zip(days, routes)):
+                base = day_costs[d_idx]
+                for pos in range(len(route) + 1):
+                    sim = simulate_day(day, route[:pos] + [company] + route[pos:], matrix)
+                    if sim is None or sim["late"] > base["late"] + EPS:
+                        continue
+                    delta = sim["travel"] - base["travel"]
+                    if best is None or delta < best[0] - EPS:
+                        best = (delta, c_idx, d_idx, pos, sim)
+        if best is None:
+            break
+
+        _, c_idx, d_idx, pos, sim = best
+        routes[d_idx].insert(pos, pending.pop(c_idx))
+        day_costs[d_idx] = sim
+
+    return pending
+
+
+def _local_search(routes: List[List[Stop]], days: List[date], matrix: List[List[float]]) -> None:
+    """
+    局部搜索（原地修改 routes）：
+    - 2-opt：反转同一天内的一段停靠点
+    - or-opt：把 1~2 个连续的企业调研移动到任意一天的任意位置
+    固定事件的时间顺序由可行性 / 迟到判定自然保证
+    """
+    current = _cost(routes, days, matrix)
+
+    for _ in range(MAX_LOCAL_SEARCH_PASSES):
+        improved = False
+
+        # 2-opt
+        for d_idx, route in enumerate(routes):
+            for i in range(len(route) - 1):
+                for j in range(i + 1, len(route)):
+                    candidate = route[:i] + route[i:j + 1][::-1] + route[j + 1:]
+                    trial = routes[:d_idx] + [candidate] + routes[d_idx + 1:]
+                    cost = _cost(trial, days, matrix)
+                    if _better(cost, current):
+                        routes[d_idx], current, improved = candidate, cost, True
+                        route = candidate
+
+        # or-opt
+        for src in range(len(routes)):
+            for seg_len in (1, 2):
+                i = 0
+                while i + seg_len <= len(routes[src]):
+                    segment = routes[src][i:i + seg_len]
+                    if any(stop.kind != "company" for stop in segment):
+                        i += 1
+                        continue
+                    remainder = routes[src][:i] + routes[src][i + seg_len:]
+                    moved = False
+                    for dst in range(len(routes)):
+                        target = remainder if dst == src else routes[dst]
+                        for pos in range(len(target) + 1):
+                            if dst == src and pos == i:
+                                continue
+                            trial = list(routes)
+                            trial[src] = remainder
+                            trial[dst] = target[:pos] + segment + target[pos:]
+                            cost = _cost(trial, days, matrix)
+                            if _better(cost, current):
+                                routes[:] = trial
+                                current, improved, moved = cost, True, True
+                                break
+                        if moved:
+                            break
+                    if not moved:
+                        i += 1
+
+        if not improved:
+            break
+
+
+def _make_item(item_type: str, description: str, start: datetime, end: datetime,
+               location: Location, details: Optional[Dict[str, Any]] = None) -> ItineraryItem:
+    return {
+        "type": item_type,
+        "description": description,
+        "start_time": start,
+        "end_time": end,
+        "location": location,
+        "details": details or {},
+    }
+
+
+def _timeline_to_items(sim: Dict[str, Any], hotel_loc: Location) -> List[ItineraryItem]:
+    """模拟结果 → ItineraryItem 列表（类型符号与 LLM 规划保持一致）"""
+    items: List[ItineraryItem] = []
+
+    for entry in sim["timeline"]:
+        kind = entry[0]
+        if kind == "depart":
+            items.append(_make_item("🏨", "从酒店出发", entry[1], entry[1], hotel_loc))
+        elif kind == "leg":
+            _, _, stop, depart, arrive, minutes = entry
+            items.append(_make_item("🚗", f"前往 {stop.name}", depart, arrive, stop.location,
+                                    {"duration_minutes": minutes}))
+        elif kind == "visit":
+            _, stop, begin, finish = entry
+            if stop.kind == "event":
+                items.append(_make_item("🤝", stop.name, begin, finish, stop.location, {"fixed_event": True}))
+            else:
+                items.append(_make_item("🏢", f"调研 {stop.name}", begin, finish, stop.location,
+                                        {"visit_minutes": COMPANY_VISIT_MINUTES}))
+        elif kind == "return":
+            _, _, depart, arrive, minutes = entry
+            items.append(_make_item("🚗", "返回酒店", depart, arrive, hotel_loc, {"duration_minutes": minutes}))
+            items.append(_make_item("🏨", "回到酒店", arrive, arrive, hotel_loc))
+
+    return items
+
+
+def insert_companies(routes: List[List[Stop]], companies: List[Stop], day_dates: List[date],
+                     matrix: List[List[float]]) -> List[Stop]:
+    """在不打乱已有顺序的前提下，把企业按最便宜的（天, 位置）插入 routes（原地修改），返回插不进去的企业"""
+    return _cheapest_insertion(routes, companies, day_dates, matrix)
+
+
+def visit_times(day: date, route: List[Stop], matrix: List[List[float]]) -> Dict[str, Tuple[datetime, datetime]]:
+    """按当前顺序模拟，返回 {停靠点名: (开始, 结束)}，不可行返回空字典"""
+    sim = simulate_day(day, route, matrix)
+    if sim is None:
+        return {}
+    return {entry[1].name: (entry[2], entry[3]) for entry in sim["timeline"] if entry[0] == "visit"}
+
+
+def route_to_items(day: date, route: List[Stop], matrix: List[List[float]], hotel_loc: Location) -> Optional[List[ItineraryItem]]:
+    """单日路线 → ItineraryItem 列表；无停靠点返回空列表，不可行返回 None"""
+    if not route:
+        return []
+    sim = simulate_day(day, route, matrix)
+    if sim is None:
+        return None
+    return _timeline_to_items(sim, hotel_loc)
+
+
+def company_location(company: CompanyInfo, hotel_loc: Location) -> Location:
+    """CompanyInfo → Location（企业与酒店同城）"""
+    return {
+        "city": hotel_loc["city"],
+        "address": company.address,
+        "name": company.name,
+        "lat": company.lat,
+        "lon": company.lon,
+    }
+
+
+def plan_days_with_solver(
+    day_dates: List[date],
+    events_by_day: List[List[FixedEvent]],
+    companies: List[CompanyInfo],
+    commute_matrix: Union[Dict[str, Dict[str, float]], Sequence[Sequence[float]]],
+    hotel_loc: Location,
+) -> Tuple[List[List[ItineraryItem]], List[str], List[List[Dict[str, Any]]]]:
+    """
+    确定性多日路径规划（带时间窗的车辆路径问题）：
+    - 通勤矩阵可为 LOC_i 字典、二维列表或 LazyMatrix（按需查询）
+    - 下标约定与 generate_research_day_commute_matrix 一致：0 为酒店，其后依次为各天固定事件，最后为企业
+    - 固定事件按时间排入当天，企业用最便宜插入分配到天与位置，再用 2-opt / or-opt 局部搜索优化
+    - 每天从酒店出发、回到酒店；无任何停靠点的天返回空列表
+    返回 (每天的 ItineraryItem 列表, 无法安排的企业名, 每天的停靠点快照)
+    停靠点快照与通勤矩阵一起缓存到 state，供修改行程时只重算受影响的那一天
+    """
+    matrix = matrix_to_list(commute_matrix) if isinstance(commute_matrix, dict) else commute_matrix
+    routes: List[List[Stop]] = []
+    loc_index = 1
+    for events in events_by_day:
+        route = []
+        for event in events:
+            route.append(Stop("event", event["name"], loc_index, event["location"],
+                              start=event["start_time"], end=event["end_time"]))
+            loc_index += 1
+        route.sort(key=lambda stop: stop.start)
+        routes.append(route)
+
+    pending: List[Stop] = []
+    unscheduled: List[str] = []
+    for company in companies:
+        if company.is_valid:
+            pending.append(Stop("company", company.name, loc_index, company_location(company, hotel_loc)))
+        else:
+            unscheduled.append(company.name)
+        loc_index += 1
+
+    leftovers = _cheapest_insertion(routes, pending, day_dates, matrix)
+    _local_search(routes, day_dates, matrix)
+    if leftovers:
+        # 局部搜索可能腾出了时间窗，再尝试一次
+        leftovers = _cheapest_insertion(routes, leftovers, day_dates, matrix)
+    unscheduled.extend(stop.name for stop in leftovers)
+
+    days_items = [route_to_items(day, route, matrix, hotel_loc) for day, route in zip(day_dates, routes)]
+    snapshot = [[stop.to_dict() for stop in route] for route in routes]
+
+    return days_items, unscheduled, snapshot
+
+
+def assign_companies_to_days(
+    day_dates: List[date],
+    events_by_day: List[List[FixedEvent]],
+    companies: List[CompanyInfo],
+    hotel_loc: Location,
+) -> Tuple[List[List[str]], List[str]]:
+    """
+    企业分天：在粗估通勤矩阵（直线距离，不调用地图 API）上跑一遍多日求解器，只取“哪家企业排在哪一天”
+    每天的精确时间由各调研日节点用真实通勤时间重新求解
+    返回 (每天分配到的企业名, 无法安排的企业名)
+    """
+    locations: List[Location] = [hotel_loc]
+    for events in events_by_day:
+        locations.extend(event["location"] for event in events)
+    locations.extend(company_location(company, hotel_loc) for company in companies)
+
+    _, unscheduled, snapshot = plan_days_with_solver(
+        day_dates, events_by_day, companies, estimate_matrix(locations), hotel_loc
+    )
+    companies_by_day = [[stop["name"] for stop in route if stop["kind"] == "company"] for route in snapshot]
+    return companies_by_day, unscheduled
+
+
+def build_day1_timeline(
+    transport_item: ItineraryItem,
+    day1_events: List[FixedEvent],
+    day1_commute_matrix: Dict[str, Dict[str, float]],
+    hotel_loc: Location,
+) -> List[ItineraryItem]:
+    """
+    规则化生成 Day 1 行程（替代 LLM）：
+    - 通勤矩阵下标约定与 generate_day1_commute_matrix 一致：0 为到达枢纽，1 为酒店，其后为 Day 1 固定事务
+    - 到达后若时间允许先回酒店办理入住，再赶往第一个固定事务；否则直接前往
+    - 每段通勤按“刚好提前 PRE_MEETING_BUFFER_MINUTES 到达”倒推出发时间，最后返回酒店
+    - 赶不上的固定事务照常排入，并在 details.late_minutes 中标出迟到分钟数
+    - 大交通条目的 type 换成 ✈️ / 🚄，与 LLM 生成的 Day 1 行程、行程表渲染的约定一致
+    """
+    matrix = matrix_to_list(day1_commute_matrix)
+    hub_index, hotel_index = 0, 1
+    buffer = timedelta(minutes=PRE_MEETING_BUFFER_MINUTES)
+
+    events = sorted(day1_events, key=lambda e: e["start_time"])
+    indexed_events = list(zip(range(2, 2 + len(events)), events))
+
+    raw_type = ((transport_item.get("details") or {}).get("raw_option") or {}).get("type")
+    items: List[ItineraryItem] = [{**transport_item, "type": TRANSPORT_TYPE_EMOJI.get(raw_type, transport_item["type"])}]
+    current, current_index = transport_item["end_time"], hub_index
+
+    def travel(to_index: int, to_loc: Location, description: str, not_before: datetime) -> datetime:
+        nonlocal current, current_index
+        minutes = matrix[current_index][to_index]
+        depart = max(current, not_before - timedelta(minutes=minutes))
+        arrive = depart + timedelta(minutes=minutes)
+        items.append(_make_item("🚗", description, depart, arrive, to_loc, {"duration_minutes": minutes}))
+        current, current_index = arrive, to_index
+        return arrive
+
+    if indexed_events:
+        first_index, first_event = indexed_events[0]
+        via_hotel = (
+            current
+            + timedelta(minutes=matrix[hub_index][hotel_index] + matrix[hotel_index][first_index])
+            <= first_event["start_time"] - buffer
+        )
+        if via_hotel:
+            arrive = travel(hotel_index, hotel_loc, "前往酒店", current)
+            items.append(_make_item("🏨", "入住酒店", arrive, arrive, hotel_loc))
+
+    for loc_index, event in indexed_events:
+        latest_arrival = event["start_time"] - buffer
+        arrive = travel(loc_index, event["location"], f"前往 {event['name']}", latest_arrival)
+        details: Dict[str, Any] = {"fixed_event": True}
+        if arrive > latest_arrival:
+            details["late_minutes"] = round((arrive - latest_arrival).total_seconds() / 60.0, 1)
+            print(f"⚠️ Day 1 固定事务【{event['name']}】预计晚到 {details['late_minutes']} 分钟")
+        items.append(_make_item("🤝", event["name"], event["start_time"], event["end_time"],
+                                event["location"], details))
+        current = max(current, event["end_time"])
+
+    if current_index != hotel_index:
+        if indexed_events:
+            arrive = travel(hotel_index, hotel_loc, "返回酒店", current)
+            items.append(_make_item("🏨", "回到酒店", arrive, arrive, hotel_loc))
+        else:
+            arrive = travel(hotel_index, hotel_loc, "前往酒店", current)
+            items.append(_make_item("🏨", "入住酒店", arrive, arrive, hotel_loc))
+
+    return items
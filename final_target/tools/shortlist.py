@@ -0,0 +1,164 @@
+#shortlist.py
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from config import PRE_MEETING_BUFFER_MINUTES, COMPANY_VISIT_MINUTES, WORKDAY_START, WORKDAY_END, MIDDAY_BREAK
+from state import FixedEvent, Location
+from tools.commute_matrix import estimate_matrix
+
+EPS = 1e-6
+INF = float("inf")
+
+
+def _hm(value: str) -> float:
+    hours, minutes = value.split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+def _minute_of_day(value: datetime) -> float:
+    return value.hour * 60 + value.minute + value.second / 60.0
+
+
+# 与 route_solver.simulate_day 相同的时间窗规则，只是全部换算成“当天第几分钟”的浮点数，避免 datetime 运算开销
+_DAY_START, _DAY_END = _hm(WORKDAY_START), _hm(WORKDAY_END)
+_MID_START, _MID_END = _hm(MIDDAY_BREAK[0]), _hm(MIDDAY_BREAK[1])
+
+# 停靠点：(下标, 固定事件开始分钟, 固定事件结束分钟)；企业调研的开始 / 结束为 None
+_Stop = Tuple[int, Optional[float], Optional[float]]
+
+
+def _simulate(route: Sequence[_Stop], matrix: List[List[float]]) -> Optional[Tuple[float, float]]:
+    """酒店(0) → route → 酒店，返回 (累计迟到, 总通勤)；企业调研超出工作时段返回 None"""
+    if not route:
+        return 0.0, 0.0
+
+    first_index, first_start, _ = route[0]
+    if first_start is not None:
+        current = first_start - PRE_MEETING_BUFFER_MINUTES - matrix[0][first_index]
+    else:
+        current = _DAY_START - matrix[0][first_index]
+
+    late = travel = 0.0
+    prev = 0
+    for index, start, end in route:
+        leg = matrix[prev][index]
+        arrive = current + leg
+        travel += leg
+        if start is not None:
+            late += max(0.0, arrive - (start - PRE_MEETING_BUFFER_MINUTES))
+            finish = end
+        else:
+            begin = max(arrive, _DAY_START)
+            if begin < _MID_END and begin + COMPANY_VISIT_MINUTES > _MID_START:
+                begin = _MID_END
+            finish = begin + COMPANY_VISIT_MINUTES
+            if finish > _DAY_END:
+                return None
+        current = max(finish, arrive)
+        prev = index
+
+    return late, travel + matrix[prev][0]
+
+
+def _detour(routes: List[List[_Stop]], index: int, matrix: List[List[float]]) -> float:
+    """不考虑时间窗，把地点 index 插入任一天任一位置的最小绕路分钟数"""
+    best = INF
+    for route in routes:
+        path = [0] + [stop[0] for stop in route] + [0]
+        for a, b in zip(path, path[1:]):
+            best = min(best, matrix[a][index] + matrix[index][b] - matrix[a][b])
+    return best
+
+
+def shortlist_companies(
+    events_by_day: List[List[FixedEvent]],
+    candidates: List[Tuple[str, Optional[Location]]],
+    hotel_loc: Location,
+) -> Dict[str, Any]:
+    """
+    推荐企业的快速筛选（定向越野 / 背包问题的贪心近似）：
+    - 在各调研日固定事务之间的空闲时间窗里，按粗估通勤矩阵做最便宜插入，尽可能多地排入企业调研
+    - 插入不得使固定事务迟到增加；排满后对每天做一次 2-opt 再补插一轮
+    - 为每家候选企业估算额外通勤分钟：入选的为从路线中去掉它能省下的通勤，未入选的为不考虑时间窗时的最小绕路
+    events_by_day 为各调研日的固定事务；candidates 为 (企业名, 地点)，地点为 None 表示地理编码失败
+    返回 {"selected": [企业名], "annotations": [{"name", "fits", "extra_minutes"}]}（annotations 与 candidates 同序）
+    """
+    locations: List[Location] = [hotel_loc]
+    routes: List[List[_Stop]] = []
+    for events in events_by_day:
+        route = []
+        for event in sorted(events, key=lambda e: e["start_time"]):
+            route.append((len(locations), _minute_of_day(event["start_time"]), _minute_of_day(event["end_time"])))
+            locations.append(event["location"])
+        routes.append(route)
+
+    pending: List[Tuple[str, int]] = []
+    index_of: Dict[str, int] = {}
+    for name, location in candidates:
+        if location and location.get("lat") is not None and name not in index_of:
+            index_of[name] = len(locations)
+            pending.append((name, len(locations)))
+            locations.append(location)
+
+    matrix = estimate_matrix(locations)
+    costs = [_simulate(route, matrix) for route in routes]
+    selected: Dict[str, int] = {}
+
+    def insert_all() -> None:
+        while pending:
+            best = None   # (通勤增量, 候选下标, 天下标, 位置, 新成本)
+            for c_idx, (_, index) in enumerate(pending):
+                for d_idx, route in enumerate(routes):
+                    base_late, base_travel = costs[d_idx]
+                    for pos in range(len(route) + 1):
+                        cost = _simulate(route[:pos] + [(index, None, None)] + route[pos:], matrix)
+                        if cost is None or cost[0] > base_late + EPS:
+                            continue
+                        delta = cost[1] - base_travel
+                        if best is None or delta < best[0] - EPS:
+                            best = (delta, c_idx, d_idx, pos, cost)
+            if best is None:
+                return
+            _, c_idx, d_idx, pos, cost = best
+            name, index = pending.pop(c_idx)
+            routes[d_idx].insert(pos, (index, None, None))
+            costs[d_idx] = cost
+            selected[name] = d_idx
+
+    def two_opt() -> None:
+        for d_idx, route in enumerate(routes):
+            improved = True
+            while improved:
+                improved = False
+                for i in range(len(route) - 1):
+                    for j in range(i + 1, len(route)):
+                        candidate = route[:i] + route[i:j + 1][::-1] + route[j + 1:]
+                        cost = _simulate(candidate, matrix)
+                        old = costs[d_idx]
+                        if cost is not None and (cost[0] < old[0] - EPS or
+                                                 (cost[0] <= old[0] + EPS and cost[1] < old[1] - EPS)):
+                            routes[d_idx] = route = candidate
+                            costs[d_idx], improved = cost, True
+
+    insert_all()
+    if pending:
+        two_opt()
+        insert_all()
+
+    annotations = []
+    for name, _ in candidates:
+        index = index_of.get(name)
+        if index is None:
+            annotations.append({"name": name, "fits": False, "extra_minutes": None})
+        elif name in selected:
+            route = routes[selected[name]]
+            without = _simulate([stop for stop in route if stop[0] != index], matrix)
+            saved = costs[selected[name]][1] - without[1] if without else 0.0
+            annotations.append({"name": name, "fits": True, "extra_minutes": round(max(saved, 0.0), 1)})
+        else:
+            annotations.append({"name": name, "fits": False, "extra_minutes": round(_detour(routes, index, matrix), 1)})
+
+    # 入选企业按（天, 路线顺序）输出
+    name_of = {index: name for name, index in index_of.items()}
+    ordered = [name_of[index] for route in routes for index, start, _ in route if start is None]
+    return {"selected": ordered, "annotations": annotations}
@@ -1,5 +1,5 @@
 #travel_api.py
-from typing import Dict, List, Optional, Any, Union
+from typing import Dict, List, Optional, Any, Union, TYPE_CHECKING
 import requests
 import time
 from config import AMAP_API_KEY, AMAP_GEOCODE_URL, CITY_TO_PRIMARY_IATA, SERPAPI_FLIGHTS_API_KEY, GOOGLE_FLIGHTS_URL, \
@@ -7,11 +7,32 @@ from config import AMAP_API_KEY, AMAP_GEOCODE_URL, CITY_TO_PRIMARY_IATA, SERPAPI
 from datetime import datetime, timedelta
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from data_models import CompanyInfo
+from external_calls import external_calls
 from state import Location, ItineraryItem
+from tracing import record_retry, trace_call
+
+if TYPE_CHECKING:
+    from tools.commute_matrix import CommuteMatrix
 
 MAX_RETRIES = 5 # 最大重试次数
 INITIAL_WAIT_TIME = 1.0 # 初始等待时间（秒）
 
+
+def _coords_key(location: Union[Location, Dict[str, Any]]) -> Optional[str]:
+    if not location.get("lat") or not location.get("lon"):
+        return None
+    return f"{float(location['lat']):.6f},{float(location['lon']):.6f}"
+
+
+def _route_key(origin: Union[Location, Dict[str, Any]], destination: Union[Location, Dict[str, Any]]) -> Optional[str]:
+    origin_key, destination_key = _coords_key(origin), _coords_key(destination)
+    if origin_key is None or destination_key is None:
+        return None     # 缺经纬度时直接返回兜底值，不发请求也不缓存
+    return f"{origin_key}->{destination_key}"
+
+
+@external_calls.cached("amap_geocode", key=lambda address, city: f"{city}|{address}")
+@trace_call("http", "amap_geocode")
 def amap_geocode(address: str, city: str) -> Optional[Dict[str, float]]:
     """
     调用高德地理编码 API，返回 {"lat": float, "lon": float}
@@ -32,6 +53,7 @@ def amap_geocode(address: str, city: str) -> Optional[Dict[str, float]]:
 
     for attempt in range(1, MAX_RETRIES + 1):
         try:
+            external_calls.throttle("amap")
             response = requests.get(
                 AMAP_GEOCODE_URL,
                 params=params,
@@ -66,6 +88,7 @@ def amap_geocode(address: str, city: str) -> Optional[Dict[str, float]]:
 
         # 3️⃣ 未成功则等待后重试
         if attempt < MAX_RETRIES:
+            record_retry()
             time.sleep(wait_time)
             wait_time *= 2  # 指数退避
 
@@ -73,11 +96,12 @@ def amap_geocode(address: str, city: str) -> Optional[Dict[str, float]]:
     return None
 
 
-THROTTLE_DELAY = 0.34  # 强制冷却时间，用于控制 QPS
+@external_calls.cached("amap_route", key=_route_key)
+@trace_call("http", "amap_route")
 def get_amap_driving_time(origin: Union[Location, Dict[str, Any]], destination: Union[Location, Dict[str, Any]]) -> Optional[float]:
     """
     实际调用高德路径规划API，计算两个地点间的驾车耗时（分钟）。
-    加入延时、指数退避重试机制和强制冷却，以解决 QPS 超限问题。
+    加入指数退避重试机制，并经所有会话共享的高德令牌桶限速，以解决 QPS 超限问题。
 
     Args:
         origin: 起点 Location 结构 (需要 lat/lon)。
@@ -114,7 +138,8 @@ def get_amap_driving_time(origin: Union[Location, Dict[str, Any]], destination:
     # === 循环重试机制开始 ===
     for attempt in range(MAX_RETRIES):
         try:
-            # 1. 发送请求
+            # 1. 发送请求（先经共享令牌桶限速）
+            external_calls.throttle("amap")
             response = requests.get(AMAP_ROUTE_URL, params=params, timeout=5)
             response.raise_for_status()
             data = response.json()
@@ -124,10 +149,6 @@ def get_amap_driving_time(origin: Union[Location, Dict[str, Any]], destination:
                 # 路径规划成功，返回结果
                 route = data['route']['paths'][0]
                 duration_seconds = int(route.get('duration', 0))
-
-                # 🚨 修正点 1：成功后强制等待，防止连续调用超限
-                time.sleep(THROTTLE_DELAY)
-
                 return round(duration_seconds / 60.0, 1)
 
             # 3. API 错误处理，特别是针对 QPS 超限
@@ -142,6 +163,7 @@ def get_amap_driving_time(origin: Union[Location, Dict[str, Any]], destination:
                 if attempt < MAX_RETRIES - 1:
                     # 进行重试：失败时等待更久（指数退避）
                     print(f"🚦 QPS 超限，尝试第 {attempt + 1} 次重试，等待 {wait_time:.1f} 秒...")
+                    record_retry()
                     time.sleep(wait_time)
                     wait_time *= 2
                     continue
@@ -158,6 +180,7 @@ def get_amap_driving_time(origin: Union[Location, Dict[str, Any]], destination:
             # 网络或 HTTP 错误
             if attempt < MAX_RETRIES - 1:
                 print(f"❌ API 请求失败 (网络错误)，尝试第 {attempt + 1} 次重试，等待 {wait_time:.1f} 秒...")
+                record_retry()
                 time.sleep(wait_time)
                 wait_time *= 2
                 continue
@@ -263,6 +286,8 @@ def get_airport_name(code: str) -> str:
     """获取机场中文名，如果找不到则返回原代码"""
     return AIRPORT_CODE_TO_NAME.get(code.upper(), code)
 
+@external_calls.cached("flight_search", key=lambda origin, destination, date: f"{origin.strip()}|{destination.strip()}|{date}")
+@trace_call("http", "flight_search")
 def query_flight_api(origin: str, destination: str, date: str) -> List[Dict]:
     """
     支持多机场城市的航班查询。
@@ -299,6 +324,7 @@ def query_flight_api(origin: str, destination: str, date: str) -> List[Dict]:
         }
         try:
             # 这里的逻辑完全保留你原来的解析流程
+            external_calls.throttle("serpapi")
             response = requests.get(GOOGLE_FLIGHTS_URL, params=params, timeout=20)
             response.raise_for_status()
             data = response.json()
@@ -369,6 +395,8 @@ def query_flight_api(origin: str, destination: str, date: str) -> List[Dict]:
 
 
 
+@external_calls.cached("train_search", key=lambda origin, destination, date, filter="G": f"{origin}|{destination}|{date}|{filter}")
+@trace_call("http", "train_search")
 def query_train_api(origin: str, destination: str, date: str, filter: str = "G") -> List[Dict]:
     """
     调用聚合数据 API 查询高铁，返回统一结构的车次列表。
@@ -401,6 +429,7 @@ def query_train_api(origin: str, destination: str, date: str, filter: str = "G")
     }
 
     try:
+        external_calls.throttle("juhe")
         response = requests.get(JUHE_TRAIN_QUERY_URL, params=params, timeout=10)
         response.raise_for_status()
         data = response.json()
@@ -457,12 +486,14 @@ def query_train_api(origin: str, destination: str, date: str, filter: str = "G")
 def generate_day1_commute_matrix(
     transport_item: ItineraryItem,
     day1_events: List[Any],
-    hotel_loc: Location
+    hotel_loc: Location,
+    commute_cache: Optional["CommuteMatrix"] = None
 ) -> Dict[str, Dict[str, float]]:
     """
     生成 Day 1 的通勤矩阵：
     - 包含到达交通站、酒店、以及 Day 1 固定事务
     - 返回矩阵，键为 LOC_i，值为各点到其他点的驾车分钟数
+    - 传入 commute_cache 时复用已缓存的点对（酒店与固定事务之间），只补算到达枢纽相关的点对
     """
 
     locations = []
@@ -475,6 +506,9 @@ def generate_day1_commute_matrix(
     for event in day1_events:
         locations.append(event["location"])
 
+    if commute_cache is not None:
+        return commute_cache.submatrix(locations)
+
     # ========= 生成通勤矩阵 =========
     matrix = {}
     for i in range(len(locations)):
@@ -487,16 +521,17 @@ def generate_day1_commute_matrix(
     return matrix
 
 
-def generate_day23_commute_matrix(
-    day2_events: List[Any],
-    day3_events: List[Any],
+def generate_research_day_commute_matrix(
+    day_events: List[Any],
     companies_to_plan: List[CompanyInfo],
-    hotel_loc: Location
+    hotel_loc: Location,
+    commute_cache: Optional["CommuteMatrix"] = None
 ) -> Dict[str, Dict[str, float]]:
     """
-    生成 Day 2/3 的通勤矩阵：
-    - 包含 Day 2/3 的固定事件、待调研企业、酒店
+    生成单个调研日的通勤矩阵：
+    - 包含酒店、当天固定事件、分配到当天的待调研企业
     - 返回矩阵，键为 LOC_i，值为各点到其他点的驾车分钟数
+    - 传入 commute_cache 时酒店 / 固定事件之间的点对直接复用，每家企业只补算 2N 次
     """
 
     locations: List[Location] = []
@@ -504,15 +539,11 @@ def generate_day23_commute_matrix(
     # 1️⃣ 酒店
     locations.append(hotel_loc)
 
-    # 2️⃣ Day 2 固定事件
-    for event in day2_events:
+    # 2️⃣ 当天固定事件
+    for event in day_events:
         locations.append(event["location"])
 
-    # 3️⃣ Day 3 固定事件
-    for event in day3_events:
-        locations.append(event["location"])
-
-    # 4️⃣ 待调研企业
+    # 3️⃣ 待调研企业
     for company in companies_to_plan:
         # ⚠️ 关键修正：从 CompanyInfo 对象的字段构造 Location TypedDict
         company_location: Location = {
@@ -524,6 +555,9 @@ def generate_day23_commute_matrix(
         }
         locations.append(company_location)
 
+    if commute_cache is not None:
+        return commute_cache.submatrix(locations)
+
     # ========= 生成通勤矩阵 =========
     matrix: Dict[str, Dict[str, float]] = {}
     for i in range(len(locations)):
@@ -0,0 +1,340 @@
+#tracing.py
+"""
+节点与外部调用追踪：
+- trace_node 包装图中的每个节点，trace_call 包装每个外部 HTTP 调用（高德 / 航班 / 高铁），ModelRouter.invoke 为每次 LLM 调用
+  开启以调用点命名的 span，各产生一个 span：
+  名称、类型、会话 thread_id、耗时、结果（ok / empty / error / interrupted）、重试次数；外部调用的 span 挂在所在节点的 span 下
+- 同一会话的所有 span 属于同一个 trace（trace_id 由 thread_id 导出），跨中断、跨 worker 都能串起来
+- 节点因 interrupt 暂停时记下中断开始时间（共享存储），恢复时单独记一个 interrupt_wait span：
+  等待用户的时间不计入节点耗时
+- 输出：每个 span 一行 JSON 日志（logger "trace"）；设置 OTEL_EXPORTER_OTLP_ENDPOINT 时按 OTLP/HTTP JSON 批量发往 collector；
+  同时累计为 Prometheus 直方图（metrics_registry，由 api_bridge 的 /metrics 输出）
+"""
+import atexit
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import requests
+from langgraph.config import get_config
+from langgraph.errors import GraphBubbleUp, GraphInterrupt
+
+from config import (
+    INTERRUPT_WAIT_TTL_SECONDS, METRICS_DURATION_BUCKETS, METRICS_INTERRUPT_WAIT_BUCKETS, TRACE_EXPORT_BATCH_SIZE,
+    TRACE_EXPORT_INTERVAL_SECONDS, TRACE_EXPORT_QUEUE_MAX, TRACE_LOG_ENABLED, TRACE_OTLP_ENDPOINT, TRACE_SERVICE_NAME,
+    TRACING_ENABLED,
+)
+from metrics import MetricsRegistry, metrics_registry
+from shared_store import SharedStore, shared_store
+
+# 每个 span 输出一行 JSON 结构化日志
+logger = logging.getLogger("trace")
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+# OTLP span kind：节点与等待为 INTERNAL，外部调用为 CLIENT
+_OTLP_KIND = {"node": 1, "wait": 1, "http": 3, "llm": 3}
+
+
+class Span:
+    __slots__ = ("name", "kind", "trace_id", "span_id", "parent_id", "thread_id", "node",
+                 "start_ns", "duration_ns", "outcome", "retries", "error")
+
+    def __init__(self, name: str, kind: str, thread_id: Optional[str], node: Optional[str], parent: Optional["Span"]):
+        self.name = name
+        self.kind = kind
+        self.thread_id = thread_id
+        self.node = node
+        self.trace_id = parent.trace_id if parent is not None else _trace_id(thread_id)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.start_ns = time.time_ns()
+        self.duration_ns = 0
+        self.outcome: Optional[str] = None
+        self.retries = 0
+        self.error: Optional[str] = None
+
+    def record(self) -> Dict[str, Any]:
+        return {
+            "event": "span",
+            "name": self.name,
+            "kind": self.kind,
+            "thread_id": self.thread_id,
+            "node": self.node,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "start": round(self.start_ns / 1e9, 3),
+            "duration_ms": round(self.duration_ns / 1e6, 1),
+            "outcome": self.outcome,
+            "retries": self.retries,
+            "error": self.error,
+        }
+
+
+_current_span: "contextvars.ContextVar[Optional[Span]]" = contextvars.ContextVar("trace_span", default=None)
+
+
+def _trace_id(thread_id: Optional[str]) -> str:
+    return hashlib.md5(thread_id.encode("utf-8")).hexdigest() if thread_id else secrets.token_hex(16)
+
+
+def _graph_context() -> Dict[str, Any]:
+    """当前 LangGraph 运行的 thread_id 与节点名（不在图中运行时为空）"""
+    try:
+        config = get_config()
+    except RuntimeError:
+        return {}
+    return {"thread_id": (config.get("configurable") or {}).get("thread_id"),
+            "node": (config.get("metadata") or {}).get("langgraph_node")}
+
+
+def _empty(result: Any) -> bool:
+    return result is None or (isinstance(result, (list, dict, str)) and not result)
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(span: Span) -> Dict[str, Any]:
+    """单个 span 的 OTLP/JSON 表示（traceId / spanId 为十六进制字符串，纳秒时间戳为字符串）"""
+    attributes = {"span.type": span.kind, "outcome": span.outcome, "retries": span.retries,
+                  "langgraph.thread_id": span.thread_id, "langgraph.node": span.node}
+    otlp = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": _OTLP_KIND.get(span.kind, 1),
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.start_ns + span.duration_ns),
+        "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in attributes.items() if v is not None],
+        "status": {"code": 2, "message": span.error or ""} if span.outcome == "error" else {"code": 1},
+    }
+    if span.parent_id:
+        otlp["parentSpanId"] = span.parent_id
+    return otlp
+
+
+class OTLPExporter:
+    """
+    OTLP/HTTP JSON 导出：span 先进有界队列，后台线程每 interval 秒或攒满 batch_size 个时 POST 到 {endpoint}/v1/traces
+    collector 不可用时丢弃该批（不重试、不阻塞图运行），队列满时丢弃最新的 span，均计入统计
+    """
+
+    def __init__(self, endpoint: str, service_name: str = TRACE_SERVICE_NAME, batch_size: int = TRACE_EXPORT_BATCH_SIZE,
+                 interval: float = TRACE_EXPORT_INTERVAL_SECONDS, max_queue: int = TRACE_EXPORT_QUEUE_MAX):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_queue = max_queue
+        self._queue: "deque[Span]" = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self.stats = {"exported": 0, "dropped": 0, "failed_batches": 0}
+        atexit.register(self.flush)
+        threading.Thread(target=self._loop, name="otlp-export", daemon=True).start()
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            if len(self._queue) >= self.max_queue:
+                self.stats["dropped"] += 1
+                return
+            self._queue.append(span)
+            full = len(self._queue) >= self.batch_size
+        if full:
+            self._wakeup.set()
+
+    def _loop(self) -> None:
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        while True:
+            with self._lock:
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+            if not batch:
+                return
+            self._send(batch)
+
+    def _send(self, batch: List[Span]) -> None:
+        body = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}},
+                                        {"key": "process.pid", "value": {"intValue": str(os.getpid())}}]},
+            "scopeSpans": [{"scope": {"name": "travel.tracing"}, "spans": [to_otlp(span) for span in batch]}],
+        }]}
+        try:
+            response = requests.post(self.url, json=body, timeout=5)
+            response.raise_for_status()
+            self.stats["exported"] += len(batch)
+        except requests.RequestException as e:
+            self.stats["failed_batches"] += 1
+            self.stats["dropped"] += len(batch)
+            if self.stats["failed_batches"] == 1:
+                print(f"⚠️ 追踪数据导出失败（{self.url}），之后失败的批次只计数: {e}")
+
+
+class Tracer:
+    def __init__(self, enabled: bool = TRACING_ENABLED, log_enabled: bool = TRACE_LOG_ENABLED,
+                 exporter: Optional[OTLPExporter] = None, store: SharedStore = shared_store,
+                 registry: MetricsRegistry = metrics_registry):
+        self.enabled = enabled
+        self.log_enabled = log_enabled
+        self.exporter = exporter
+        self.store = store
+        self.node_seconds = registry.histogram(
+            "travel_node_duration_seconds", "图节点执行耗时（不含等待用户输入的时间）", ("node", "outcome"),
+            METRICS_DURATION_BUCKETS)
+        self.call_seconds = registry.histogram(
+            "travel_external_call_duration_seconds", "外部调用耗时（含重试与模型回退）", ("kind", "service", "outcome"),
+            METRICS_DURATION_BUCKETS)
+        self.call_retries = registry.counter(
+            "travel_external_call_retries_total", "外部调用的重试 / 模型回退次数", ("kind", "service"))
+        self.interrupt_wait_seconds = registry.histogram(
+            "travel_interrupt_wait_seconds", "节点因 interrupt 暂停到恢复执行之间的等待时长", ("node",),
+            METRICS_INTERRUPT_WAIT_BUCKETS)
+
+    @contextmanager
+    def span(self, name: str, kind: str, thread_id: Optional[str] = None, node: Optional[str] = None) -> Iterator[Span]:
+        """记录一个 span：thread_id / node 未给出时取当前图运行的值，再取父 span 的值"""
+        parent = _current_span.get()
+        context = _graph_context()
+        span = Span(name, kind,
+                    thread_id or context.get("thread_id") or (parent.thread_id if parent is not None else None),
+                    node or context.get("node") or (parent.node if parent is not None else None),
+                    parent)
+        token = _current_span.set(span)
+        started = time.perf_counter_ns()
+        try:
+            yield span
+        except GraphInterrupt:
+            span.outcome = "interrupted"
+            raise
+        except GraphBubbleUp:
+            # Command(graph=PARENT) 等控制流，不算失败
+            span.outcome = span.outcome or "ok"
+            raise
+        except BaseException as e:
+            span.outcome, span.error = "error", f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.duration_ns = time.perf_counter_ns() - started
+            span.outcome = span.outcome or "ok"
+            _current_span.reset(token)
+            self._finish(span)
+
+    def _finish(self, span: Span) -> None:
+        seconds = span.duration_ns / 1e9
+        if span.kind == "node":
+            self.node_seconds.observe(seconds, span.name, span.outcome)
+        elif span.kind == "wait":
+            self.interrupt_wait_seconds.observe(seconds, span.node or span.name)
+        else:
+            self.call_seconds.observe(seconds, span.kind, span.name, span.outcome)
+            if span.retries:
+                self.call_retries.inc(span.retries, span.kind, span.name)
+        if self.log_enabled:
+            logger.info(json.dumps(span.record(), ensure_ascii=False))
+        if self.exporter is not None:
+            self.exporter.export(span)
+
+    def trace_node(self, fn: Callable[..., Any]) -> Callable[..., Any]:
+        """包装图节点（节点名即函数名）；保留原函数的签名与类型注解，LangGraph 仍能注入 config、推断 Command 的去向"""
+        name = fn.__name__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not self.enabled:
+                return fn(*args, **kwargs)
+            thread_id = _graph_context().get("thread_id")
+            self._record_interrupt_wait(thread_id, name)
+            with self.span(name, "node", thread_id=thread_id, node=name) as span:
+                try:
+                    return fn(*args, **kwargs)
+                except GraphInterrupt:
+                    if thread_id:
+                        self.store.set("interrupt_wait", f"{thread_id}|{name}", time.time(),
+                                       ttl_seconds=INTERRUPT_WAIT_TTL_SECONDS)
+                    raise
+        return wrapper
+
+    def _record_interrupt_wait(self, thread_id: Optional[str], node: str) -> None:
+        """节点此前在该会话中因 interrupt 暂停过：本次执行即为恢复，记录中断开始到现在的等待时间"""
+        if not thread_id:
+            return
+        key = f"{thread_id}|{node}"
+        interrupted_at = self.store.get("interrupt_wait", key)
+        if interrupted_at is None:
+            return
+        self.store.delete("interrupt_wait", key)
+        span = Span(f"interrupt_wait:{node}", "wait", thread_id, node, _current_span.get())
+        span.start_ns = int(interrupted_at * 1e9)
+        span.duration_ns = max(0, time.time_ns() - span.start_ns)
+        span.outcome = "ok"
+        self._finish(span)
+
+    def trace_call(self, kind: str, service: str):
+        """装饰器：外部调用（kind 为 "http"；LLM 调用的 span 由 ModelRouter.invoke 开启），返回 None / 空列表时结果记为 empty（调用方吞掉异常后的失败）"""
+        def decorator(fn: Callable[..., Any]) -> Callable[..., Any]:
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with self.span(service, kind) as span:
+                    result = fn(*args, **kwargs)
+                    if _empty(result):
+                        span.outcome = "empty"
+                    return result
+            return wrapper
+        return decorator
+
+    def bind(self, fn: Callable[..., Any]) -> Callable[..., Any]:
+        """把当前 span 带到其它线程（推测执行等后台任务），其中的外部调用仍挂在发起它的节点下"""
+        parent = _current_span.get()
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            token = _current_span.set(parent)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _current_span.reset(token)
+        return wrapper
+
+    def report(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, "otlp": self.exporter.stats if self.exporter is not None else None}
+
+
+def record_retry() -> None:
+    """外部调用内部重试（或 LLM 回退到下一个模型）时调用，计入当前 span"""
+    span = _current_span.get()
+    if span is not None:
+        span.retries += 1
+
+
+# 进程内全局单例
+tracer = Tracer(exporter=OTLPExporter(TRACE_OTLP_ENDPOINT) if TRACE_OTLP_ENDPOINT else None)
+trace_node = tracer.trace_node
+trace_call = tracer.trace_call